@@ -1,7 +1,7 @@
 from flask import Flask
-from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+import click
 import os
 
 # Создаем и настраиваем приложение Flask
@@ -25,11 +25,47 @@ app.config.from_mapping(
     },
 )
 
+# Скомпилированные шаблоны Jinja сохраняются на диск: новый процесс gunicorn не
+# компилирует их заново. Ключ кэша включает контрольную сумму исходника, так что
+# правка шаблона его не ломает. Пустой JINJA_BYTECODE_CACHE_DIR отключает кэш.
+JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+    'JINJA_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache')
+)
+if JINJA_BYTECODE_CACHE_DIR:
+    from jinja2 import FileSystemBytecodeCache
+    os.makedirs(JINJA_BYTECODE_CACHE_DIR, exist_ok=True)
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': FileSystemBytecodeCache(JINJA_BYTECODE_CACHE_DIR),
+    }
+
 # Создаем объект db и связываем его с приложением
 db = SQLAlchemy(app)
 
-# Инициализируем систему миграций
-migrate = Migrate(app, db)
+# Учёт SQL-запросов и времени обработки каждого HTTP-запроса
+from .instrumentation import init_app as init_instrumentation
+with app.app_context():
+    init_instrumentation(app, db.engine)
+
+# Инициализируем систему миграций. Flask-Migrate вместе с Alembic заметно
+# удлиняет импорт, а нужен он только командам «flask db …»: группа db
+# загружает его при первом обращении. gunicorn и скрипты его не импортируют.
+class _LazyMigrateGroup(click.Group):
+    def _migrate_group(self):
+        # init_app заменяет эту группу в app.cli настоящей группой db Flask-Migrate,
+        # поэтому Migrate создаётся только при первом обращении
+        if app.cli.commands.get('db') is self:
+            from flask_migrate import Migrate
+            Migrate(app, db)
+        return app.cli.commands['db']
+
+    def list_commands(self, ctx):
+        return self._migrate_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._migrate_group().get_command(ctx, name)
+
+app.cli.add_command(_LazyMigrateGroup('db', help='Миграции базы данных (Flask-Migrate).'))
 
 # Инициализируем Flask-Login
 login_manager = LoginManager()
@@ -40,8 +76,10 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from .models import User
-    return User.query.get(int(user_id))
+    from .principals import load
+    return load(int(user_id))
 
 # Импортируем маршруты и модели в самом конце, чтобы избежать циклических ошибок
-from . import routes, models
\ No newline at end of file
+from . import routes, models
+from .views import register_blueprints
+register_blueprints(app)
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""FEFO-распределение сырья по партиям для замесов.
+
+Все партии нужных видов сырья вместе с уже зарезервированными количествами
+загружаются одним сгруппированным запросом, после чего потребность в
+килограммах раскладывается по партиям в памяти (сначала истекающие).
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import func, insert, select
+
+from . import db
+from .models import RawMaterial, MaterialBatch, BatchMaterial, ProductionBatch
+from .stock_ledger import reserved_by_material_query
+
+
+class StockSnapshot:
+    """Снимок свободных остатков партий сырья в порядке FEFO.
+
+    Снимок живёт в рамках одного запроса: каждое успешное распределение уменьшает
+    свободный остаток партий, поэтому несколько ингредиентов и замесов подряд
+    видят уже занятые ими количества без повторных обращений к БД.
+    """
+
+    def __init__(self, lots_by_type):
+        # {material_type_id: [[RawMaterial, свободно_кг], ...]} в порядке FEFO
+        self._lots_by_type = lots_by_type
+
+    @classmethod
+    def load(cls, material_type_ids):
+        """Загружает партии с положительным остатком для указанных видов сырья одним запросом."""
+        material_type_ids = sorted({type_id for type_id in material_type_ids if type_id is not None})
+        lots_by_type = {type_id: [] for type_id in material_type_ids}
+        if not material_type_ids:
+            return cls(lots_by_type)
+
+        reserved = reserved_by_material_query(
+            MaterialBatch.material_id.in_(
+                select(RawMaterial.id).where(RawMaterial.type_id.in_(material_type_ids))
+            )
+        ).subquery()
+        rows = (
+            db.session.query(RawMaterial, func.coalesce(reserved.c.reserved_kg, 0))
+            .outerjoin(reserved, reserved.c.material_id == RawMaterial.id)
+            .filter(
+                RawMaterial.type_id.in_(material_type_ids),
+                RawMaterial.quantity_kg > 0,
+            )
+            .order_by(
+                RawMaterial.type_id,
+                RawMaterial.expiration_date.asc().nullslast(),
+                RawMaterial.id,
+            )
+            .all()
+        )
+        for material, reserved_kg in rows:
+            # Реальный остаток = общее количество - использованное, не может быть отрицательным
+            available = max(0, material.quantity_kg - (reserved_kg or 0))
+            lots_by_type[material.type_id].append([material, available])
+        return cls(lots_by_type)
+
+    def allocate(self, needed_qty, material_type_id):
+        """Раскладывает потребность по партиям (FEFO).
+
+        Возвращает список {'material', 'quantity'} и непокрытый остаток потребности.
+        При нехватке (остаток > 0) снимок не изменяется — партии не резервируются,
+        как и раньше, когда ингредиент с недостачей пропускался.
+        """
+        lots = self._lots_by_type.get(material_type_id, [])
+        result = []
+        remaining_qty = needed_qty
+
+        for material, available_qty in lots:
+            if remaining_qty <= 0:
+                break
+            qty_to_use = min(available_qty, remaining_qty)
+            if qty_to_use > 0:
+                result.append({
+                    'material': material,
+                    'quantity': qty_to_use
+                })
+                remaining_qty -= qty_to_use
+
+        if remaining_qty <= 0:
+            self._take(material_type_id, result)
+        return result, remaining_qty
+
+    def release(self, material_type_id, materials_to_use):
+        """Возвращает в снимок количества, ранее выделенные allocate()."""
+        self._take(material_type_id, materials_to_use, sign=-1)
+
+    def _take(self, material_type_id, materials_to_use, sign=1):
+        used = {info['material'].id: info['quantity'] for info in materials_to_use}
+        for lot in self._lots_by_type.get(material_type_id, []):
+            if lot[0].id in used:
+                lot[1] -= sign * used[lot[0].id]
+
+
+def plan_batches(bom, batch_numbers, weight_per_batch, stock):
+    """Распределяет сырьё сразу для нескольких замесов одного веса по одному снимку остатков.
+
+    Замес, для которого не хватило хотя бы одного ингредиента, не создаётся: выделенные
+    ему партии возвращаются в снимок и достаются следующим замесам.
+
+    Returns:
+        tuple: (planned, failed)
+            planned - [{'batch_number': str, 'allocations': [(BomLine, materials_to_use), ...]}]
+            failed - [{'batch_number': str, 'missing': [str, ...]}]
+    """
+    lines = bom.lines()
+    quantities = bom.quantities(weight_per_batch)
+    planned = []
+    failed = []
+    for batch_number in batch_numbers:
+        allocations = []
+        missing = []
+        for line, needed_qty in zip(lines, quantities):
+            materials_to_use, shortage = stock.allocate(needed_qty, line.id)
+            if shortage > 0:
+                missing.append(
+                    f"{line.name} (нужно {needed_qty:.2f} кг, недостаточно {shortage:.2f} кг)"
+                )
+                continue
+            allocations.append((line, materials_to_use))
+
+        if missing:
+            for line, materials_to_use in allocations:
+                stock.release(line.id, materials_to_use)
+            failed.append({'batch_number': batch_number, 'missing': missing})
+        else:
+            planned.append({'batch_number': batch_number, 'allocations': allocations})
+    return planned, failed
+
+
+def insert_planned_batches(plan, planned, weight_per_batch, employee_id, production_date):
+    """Записывает запланированные замесы, MaterialBatch и BatchMaterial пакетными INSERT.
+
+    Три запроса на любое количество замесов; фиксация транзакции остаётся за вызывающим кодом.
+    Возвращает id созданных замесов в порядке planned.
+
+    RETURNING без sort_by_parameter_order: с ним SQLite вставляет строки по одной.
+    Порядок возвращённых строк не гарантирован, поэтому id сопоставляются по
+    содержимому: замесы — по номеру (уникален в плане), MaterialBatch — по
+    (сырьё, количество); строки с одинаковым содержимым взаимозаменяемы.
+    """
+    if not planned:
+        return []
+
+    ids_by_number = dict(db.session.execute(
+        insert(ProductionBatch).returning(ProductionBatch.batch_number, ProductionBatch.id),
+        [
+            {
+                'plan_id': plan.id,
+                'batch_number': item['batch_number'],
+                'weight': weight_per_batch,
+                'production_date': production_date,
+                'employee_id': employee_id,
+            }
+            for item in planned
+        ],
+    ).all())
+    batch_ids = [ids_by_number[item['batch_number']] for item in planned]
+
+    material_batch_rows = []
+    owners = []
+    for batch_id, item in zip(batch_ids, planned):
+        for _, materials_to_use in item['allocations']:
+            for material_info in materials_to_use:
+                material = material_info['material']
+                qty = material_info['quantity']
+                material_batch_rows.append({
+                    'material_id': material.id,
+                    'batch_number': material.batch_number,
+                    'quantity': qty,
+                    'remaining_quantity': qty,
+                })
+                owners.append((batch_id, material.id, qty))
+
+    if material_batch_rows:
+        material_batch_ids = defaultdict(list)
+        for material_batch_id, material_id, qty in db.session.execute(
+            insert(MaterialBatch).returning(MaterialBatch.id, MaterialBatch.material_id, MaterialBatch.quantity),
+            material_batch_rows,
+        ):
+            material_batch_ids[(material_id, qty)].append(material_batch_id)
+        db.session.execute(
+            insert(BatchMaterial),
+            [
+                {'batch_id': batch_id, 'material_batch_id': material_batch_ids[(material_id, qty)].pop(), 'quantity': qty}
+                for batch_id, material_id, qty in owners
+            ],
+        )
+
+    # Коллекция plan.batches в сессии устарела после Core-вставок
+    db.session.expire(plan, ['batches'])
+    return batch_ids
@@ -0,0 +1,191 @@
+"""Скомпилированный состав рецептуры (BOM) с кэшем в памяти процесса.
+
+Расчёты замесов, потребностей и доступности сырья используют не цепочку
+template.recipe_items → material_type → allergens с float(percentage) в каждом
+цикле, а CompiledBom: компактные кортежи по строкам рецептуры (вид сырья, доля,
+название, аллергены, халяль, контроль массы).
+
+Кэш ключуется id рецептуры и RecipeTemplate.bom_version. Маршруты, меняющие
+состав рецептуры или свойства её видов сырья, увеличивают версию
+(bump_bom_version, bump_bom_versions_for_material_types); остальные
+процессы видят новую версию при следующей загрузке рецептуры и перекомпилируют её.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import select, update
+
+from . import db
+from .models import (
+    RecipeTemplate, RecipeItem, RawMaterialType, AllergenType, MassControlStatus,
+    raw_material_type_allergens,
+)
+
+# Строка рецептуры для шаблонов и сообщений; id — id вида сырья
+BomLine = namedtuple(
+    'BomLine', 'id name percent allergen_ids allergen_names halal_status mass_control',
+)
+
+
+class CompiledBom:
+    """Состав рецептуры в виде параллельных кортежей (в порядке строк рецептуры)."""
+
+    __slots__ = (
+        'template_id', 'version', 'type_ids', 'percents', 'fractions', 'names',
+        'allergen_ids', 'allergen_names', 'halal_statuses', 'mass_controls', '_positions',
+    )
+
+    def __init__(self, template_id, version, rows):
+        self.template_id = template_id
+        self.version = version
+        self.type_ids = tuple(row[0] for row in rows)
+        self.percents = tuple(row[1] for row in rows)
+        self.fractions = tuple(percent / 100 for percent in self.percents)
+        self.names = tuple(row[2] for row in rows)
+        self.allergen_ids = tuple(row[3] for row in rows)
+        self.allergen_names = tuple(row[4] for row in rows)
+        self.halal_statuses = tuple(row[5] for row in rows)
+        self.mass_controls = tuple(row[6] for row in rows)
+        self._positions = {}
+        for position, type_id in enumerate(self.type_ids):
+            self._positions.setdefault(type_id, position)
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    def line(self, position):
+        return BomLine(
+            self.type_ids[position], self.names[position], self.percents[position],
+            self.allergen_ids[position], self.allergen_names[position],
+            self.halal_statuses[position], self.mass_controls[position],
+        )
+
+    def lines(self):
+        return [self.line(position) for position in range(len(self))]
+
+    def position(self, type_id):
+        """Номер строки рецептуры с видом сырья type_id или None."""
+        return self._positions.get(type_id)
+
+    def quantities(self, weight):
+        """Потребность в кг по строкам рецептуры для заданного веса.
+
+        Считается как weight * percent / 100 — тем же порядком операций, что и раньше
+        в маршрутах, чтобы округлённые до граммов количества не сдвинулись.
+        """
+        return [weight * percent / 100 for percent in self.percents]
+
+    def needs_by_type(self, weight):
+        """{material_type_id: кг} для заданного веса (повторяющиеся виды сырья суммируются)."""
+        needs = {}
+        for type_id, quantity in zip(self.type_ids, self.quantities(weight)):
+            needs[type_id] = needs.get(type_id, 0.0) + quantity
+        return needs
+
+    def all_allergen_names(self):
+        """Отсортированные названия аллергенов всего сырья рецептуры."""
+        return sorted({name for names in self.allergen_names for name in names})
+
+    def has_mass_control(self):
+        return any(status == MassControlStatus.CONTROLLED for status in self.mass_controls)
+
+
+_cache = {}
+
+
+def get_bom(template):
+    """CompiledBom для рецептуры (None, если рецептуры нет)."""
+    if template is None:
+        return None
+    bom = _cache.get(template.id)
+    if bom is None or bom.version != template.bom_version:
+        bom = _compile([template])[template.id]
+    return bom
+
+
+def preload_boms(templates):
+    """Компилирует отсутствующие в кэше рецептуры пачкой: два запроса на любое их количество."""
+    stale = {}
+    for template in templates:
+        if template is None or template.id in stale:
+            continue
+        bom = _cache.get(template.id)
+        if bom is None or bom.version != template.bom_version:
+            stale[template.id] = template
+    if stale:
+        _compile(stale.values())
+
+
+def _compile(templates):
+    templates = list(templates)
+    template_ids = [template.id for template in templates]
+    items = (
+        db.session.query(
+            RecipeItem.template_id,
+            RecipeItem.material_type_id,
+            RecipeItem.percentage,
+            RawMaterialType.name,
+            RawMaterialType.halal_status,
+            RawMaterialType.mass_control,
+        )
+        .outerjoin(RawMaterialType, RecipeItem.material_type_id == RawMaterialType.id)
+        .filter(RecipeItem.template_id.in_(template_ids))
+        .order_by(RecipeItem.template_id, RecipeItem.id)
+        .all()
+    )
+
+    type_ids = {item.material_type_id for item in items if item.material_type_id is not None}
+    allergens_by_type = {}
+    if type_ids:
+        allergen_rows = db.session.execute(
+            select(
+                raw_material_type_allergens.c.raw_material_type_id,
+                AllergenType.id,
+                AllergenType.name,
+            )
+            .join(AllergenType, AllergenType.id == raw_material_type_allergens.c.allergen_type_id)
+            .where(raw_material_type_allergens.c.raw_material_type_id.in_(type_ids))
+            .order_by(AllergenType.name)
+        )
+        for type_id, allergen_id, allergen_name in allergen_rows:
+            allergens_by_type.setdefault(type_id, []).append((allergen_id, allergen_name))
+
+    rows_by_template = {template_id: [] for template_id in template_ids}
+    for item in items:
+        allergens = allergens_by_type.get(item.material_type_id, ())
+        rows_by_template[item.template_id].append((
+            item.material_type_id,
+            float(item.percentage or 0),
+            item.name if item.name is not None else 'Удалено',
+            tuple(allergen_id for allergen_id, _ in allergens),
+            tuple(allergen_name for _, allergen_name in allergens),
+            item.halal_status,
+            item.mass_control,
+        ))
+
+    compiled = {}
+    for template in templates:
+        compiled[template.id] = CompiledBom(template.id, template.bom_version, rows_by_template[template.id])
+        _cache[template.id] = compiled[template.id]
+    return compiled
+
+
+def bump_bom_version(template):
+    """Отмечает изменение состава рецептуры (в текущей транзакции)."""
+    template.bom_version = (template.bom_version or 0) + 1
+
+
+def bump_bom_versions_for_material_types(type_ids):
+    """Увеличивает версию всех рецептур, в которых есть указанные виды сырья."""
+    type_ids = list(type_ids)
+    if not type_ids:
+        return
+    db.session.execute(
+        update(RecipeTemplate)
+        .where(RecipeTemplate.id.in_(
+            select(RecipeItem.template_id).where(RecipeItem.material_type_id.in_(type_ids))
+        ))
+        .values(bom_version=RecipeTemplate.bom_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
@@ -5,6 +5,7 @@ import logging
 import os
 import urllib.error
 import urllib.request
+from html import escape
 from typing import Iterable, List, Optional
 
 logger = logging.getLogger(__name__)
@@ -45,17 +46,20 @@ def _format_date(value) -> str:
     return str(value)
 
 
-def send_notification_email(subject: str, html_body: str, text_body: str,
-                            recipients: Optional[Iterable[str]] = None) -> bool:
-    """Отправляет письмо через Unisender Go. Ошибки логируются, исключения не пробрасываются."""
+class EmailSendError(Exception):
+    """Письмо не принято провайдером (ошибка HTTP, сети или ответ не success)."""
+
+
+def post_email(subject: str, html_body: str, text_body: str,
+               recipients: Optional[Iterable[str]] = None, timeout: float = 30) -> List[str]:
+    """Отправляет письмо через Unisender Go; возвращает адреса получателей или бросает EmailSendError."""
     api_key = _env('UNISENDER_GO_API_KEY')
     from_email = _env('MAIL_DEFAULT_SENDER')
     from_name = _env('MAIL_DEFAULT_SENDER_NAME', 'Planner2')
     to_list = list(recipients) if recipients is not None else get_notification_recipients()
 
     if not api_key or not from_email or not to_list:
-        logger.warning('Email notification skipped: missing API key, sender or recipients')
-        return False
+        raise EmailSendError('missing API key, sender or recipients')
 
     payload = {
         'message': {
@@ -85,48 +89,93 @@ def send_notification_email(subject: str, html_body: str, text_body: str,
     )
 
     try:
-        with urllib.request.urlopen(request, timeout=30) as response:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
             body = response.read().decode('utf-8')
             result = json.loads(body) if body else {}
-        status = result.get('status')
-        if status == 'success':
-            logger.info('Email sent: %s -> %s', subject, ', '.join(to_list))
-            return True
-        logger.error('Unisender Go error: %s', result)
-        return False
     except urllib.error.HTTPError as exc:
         err_body = exc.read().decode('utf-8', errors='replace')
-        logger.error('Unisender Go HTTP %s: %s', exc.code, err_body)
-        return False
+        raise EmailSendError(f'HTTP {exc.code}: {err_body}') from exc
     except Exception as exc:
+        raise EmailSendError(str(exc)) from exc
+    if result.get('status') != 'success':
+        raise EmailSendError(f'Unisender Go error: {result}')
+    logger.info('Email sent: %s -> %s', subject, ', '.join(to_list))
+    return to_list
+
+
+def send_notification_email(subject: str, html_body: str, text_body: str,
+                            recipients: Optional[Iterable[str]] = None) -> bool:
+    """Отправляет письмо сразу. Ошибки логируются, исключения не пробрасываются."""
+    try:
+        post_email(subject, html_body, text_body, recipients)
+        return True
+    except EmailSendError as exc:
         logger.error('Email send failed: %s', exc)
         return False
 
 
-def notify_planned_production_date_changed(plan, old_date, new_date, changed_by: str) -> bool:
-    """Уведомление о смене планируемой даты производства на панели менеджеров."""
-    product_name = plan.product.name if plan.product else '—'
-    batch = plan.batch_number or f'#{plan.id}'
-    old_s = _format_date(old_date)
-    new_s = _format_date(new_date)
-    subject = f'Planner2: планируемая дата производства — {product_name}'
+def planned_date_change(plan, old_date, new_date) -> dict:
+    """Строка сводки о смене планируемой даты (значения фиксируются на момент изменения)."""
+    return {
+        'product': plan.product.name if plan.product else '—',
+        'batch': plan.batch_number or f'#{plan.id}',
+        'old': _format_date(old_date),
+        'new': _format_date(new_date),
+    }
+
 
+def render_planned_date_digest(changes, changed_by: str):
+    """Одно письмо на все смены планируемых дат за одно сохранение панели менеджеров.
+
+    Для одного плана письмо такое же, как раньше приходило на каждое изменение.
+
+    Returns:
+        tuple: (subject, html_body, text_body)
+    """
+    if len(changes) == 1:
+        change = changes[0]
+        subject = f"Planner2: планируемая дата производства — {change['product']}"
+        text_body = (
+            f'Изменена планируемая дата производства.\n\n'
+            f"Продукт: {change['product']}\n"
+            f"Партия: {change['batch']}\n"
+            f"Было: {change['old']}\n"
+            f"Стало: {change['new']}\n"
+            f'Изменил: {changed_by}\n'
+        )
+        html_body = (
+            f'<p>Изменена <strong>планируемая дата производства</strong>.</p>'
+            f'<ul>'
+            f"<li><strong>Продукт:</strong> {escape(change['product'])}</li>"
+            f"<li><strong>Партия:</strong> {escape(change['batch'])}</li>"
+            f"<li><strong>Было:</strong> {change['old']}</li>"
+            f"<li><strong>Стало:</strong> {change['new']}</li>"
+            f'<li><strong>Изменил:</strong> {escape(changed_by)}</li>'
+            f'</ul>'
+        )
+        return subject, html_body, text_body
+
+    subject = f'Planner2: планируемые даты производства — {len(changes)} планов'
+    lines = ''.join(
+        f"{change['product']}, партия {change['batch']}: {change['old']} → {change['new']}\n"
+        for change in changes
+    )
     text_body = (
-        f'Изменена планируемая дата производства.\n\n'
-        f'Продукт: {product_name}\n'
-        f'Партия: {batch}\n'
-        f'Было: {old_s}\n'
-        f'Стало: {new_s}\n'
+        f'Изменены планируемые даты производства ({len(changes)} планов).\n\n'
+        f'{lines}\n'
         f'Изменил: {changed_by}\n'
     )
+    rows = ''.join(
+        f"<tr><td>{escape(change['product'])}</td><td>{escape(change['batch'])}</td>"
+        f"<td>{change['old']}</td><td>{change['new']}</td></tr>"
+        for change in changes
+    )
     html_body = (
-        f'<p>Изменена <strong>планируемая дата производства</strong>.</p>'
-        f'<ul>'
-        f'<li><strong>Продукт:</strong> {product_name}</li>'
-        f'<li><strong>Партия:</strong> {batch}</li>'
-        f'<li><strong>Было:</strong> {old_s}</li>'
-        f'<li><strong>Стало:</strong> {new_s}</li>'
-        f'<li><strong>Изменил:</strong> {changed_by}</li>'
-        f'</ul>'
+        f'<p>Изменены <strong>планируемые даты производства</strong> ({len(changes)} планов).</p>'
+        f'<table border="1" cellpadding="4" cellspacing="0">'
+        f'<tr><th>Продукт</th><th>Партия</th><th>Было</th><th>Стало</th></tr>'
+        f'{rows}'
+        f'</table>'
+        f'<p><strong>Изменил:</strong> {escape(changed_by)}</p>'
     )
-    return send_notification_email(subject, html_body, text_body)
+    return subject, html_body, text_body
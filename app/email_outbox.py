@@ -0,0 +1,200 @@
+"""Очередь email-уведомлений (таблица email_outbox).
+
+Раньше панель менеджеров отправляла письмо на каждую смену планируемой даты
+прямо в запросе, после коммита: сохранение ждало HTTP-вызовов Unisender Go, а
+сбой почты терял уведомление. Теперь сохранение пишет одно письмо-сводку в
+email_outbox в той же транзакции, что и сами даты, а отправляет его диспетчер в
+фоновом потоке. Неудачная попытка откладывается с экспоненциальной задержкой;
+после MAX_ATTEMPTS письмо помечается failed. Письма, оставшиеся в очереди после
+перезапуска, отправит следующий вызов dispatch_soon() или send_email_outbox.py.
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select, update
+
+from . import app, db
+from .email_notifications import (
+    EmailSendError, planned_date_change, post_email, render_planned_date_digest,
+)
+from .models import EmailOutbox
+
+PLANNED_DATE_DIGEST = 'planned_date_digest'
+
+MAX_ATTEMPTS = 8
+RETRY_BASE = timedelta(minutes=1)
+RETRY_MAX = timedelta(hours=1)
+# Письмо в статусе sending дольше этого считается брошенным (воркер упал во время отправки)
+STALE_AFTER = timedelta(minutes=10)
+SEND_TIMEOUT = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+_retry_timer = None
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Один поток: письма уходят по очереди, без гонок между диспетчерами процесса
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-outbox')
+        return _executor
+
+
+def queue_planned_date_changes(changes, changed_by, user_id):
+    """Ставит в очередь одно письмо-сводку о сменах планируемых дат (в текущей транзакции).
+
+    Args:
+        changes: [(plan, old_date, new_date), ...]
+        changed_by: имя пользователя для текста письма
+    """
+    db.session.add(EmailOutbox(
+        kind=PLANNED_DATE_DIGEST,
+        payload=json.dumps({
+            'changes': [planned_date_change(plan, old, new) for plan, old, new in changes],
+            'changed_by': changed_by,
+        }, ensure_ascii=False),
+        status=EmailOutbox.STATUS_PENDING,
+        created_by=user_id,
+        created_at=datetime.now(),
+    ))
+
+
+def dispatch_soon():
+    """Запускает отправку очереди в фоновом потоке; запрос не ждёт почту."""
+    _get_executor().submit(_dispatch_in_background)
+
+
+def dispatch():
+    """Отправляет письма, срок которых наступил. Нужен контекст приложения.
+
+    Returns:
+        dict: {'sent': n, 'retry': n, 'failed': n}
+    """
+    counts = {'sent': 0, 'retry': 0, 'failed': 0}
+    now = datetime.now()
+    due_ids = db.session.scalars(
+        select(EmailOutbox.id)
+        .where(_due(now))
+        .order_by(EmailOutbox.id)
+    ).all()
+    for message_id in due_ids:
+        if not _claim(message_id):
+            continue
+        counts[_send(message_id)] += 1
+    return counts
+
+
+def next_attempt_at():
+    """Время ближайшей повторной попытки или None, если ждать нечего."""
+    return db.session.scalar(
+        select(func.min(EmailOutbox.next_attempt_at))
+        .where(EmailOutbox.status.in_([EmailOutbox.STATUS_PENDING, EmailOutbox.STATUS_SENDING]))
+    )
+
+
+def _due(now):
+    return (
+        EmailOutbox.status.in_([EmailOutbox.STATUS_PENDING, EmailOutbox.STATUS_SENDING])
+        & or_(EmailOutbox.next_attempt_at.is_(None), EmailOutbox.next_attempt_at <= now)
+    )
+
+
+def _claim(message_id):
+    """Атомарно забирает письмо: sending и срок аренды в next_attempt_at.
+
+    Условие повторяет выборку, поэтому письмо забирает только один диспетчер,
+    даже если их несколько (воркеры gunicorn, send_email_outbox.py).
+    """
+    now = datetime.now()
+    result = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id == message_id, _due(now))
+        .values(status=EmailOutbox.STATUS_SENDING, next_attempt_at=now + STALE_AFTER)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _send(message_id):
+    message = db.session.get(EmailOutbox, message_id)
+    try:
+        # Письмо готовится до коммита: после него обращение к message открыло бы новую транзакцию
+        subject, html_body, text_body = _render(message)
+    except (KeyError, ValueError) as e:
+        return _record_failure(message, e)
+    # Сетевой вызов — без открытой транзакции
+    db.session.commit()
+    try:
+        recipients = post_email(subject, html_body, text_body, timeout=SEND_TIMEOUT)
+    except EmailSendError as e:
+        return _record_failure(message, e)
+
+    message.attempts += 1
+    message.status = EmailOutbox.STATUS_SENT
+    message.sent_at = datetime.now()
+    message.next_attempt_at = None
+    message.last_error = None
+    message.recipients = ', '.join(recipients)
+    db.session.commit()
+    return 'sent'
+
+
+def _record_failure(message, error):
+    """Откладывает письмо с экспоненциальной задержкой или, после MAX_ATTEMPTS, помечает failed."""
+    message.attempts += 1
+    message.last_error = str(error)
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = EmailOutbox.STATUS_FAILED
+        message.next_attempt_at = None
+        outcome = 'failed'
+        app.logger.error('Письмо %s не отправлено после %s попыток: %s', message.id, message.attempts, error)
+    else:
+        message.status = EmailOutbox.STATUS_PENDING
+        message.next_attempt_at = datetime.now() + _retry_delay(message.attempts)
+        outcome = 'retry'
+        app.logger.warning('Письмо %s не отправлено (попытка %s): %s', message.id, message.attempts, error)
+    db.session.commit()
+    return outcome
+
+
+def _render(message):
+    payload = json.loads(message.payload)
+    if message.kind == PLANNED_DATE_DIGEST:
+        return render_planned_date_digest(payload['changes'], payload['changed_by'])
+    raise ValueError(f'Неизвестный вид письма: {message.kind}')
+
+
+def _retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def _dispatch_in_background():
+    with app.app_context():
+        try:
+            dispatch()
+            _schedule_retry(next_attempt_at())
+        except Exception:
+            app.logger.exception('Ошибка отправки очереди писем')
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def _schedule_retry(when):
+    """Перезапускает диспетчер к сроку ближайшей повторной попытки (один таймер на процесс)."""
+    global _retry_timer
+    if when is None:
+        return
+    delay = max((when - datetime.now()).total_seconds(), 0) + 1
+    with _executor_lock:
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+        _retry_timer = threading.Timer(delay, dispatch_soon)
+        _retry_timer.daemon = True
+        _retry_timer.start()
@@ -0,0 +1,176 @@
+"""Фоновые Excel-выгрузки.
+
+Задание записывается в export_jobs и выполняется в локальном пуле потоков
+(в контексте приложения), поэтому тяжёлая выгрузка не занимает воркер gunicorn.
+Готовый файл сохраняется в instance/exports/<id>.xlsx. Повторный запрос с теми
+же параметрами получает уже готовое или выполняющееся задание, пока не
+изменились исходные данные. Отпечаток данных — версия данных отчётов из
+app/report_cache.py: счётчик, который after_commit увеличивает при любом
+изменении планов, замесов, сырья и рецептур, в том числе в ту же секунду.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import OperationalError
+
+from . import app, db, report_cache
+from .exports import EXPORT_BUILDERS
+from .models import ExportJob
+from .utils import XlsxStream
+
+EXPORT_DIR = os.path.join(app.instance_path, 'exports')
+
+# Задание в очереди или в работе дольше этого считается брошенным (например, перезапуск воркера)
+STALE_AFTER = timedelta(minutes=30)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('EXPORT_WORKERS', 2),
+                thread_name_prefix='export',
+            )
+        return _executor
+
+
+def make_params_key(kind, params):
+    raw = json.dumps([kind, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def data_fingerprint():
+    """Отпечаток исходных данных: текущая версия данных отчётов (report_cache.data_version)."""
+    return f'{report_cache.REPORTS}:{report_cache.data_version()}'
+
+
+def start_export(kind, params, user_id):
+    """Возвращает задание для выгрузки: готовое/выполняющееся с теми же параметрами и данными или новое."""
+    params_key = make_params_key(kind, params)
+    fingerprint = data_fingerprint()
+
+    candidates = (
+        ExportJob.query.filter(
+            ExportJob.params_key == params_key,
+            ExportJob.data_fingerprint == fingerprint,
+            or_(
+                ExportJob.status == ExportJob.STATUS_DONE,
+                and_(
+                    ExportJob.status.in_([ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING]),
+                    ExportJob.created_at >= datetime.now() - STALE_AFTER,
+                ),
+            ),
+        )
+        .order_by(ExportJob.id.desc())
+        .all()
+    )
+    for job in candidates:
+        if job.status != ExportJob.STATUS_DONE or (job.artifact_path and os.path.exists(job.artifact_path)):
+            return job
+
+    job = ExportJob(
+        kind=kind,
+        params=json.dumps(params, sort_keys=True, ensure_ascii=False),
+        params_key=params_key,
+        data_fingerprint=fingerprint,
+        status=ExportJob.STATUS_PENDING,
+        created_by=user_id,
+        created_at=datetime.now(),
+    )
+    db.session.add(job)
+    db.session.commit()
+    _get_executor().submit(_run_job, job.id)
+    return job
+
+
+def _run_job(job_id):
+    with app.app_context():
+        try:
+            job = db.session.get(ExportJob, job_id)
+            if job is None or job.status != ExportJob.STATUS_PENDING:
+                return
+            job.status = ExportJob.STATUS_RUNNING
+            job.started_at = datetime.now()
+            db.session.commit()
+
+            builder, _ = EXPORT_BUILDERS[job.kind]
+            export = XlsxStream(progress=lambda rows: _report_progress(job_id, rows))
+            filename = builder(export, json.loads(job.params))
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            path = os.path.join(EXPORT_DIR, f'{job_id}.xlsx')
+            export.save(path)
+
+            job.status = ExportJob.STATUS_DONE
+            job.rows_written = export.rows_written
+            job.filename = filename
+            job.artifact_path = path
+            job.finished_at = datetime.now()
+            db.session.commit()
+            _remove_superseded(job)
+        except Exception as e:
+            app.logger.exception('Ошибка фоновой выгрузки %s', job_id)
+            db.session.rollback()
+            job = db.session.get(ExportJob, job_id)
+            if job is not None:
+                job.status = ExportJob.STATUS_FAILED
+                job.error = str(e)
+                job.finished_at = datetime.now()
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def _report_progress(job_id, rows_written):
+    """Обновляет счётчик строк отдельным соединением: основная сессия читает выгрузку курсором.
+
+    В SQLite открытый читающий курсор не даёт другому соединению зафиксировать запись
+    (ожидание до таймаута блокировки), поэтому там счётчик обновляется только в конце.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(ExportJob).where(ExportJob.id == job_id).values(rows_written=rows_written)
+            )
+    except OperationalError:
+        # Прогресс необязателен, выгрузка продолжается
+        pass
+
+
+def _remove_superseded(job):
+    """Удаляет файлы более старых готовых заданий с теми же параметрами."""
+    older = ExportJob.query.filter(
+        ExportJob.params_key == job.params_key,
+        ExportJob.id != job.id,
+        ExportJob.artifact_path.isnot(None),
+    ).all()
+    for old_job in older:
+        try:
+            os.remove(old_job.artifact_path)
+        except OSError:
+            pass
+        old_job.artifact_path = None
+    db.session.commit()
+
+
+def job_payload(job):
+    """Состояние задания для опроса из браузера."""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'rows_written': job.rows_written,
+        'filename': job.filename,
+        'error': job.error,
+    }
@@ -0,0 +1,201 @@
+"""Построители Excel-выгрузок отчётов.
+
+Каждый построитель заполняет переданный XlsxStream по параметрам выгрузки и
+возвращает имя файла. Они не зависят от текущего запроса, поэтому вызываются
+и из маршрутов (синхронная выгрузка), и из фоновых заданий (export_jobs).
+"""
+
+from datetime import datetime
+
+from sqlalchemy.orm import selectinload
+
+from . import db
+from .production_rollups import material_usage_by_day, production_by_day
+from .models import (
+    ProductionPlan, PlanStatus, ProductionBatch, BatchMaterial, MaterialBatch,
+    RawMaterial, RawMaterialType, Product, RecipeTemplate,
+)
+from .utils import format_datetime, EXPORT_YIELD_PER
+
+
+def build_raw_material_usage(export, params):
+    """Использование сырья по всем планам: строка на каждый ингредиент замеса."""
+    headers = ["Дата", "Вид сырья", "Партия", "Использовано (кг)", "План производства", "Продукт"]
+
+    # Строки читаются с сервера пачками, без загрузки всей истории в память.
+    # Внутренние соединения отбрасывают записи с удалённым сырьём.
+    usage = (
+        db.session.query(
+            ProductionPlan.created_at,
+            RawMaterialType.name,
+            RawMaterial.batch_number,
+            BatchMaterial.quantity,
+            ProductionPlan.batch_number,
+            Product.name,
+        )
+        .select_from(ProductionPlan)
+        .join(Product, ProductionPlan.product_id == Product.id)
+        .join(ProductionBatch, ProductionBatch.plan_id == ProductionPlan.id)
+        .join(BatchMaterial, BatchMaterial.batch_id == ProductionBatch.id)
+        .join(MaterialBatch, BatchMaterial.material_batch_id == MaterialBatch.id)
+        .join(RawMaterial, MaterialBatch.material_id == RawMaterial.id)
+        .join(RawMaterialType, RawMaterial.type_id == RawMaterialType.id)
+        .order_by(
+            ProductionPlan.created_at.desc(), ProductionPlan.id.desc(),
+            ProductionBatch.id, BatchMaterial.id,
+        )
+        .yield_per(EXPORT_YIELD_PER)
+    )
+    rows = (
+        [
+            created_at.strftime("%Y-%m-%d"),
+            type_name,
+            material_batch_number or 'N/A',
+            quantity,
+            f"№{plan_batch_number}",
+            product_name
+        ]
+        for created_at, type_name, material_batch_number, quantity, plan_batch_number, product_name in usage
+    )
+
+    export.add_sheet("Использование сырья", headers, rows)
+    # Итоги завершённых планов по дням — из сводной таблицы
+    export.add_sheet(
+        "Расход по дням",
+        ["Дата", "Вид сырья", "Партия", "Израсходовано (кг)"],
+        (
+            [day.strftime("%Y-%m-%d"), type_name, batch_number or 'N/A', used_kg]
+            for day, type_name, batch_number, used_kg in material_usage_by_day()
+        ),
+    )
+    return f"raw_material_usage_{format_datetime(datetime.now())}.xlsx"
+
+
+def build_production_statistics(export, params):
+    """Детализация производства: план → замес → ингредиент."""
+    headers = [
+        "Дата плана", "Продукт", "Рецептура", "План №", "Статус плана", "Кол-во (кг)",
+        "Замес №", "Вес замеса (кг)", "Дата производства замеса",
+        "Сырье", "Партия сырья", "Кол-во сырья (кг)"
+    ]
+
+    # Плоский запрос план → замес → ингредиент; строки читаются пачками
+    details = (
+        db.session.query(
+            ProductionPlan,
+            Product.name,
+            RecipeTemplate.name,
+            ProductionBatch.id,
+            ProductionBatch.batch_number,
+            ProductionBatch.weight,
+            ProductionBatch.production_date,
+            BatchMaterial.id,
+            BatchMaterial.quantity,
+            MaterialBatch.batch_number,
+            RawMaterialType.name,
+        )
+        .outerjoin(Product, ProductionPlan.product_id == Product.id)
+        .outerjoin(RecipeTemplate, ProductionPlan.template_id == RecipeTemplate.id)
+        .outerjoin(ProductionBatch, ProductionBatch.plan_id == ProductionPlan.id)
+        .outerjoin(BatchMaterial, BatchMaterial.batch_id == ProductionBatch.id)
+        .outerjoin(MaterialBatch, BatchMaterial.material_batch_id == MaterialBatch.id)
+        .outerjoin(RawMaterial, MaterialBatch.material_id == RawMaterial.id)
+        .outerjoin(RawMaterialType, RawMaterial.type_id == RawMaterialType.id)
+        .order_by(
+            ProductionPlan.created_at.desc(), ProductionPlan.id.desc(),
+            ProductionBatch.id, BatchMaterial.id,
+        )
+        .yield_per(EXPORT_YIELD_PER)
+    )
+
+    def rows():
+        for (plan, product_name, template_name, batch_id, batch_number, batch_weight,
+             batch_production_date, ingredient_id, ingredient_qty, material_batch_number, type_name) in details:
+            plan_info = [
+                plan.created_at.strftime("%Y-%m-%d"),
+                product_name,
+                template_name,
+                plan.batch_number,
+                plan.status,
+                plan.get_report_quantity_kg()
+            ]
+            if batch_id is None:
+                yield plan_info  # Только информация о плане, если нет замесов
+                continue
+
+            batch_info = plan_info + [
+                batch_number,
+                batch_weight,
+                batch_production_date.strftime("%Y-%m-%d") if batch_production_date else "Не указана"
+            ]
+            if ingredient_id is None:
+                yield batch_info  # Инфо о плане и замесе, если нет ингредиентов
+                continue
+
+            # Безопасная проверка на удалённое сырьё
+            if type_name is not None:
+                material_info = [type_name, material_batch_number or "N/A"]
+            else:
+                material_info = ["Удалено", "N/A"]
+            yield batch_info + material_info + [ingredient_qty]
+
+    export.add_sheet("Детализация производства", headers, rows())
+    # Итоги завершённых планов по дням — из сводной таблицы
+    export.add_sheet(
+        "Итоги по дням",
+        ["Дата", "Продукт", "Рецептура", "Количество планов", "Произведено (кг)"],
+        (
+            [day.strftime("%Y-%m-%d"), product_name, recipe_name, plans_count, produced_kg]
+            for day, product_name, recipe_name, plans_count, produced_kg in production_by_day()
+        ),
+    )
+    return f"production_statistics_{format_datetime(datetime.now())}.xlsx"
+
+
+def build_production_plans(export, params):
+    """Отчёт по планам производства.
+
+    params['include_pending'] — включать планы «На утверждении» (только для администраторов).
+    """
+    headers = ["Дата внесения в план", "Продукт", "Партия", "Количество (кг)", "Статус", "Номер недели", "Отслеживание", "Контроль ОКК"]
+
+    # Планы пачками; сумма замесов хранится в самом плане (produced_kg)
+    plans_query = ProductionPlan.query
+    if not params.get('include_pending'):
+        plans_query = plans_query.filter(ProductionPlan.status != PlanStatus.PENDING_APPROVAL)
+    plans = (
+        plans_query.options(selectinload(ProductionPlan.product))
+        .order_by(ProductionPlan.created_at.desc())
+        .yield_per(EXPORT_YIELD_PER)
+    )
+
+    def rows():
+        for plan in plans:
+            # Вычисляем прогресс выполнения
+            total_produced = plan.get_produced_kg()
+            progress_percent = (total_produced / plan.quantity * 100) if plan.quantity > 0 else 0
+
+            # Вычисляем номер недели
+            week_number = plan.created_at.isocalendar()[1]
+
+            yield [
+                plan.created_at.strftime("%Y-%m-%d"),
+                plan.product.name,
+                plan.batch_number,
+                plan.get_report_quantity_kg(),
+                plan.status_display_label,
+                week_number,
+                "",  # Пустая ячейка для "Отслеживание"
+                f"{progress_percent:.1f}"
+            ]
+
+    export.add_sheet("Планы производства", headers, rows())
+    return f"production_plans_{format_datetime(datetime.now())}.xlsx"
+
+
+# Выгрузки, которые можно запускать фоновым заданием: вид → (построитель, название)
+EXPORT_BUILDERS = {
+    'raw_material_usage': (build_raw_material_usage, 'Использование сырья'),
+    'production_statistics': (build_production_statistics, 'Детализация производства'),
+    'production_plans': (build_production_plans, 'Планы производства'),
+}
@@ -11,10 +11,13 @@ def coerce_optional_int(value):
     except (ValueError, TypeError):
         return None
 from .models import (
-    RawMaterial, RecipeTemplate as Recipe, Product, RawMaterialType, RecipeItem as RecipeIngredient,
-    ProductionPlan, PlanStatus, User, UserRole, AllergenType, MonthlyPlan, Employee, HalalStatus, MassControlStatus,
+    RawMaterial, RecipeTemplate as Recipe, RawMaterialType, RecipeItem as RecipeIngredient,
+    ProductionPlan, PlanStatus, User, UserRole, MonthlyPlan, HalalStatus, MassControlStatus,
     PalletType,
 )
+from .stock_ledger import on_hand_by_type
+from .bom import get_bom
+from . import reference_data
 
 class AllergenTypeForm(FlaskForm):
     name = StringField('Название аллергена', validators=[DataRequired()])
@@ -41,7 +44,7 @@ class RawMaterialTypeForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(RawMaterialTypeForm, self).__init__(*args, **kwargs)
-        self.allergen_type_ids.choices = [(a.id, a.name) for a in AllergenType.query.all()]
+        self.allergen_type_ids.choices = reference_data.choices(reference_data.allergens())
 
 class EditRawMaterialTypeForm(FlaskForm):
     name = StringField('Название сырья', validators=[DataRequired()])
@@ -59,7 +62,7 @@ class EditRawMaterialTypeForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(EditRawMaterialTypeForm, self).__init__(*args, **kwargs)
-        self.allergen_type_ids.choices = [(a.id, a.name) for a in AllergenType.query.all()]
+        self.allergen_type_ids.choices = reference_data.choices(reference_data.allergens())
 
 class RawMaterialForm(FlaskForm):
     type_id = SelectField('Вид сырья', coerce=int, validators=[DataRequired()])
@@ -118,7 +121,7 @@ class RecipeForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.allergen_type_ids.choices = [(a.id, a.name) for a in AllergenType.query.order_by(AllergenType.name).all()]
+        self.allergen_type_ids.choices = reference_data.choices(reference_data.allergens())
 
     def validate_name(self, field):
         if self.product_id.data:
@@ -152,7 +155,7 @@ class RecipeAllergenForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.allergen_type_ids.choices = [(a.id, a.name) for a in AllergenType.query.order_by(AllergenType.name).all()]
+        self.allergen_type_ids.choices = reference_data.choices(reference_data.allergens())
 
 
 class RecipeIngredientForm(FlaskForm):
@@ -200,16 +203,14 @@ class ProductionPlanForm(FlaskForm):
         
         # Проверяем наличие сырья только при утверждении плана
         if self.approve.data and self.template_id.data:
-            recipe = Recipe.query.get(self.template_id.data)
-            if recipe:
-                for ingredient in recipe.recipe_items:
-                    needed_quantity = (field.data * float(ingredient.percentage)) / 100
-                    available_quantity = sum(
-                        rm.quantity_kg for rm in RawMaterial.query.filter_by(type_id=ingredient.material_type_id).all()
-                    )
+            bom = get_bom(Recipe.query.get(self.template_id.data))
+            if bom:
+                on_hand = on_hand_by_type(bom.type_ids)
+                for line, needed_quantity in zip(bom.lines(), bom.quantities(field.data)):
+                    available_quantity = on_hand.get(line.id, 0.0)
                     if available_quantity < needed_quantity:
                         raise ValidationError(
-                            f'Недостаточно сырья {ingredient.material_type.name}. '
+                            f'Недостаточно сырья {line.name}. '
                             f'Требуется: {needed_quantity:.2f} кг, доступно: {available_quantity:.2f} кг'
                         )
 
@@ -277,7 +278,7 @@ class ProductionBatchForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(ProductionBatchForm, self).__init__(*args, **kwargs)
         # Используем пустую строку для "не указан", coerce_optional_int обработает её как None
-        self.employee_id.choices = [('', 'Не указан')] + [(e.id, e.get_full_name()) for e in Employee.query.order_by(Employee.last_name, Employee.first_name).all()]
+        self.employee_id.choices = reference_data.employee_choices()
 
 class EditBatchProductionDateForm(FlaskForm):
     production_date = DateField('Дата производства', format='%Y-%m-%d', validators=[Optional()])
@@ -290,7 +291,7 @@ class EditBatchEmployeeForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(EditBatchEmployeeForm, self).__init__(*args, **kwargs)
         # Используем пустую строку для "не указан", coerce_optional_int обработает её как None
-        self.employee_id.choices = [('', 'Не указан')] + [(e.id, e.get_full_name()) for e in Employee.query.order_by(Employee.last_name, Employee.first_name).all()]
+        self.employee_id.choices = reference_data.employee_choices()
 
 class BatchIngredientForm(FlaskForm):
     raw_material_id = SelectField('Партия сырья', coerce=int)
@@ -387,7 +388,7 @@ class MonthlyPlanForm(FlaskForm):
         self.month.choices = [(i, month_names[i-1]) for i in range(1, 13)]
         
         # Продукты
-        self.product_id.choices = [(p.id, p.name) for p in Product.query.all()]
+        self.product_id.choices = reference_data.choices(reference_data.products())
         
         # Рецептуры
         # Проверяем, есть ли уже выбранный продукт (для режима редактирования)
@@ -0,0 +1,102 @@
+"""Условные GET-запросы (ETag / If-None-Match) для JSON-справочников форм и списков.
+
+Раньше JavaScript форм и терминалы цеха, постоянно обновляющие списки, на
+каждый запрос получали заново прочитанный и заново отрисованный ответ. Теперь
+маршрут с декоратором conditional_get отдаёт ETag, собранный из версий данных
+(data_versions: счётчик reports из app/report_cache.py и версии справочников из
+app/reference_data.py) и всего, что ещё влияет на ответ: адреса с параметрами,
+пользователя, сегодняшней даты, CSRF-секрета сессии и интервала действия
+токена форм, версии кода. Если браузер присылает тот же ETag в If-None-Match, маршрут не
+выполняется: ответ 304 стоит одного запроса к data_versions.
+
+Cache-Control: private, no-cache — браузер хранит ответ, но перед каждым
+показом сверяется с сервером. Пока в сессии есть непоказанные сообщения
+(flash), проверка не выполняется и страница отрисовывается полностью.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+from sqlalchemy import select
+
+from . import app, db
+from .models import DataVersion
+
+# CSRF-токен формы действует WTF_CSRF_TIME_LIMIT секунд (Flask-WTF)
+DEFAULT_CSRF_TIME_LIMIT = 3600
+
+
+def conditional_get(view):
+    """Отвечает 304 на GET с актуальным If-None-Match, иначе добавляет ETag к ответу."""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        etag = current_etag()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return decorated_function
+
+
+def current_etag():
+    """ETag ответа на текущий запрос при текущих версиях данных."""
+    versions = db.session.execute(
+        select(DataVersion.name, DataVersion.version).order_by(DataVersion.name)
+    ).all()
+    parts = [
+        _code_version(),
+        request.full_path,
+        current_user.get_id(),
+        getattr(current_user, 'role', None),
+        date.today(),
+        _csrf_window(),
+        _csrf_secret(),
+        [list(row) for row in versions],
+    ]
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def _csrf_secret():
+    # Новая сессия (повторный вход) — новый секрет: формы со старым токеном из кэша не пройдут проверку
+    secret = session.get(app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+    return hashlib.sha1(secret.encode()).hexdigest() if secret else None
+
+
+def _csrf_window():
+    # Полуинтервал действия токена: страница из кэша браузера не старше срока токена
+    limit = app.config.get('WTF_CSRF_TIME_LIMIT', DEFAULT_CSRF_TIME_LIMIT)
+    if not limit:
+        return 0
+    return int(time.time() // (limit / 2))
+
+
+_code_version_cache = None
+
+
+def _code_version():
+    """Отметка шаблонов и модулей приложения: после обновления кода ETag меняется."""
+    global _code_version_cache
+    if _code_version_cache is None:
+        root = os.path.dirname(__file__)
+        latest = 0.0
+        for directory, _, files in os.walk(root):
+            for name in files:
+                if name.endswith(('.py', '.html')):
+                    latest = max(latest, os.path.getmtime(os.path.join(directory, name)))
+        _code_version_cache = str(latest)
+    return _code_version_cache
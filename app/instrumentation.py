@@ -0,0 +1,157 @@
+"""Измерение SQL-запросов и времени обработки HTTP-запросов.
+
+Слушатели событий движка SQLAlchemy считают запросы текущего HTTP-запроса
+(в g): количество, суммарное время в БД и самые медленные выражения. По
+завершении запроса результат уходит в заголовки ответа X-DB-Query-Count,
+X-DB-Time-ms, X-Request-Time-ms, в JSON-строку лога planner2.requests и в
+скользящую выборку по endpoint для страницы /admin/performance.
+
+Выборка хранится в памяти процесса: у каждого воркера gunicorn она своя.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('planner2.requests')
+
+# Сколько последних запросов каждого endpoint хранится для перцентилей
+SAMPLES_PER_ENDPOINT = 500
+# Сколько самых медленных SQL-выражений запоминается (на запрос и на endpoint)
+SLOWEST_STATEMENTS = 5
+STATEMENT_MAX_LENGTH = 500
+
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_ENDPOINT))
+_slowest = defaultdict(list)
+_lock = threading.Lock()
+
+
+def init_app(app, engine):
+    """Подключает учёт к движку БД и к обработке запросов приложения."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'db_stats' in g:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'db_stats' in g):
+        return
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    stats = g.db_stats
+    stats['count'] += 1
+    stats['time'] += duration
+    _keep_slowest(stats['slowest'], duration, statement)
+
+
+def _keep_slowest(slowest, duration, statement):
+    """Поддерживает список [(секунды, выражение)] из SLOWEST_STATEMENTS самых медленных."""
+    if len(slowest) < SLOWEST_STATEMENTS or duration > slowest[-1][0]:
+        slowest.append((duration, ' '.join(statement.split())[:STATEMENT_MAX_LENGTH]))
+        slowest.sort(key=lambda item: item[0], reverse=True)
+        del slowest[SLOWEST_STATEMENTS:]
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.db_stats = {'count': 0, 'time': 0.0, 'slowest': []}
+
+
+def _finish_request(response):
+    stats = g.pop('db_stats', None)
+    started = g.pop('request_started', None)
+    if stats is None or started is None:
+        return response
+    wall_ms = (time.perf_counter() - started) * 1000
+    db_ms = stats['time'] * 1000
+    endpoint = request.endpoint or 'unknown'
+
+    response.headers['X-DB-Query-Count'] = str(stats['count'])
+    response.headers['X-DB-Time-ms'] = f'{db_ms:.1f}'
+    response.headers['X-Request-Time-ms'] = f'{wall_ms:.1f}'
+
+    if endpoint == 'static':
+        return response
+
+    logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'wall_ms': round(wall_ms, 1),
+        'db_ms': round(db_ms, 1),
+        'queries': stats['count'],
+        'slowest_ms': [round(duration * 1000, 1) for duration, _ in stats['slowest'][:3]],
+    }, ensure_ascii=False))
+
+    with _lock:
+        _samples[endpoint].append((wall_ms, db_ms, stats['count']))
+        endpoint_slowest = _slowest[endpoint]
+        for duration, statement in stats['slowest']:
+            _keep_slowest(endpoint_slowest, duration, statement)
+    return response
+
+
+def _percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def endpoint_report():
+    """Сводка по endpoint: число запросов в выборке и перцентили времени и количества SQL-запросов."""
+    with _lock:
+        samples = {endpoint: list(values) for endpoint, values in _samples.items()}
+        slowest = {endpoint: list(values) for endpoint, values in _slowest.items()}
+
+    report = []
+    for endpoint, values in samples.items():
+        wall = [wall_ms for wall_ms, _, _ in values]
+        db_time = [db_ms for _, db_ms, _ in values]
+        queries = [count for _, _, count in values]
+        report.append({
+            'endpoint': endpoint,
+            'requests': len(values),
+            'wall_p50': _percentile(wall, 50),
+            'wall_p95': _percentile(wall, 95),
+            'wall_p99': _percentile(wall, 99),
+            'db_p50': _percentile(db_time, 50),
+            'db_p95': _percentile(db_time, 95),
+            'queries_p50': _percentile(queries, 50),
+            'queries_p95': _percentile(queries, 95),
+            'queries_max': max(queries),
+            'slowest': [(duration * 1000, statement) for duration, statement in slowest.get(endpoint, [])],
+        })
+    report.sort(key=lambda row: row['wall_p95'], reverse=True)
+    return report
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _slowest.clear()
@@ -0,0 +1,148 @@
+"""Прогноз потребности в сырье по утверждённым планам (страница и Excel-выгрузка).
+
+Раньше страница и выгрузка каждая сама проходили по планам в цикле Python и
+заполняли словарь «дата → все виды сырья». Теперь расчёт общий и матричный:
+планы читаются одним запросом, составы рецептур (CompiledBom из app/bom.py)
+собираются в матрицу «рецептура × вид сырья», а потребность по дням — это
+строки этой матрицы, умноженные на кг планов и сложенные по датам.
+
+Кроме потребности считается позиция с учётом сроков годности: к каждой дате
+пригодны только партии с остатком, срок которых не истёк к этой дате (и не
+раньше сегодняшнего дня — просроченное сейчас не годится ни для какой даты).
+Оценка консервативная: не учитывается, что более ранняя потребность могла бы
+израсходовать партии, которые истекут первыми.
+"""
+
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import select
+
+from . import db
+from .bom import get_bom, preload_boms
+from .models import ProductionPlan, PlanStatus, RawMaterial, RawMaterialType, RecipeTemplate
+from .stock_ledger import on_hand_by_type
+
+
+class MaterialForecast:
+    """Потребность по дням и позиция по видам сырья (столбцы — в порядке type_ids)."""
+
+    def __init__(self, type_ids, type_names, dates, daily, on_hand, usable):
+        self.type_ids = type_ids
+        self.type_names = type_names
+        self.dates = dates
+        # Массивы дата × вид сырья
+        self.daily = daily
+        self.cumulative = np.cumsum(daily, axis=0)
+        self.total = self.cumulative[-1] if dates else np.zeros(len(type_ids))
+        self.on_hand = on_hand
+        self.balance = on_hand - self.total
+        # Пригодный к дате остаток минус накопленная к ней потребность
+        self.net_position = usable - self.cumulative
+        short = self.net_position < 0
+        first_short = np.argmax(short, axis=0) if dates else np.zeros(len(type_ids), dtype=int)
+        self.shortage_dates = [
+            dates[index] if dates and short[index, column] else None
+            for column, index in enumerate(first_short.tolist())
+        ]
+
+    def daily_rows(self):
+        """[(дата 'ГГГГ-ММ-ДД', [кг по видам сырья])] по возрастанию даты."""
+        return list(zip(self.dates, self.daily.tolist()))
+
+    def type_rows(self):
+        """Сводка по видам сырья для таблиц остатков и достаточности."""
+        return [
+            {
+                'id': type_id,
+                'name': name,
+                'on_hand': on_hand,
+                'total': total,
+                'balance': balance,
+                'shortage_date': shortage_date,
+            }
+            for type_id, name, on_hand, total, balance, shortage_date in zip(
+                self.type_ids, self.type_names, self.on_hand.tolist(), self.total.tolist(),
+                self.balance.tolist(), self.shortage_dates,
+            )
+        ]
+
+
+def build_forecast(today=None):
+    """Прогноз по утверждённым планам; дата потребности — дата создания плана, как и раньше."""
+    today = today or date.today()
+
+    types = db.session.execute(
+        select(RawMaterialType.id, RawMaterialType.name).order_by(RawMaterialType.id)
+    ).all()
+    type_ids = [type_id for type_id, _ in types]
+    type_names = [name for _, name in types]
+    column_of = {type_id: column for column, type_id in enumerate(type_ids)}
+
+    plans = db.session.execute(
+        select(ProductionPlan.template_id, ProductionPlan.quantity, ProductionPlan.created_at)
+        .where(ProductionPlan.status == PlanStatus.APPROVED)
+        .order_by(ProductionPlan.created_at)
+    ).all()
+    plans = [(template_id, quantity, created_at) for template_id, quantity, created_at in plans if template_id]
+
+    on_hand_map = on_hand_by_type()
+    on_hand = np.array([on_hand_map.get(type_id, 0) for type_id in type_ids], dtype=float)
+
+    dates = sorted({created_at.strftime('%Y-%m-%d') for _, _, created_at in plans})
+    if not dates:
+        empty = np.zeros((0, len(type_ids)))
+        return MaterialForecast(type_ids, type_names, dates, empty, on_hand, empty)
+
+    # Матрица долей: рецептура × вид сырья
+    template_ids = sorted({template_id for template_id, _, _ in plans})
+    row_of = {template_id: row for row, template_id in enumerate(template_ids)}
+    templates = RecipeTemplate.query.filter(RecipeTemplate.id.in_(template_ids)).all()
+    preload_boms(templates)
+    fractions = np.zeros((len(template_ids), len(type_ids)))
+    for template in templates:
+        bom = get_bom(template)
+        columns = [column_of[type_id] for type_id in bom.type_ids]
+        # Один вид сырья может встречаться в рецептуре дважды — доли складываются
+        np.add.at(fractions[row_of[template.id]], columns, bom.fractions)
+
+    # Потребность планов (план × вид сырья) и её сумма по датам. np.add.at складывает
+    # строки по порядку планов — суммы совпадают с прежним поэлементным расчётом
+    date_of = {value: index for index, value in enumerate(dates)}
+    date_index = np.array([date_of[created_at.strftime('%Y-%m-%d')] for _, _, created_at in plans])
+    template_index = np.array([row_of[template_id] for template_id, _, _ in plans])
+    quantities = np.array([quantity or 0 for _, quantity, _ in plans], dtype=float)
+    daily = np.zeros((len(dates), len(type_ids)))
+    np.add.at(daily, date_index, fractions[template_index] * quantities[:, None])
+    usable = _usable_by_date(dates, type_ids, column_of, today)
+    return MaterialForecast(type_ids, type_names, dates, daily, on_hand, usable)
+
+
+def _usable_by_date(dates, type_ids, column_of, today):
+    """Остаток партий, пригодных к каждой дате: массив дата × вид сырья."""
+    lots = db.session.execute(
+        select(RawMaterial.type_id, RawMaterial.quantity_kg, RawMaterial.expiration_date)
+        .where(RawMaterial.quantity_kg > 0, RawMaterial.type_id.isnot(None))
+    ).all()
+    usable = np.zeros((len(dates) + 1, len(type_ids)))
+    if not lots:
+        return usable[:-1]
+
+    # Дата, к которой нужна партия, не раньше сегодняшней
+    need_dates = np.maximum(np.array(dates, dtype='datetime64[D]'), np.datetime64(today, 'D'))
+    expirations = np.array(
+        [_as_date(expiration) or date.max for _, _, expiration in lots], dtype='datetime64[D]'
+    )
+    # Партия пригодна для дат с индексом < last: её срок не раньше даты потребности
+    last = np.searchsorted(need_dates, expirations, side='right')
+    columns = np.array([column_of[type_id] for type_id, _, _ in lots])
+    quantities = np.array([quantity for _, quantity, _ in lots], dtype=float)
+    np.add.at(usable, (last, columns), quantities)
+    # Сумма по партиям, пригодным после даты: накопление от последней даты к первой
+    return np.cumsum(usable[::-1], axis=0)[::-1][1:]
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
@@ -1,6 +1,6 @@
-from datetime import date, timedelta
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Date, Enum as SQLAlchemyEnum, Numeric, Table, UniqueConstraint, TypeDecorator
-from sqlalchemy.orm import relationship
+from datetime import date, datetime, timedelta
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Date, Enum as SQLAlchemyEnum, Numeric, Table, Text, UniqueConstraint, Index, TypeDecorator
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from . import db
 import enum
@@ -217,8 +217,21 @@ class RawMaterial(db.Model):
     type = relationship("RawMaterialType", back_populates="raw_materials")
     batches = relationship("MaterialBatch", back_populates="material")
 
+    __table_args__ = (
+        Index('ix_raw_materials_type_id_expiration_date', 'type_id', 'expiration_date'),
+        # Порядок FEFO в StockSnapshot (app/allocation.py): только партии с остатком, PostgreSQL
+        Index(
+            'ix_raw_materials_active_fefo', 'type_id', 'expiration_date', 'id',
+            postgresql_where=quantity_kg > 0,
+        ).ddl_if(dialect='postgresql'),
+    )
+
     def get_usage(self):
         """Возвращает общее количество использованного сырья в килограммах"""
+        # Страницы со списками партий заранее считают расход (stock_ledger.attach_usage)
+        usage_kg = getattr(self, 'usage_kg', None)
+        if usage_kg is not None:
+            return usage_kg
         total_usage = 0.0
         for batch in self.batches:
             for batch_material in batch.batch_materials:
@@ -227,6 +240,9 @@ class RawMaterial(db.Model):
 
     def get_batch_count(self):
         """Возвращает количество замесов, в которых использовалось сырье"""
+        batch_count = getattr(self, 'usage_batch_count', None)
+        if batch_count is not None:
+            return batch_count
         unique_batches = set()
         for batch in self.batches:
             for batch_material in batch.batch_materials:
@@ -237,7 +253,7 @@ class MaterialBatch(db.Model):
     __tablename__ = "material_batches"
 
     id = Column(Integer, primary_key=True, index=True)
-    material_id = Column(Integer, ForeignKey("raw_materials.id"))
+    material_id = Column(Integer, ForeignKey("raw_materials.id"), index=True)
     batch_number = Column(String)
     quantity = Column(Float)
     remaining_quantity = Column(Float)
@@ -269,6 +285,8 @@ class RecipeTemplate(db.Model):
     is_default = Column(Boolean, default=False)
     status = Column(String, default="draft")  # draft, saved
     halal_status = Column(HalalStatusType(), nullable=True)
+    # Растёт при изменении состава рецептуры и свойств её сырья (кэш app/bom.py)
+    bom_version = Column(Integer, nullable=False, default=1, server_default='1')
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_by = Column(Integer, ForeignKey("users.id"))
@@ -310,7 +328,9 @@ class ProductionPlan(db.Model):
     quantity = Column(Float)
     batch_number = Column(String)
     status = Column(SQLAlchemyEnum(PlanStatus), default=PlanStatus.DRAFT)
-    notes = Column(String)
+    # Примечание, введённое при создании плана; история изменений — в plan_events.
+    # Отложенная загрузка: списки планов примечание не показывают
+    notes = deferred(Column(String))
     production_date = Column(DateTime(timezone=True), nullable=True)  # Дата фактического производства
     picked_up_at = Column(DateTime(timezone=True), nullable=True)  # Дата/время забора со склада производства
     # Поля панели «Для менеджеров» (не влияют на расчёты плана)
@@ -322,6 +342,9 @@ class ProductionPlan(db.Model):
     shortfall_reason = Column(String(500), nullable=True)
     pallet_type = Column(String(20), nullable=True)  # ЕВРО / ФИН
     kg_per_pallet = Column(Float, nullable=True)
+    # Сумма весов и число замесов плана, поддерживаются app/plan_totals.py
+    produced_kg = Column(Float, nullable=False, default=0.0, server_default='0')
+    batch_count = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_by = Column(Integer, ForeignKey("users.id"))
@@ -329,6 +352,14 @@ class ProductionPlan(db.Model):
     product = relationship("Product", back_populates="production_plans")
     template = relationship("RecipeTemplate", back_populates="production_plans")
     batches = relationship("ProductionBatch", back_populates="plan", cascade="all, delete-orphan")
+    events = relationship("PlanEvent", back_populates="plan", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Списки и отчёты: фильтр по статусу, сортировка по дате создания
+        Index('ix_production_plans_status_created_at', 'status', 'created_at'),
+        # Склад производства: завершённые, забранные/не забранные, по дате завершения
+        Index('ix_production_plans_status_picked_up_at_updated_at', 'status', 'picked_up_at', 'updated_at'),
+    )
 
     @property
     def manager_production_status_label(self) -> str:
@@ -356,7 +387,7 @@ class ProductionPlan(db.Model):
         return None
 
     def get_produced_kg(self) -> float:
-        return sum(batch.weight for batch in self.batches) if self.batches else 0.0
+        return self.produced_kg or 0.0
 
     def get_report_quantity_kg(self) -> float:
         """Для отчётов: завершённый план — факт (сумма замесов), иначе — плановое количество."""
@@ -403,19 +434,22 @@ class ProductionPlan(db.Model):
             'materials': []
         }
         
+        from .bom import get_bom
+        bom = get_bom(self.template)
+
         # Если нет ингредиентов в рецептуре, считаем что сырья недостаточно
-        if not self.template.recipe_items:
+        if not bom:
             return {'available': False, 'materials': []}
         
-        for ingredient in self.template.recipe_items:
-            needed_quantity = (self.quantity * ingredient.percentage) / 100
-            
-            # Получаем все сырье данного типа
-            raw_materials = RawMaterial.query.filter_by(type_id=ingredient.material_type_id).all()
-            available_quantity = sum(rm.quantity_kg for rm in raw_materials if rm.quantity_kg is not None)
+        from .stock_ledger import on_hand_by_type
+        on_hand = on_hand_by_type(bom.type_ids)
+        
+        for line, needed_quantity in zip(bom.lines(), bom.quantities(self.quantity)):
+            # Остаток сырья данного типа на складе
+            available_quantity = on_hand.get(line.id, 0.0)
             
             material_info = {
-                'name': ingredient.material_type.name,
+                'name': line.name,
                 'needed': needed_quantity,
                 'available': available_quantity,
                 'sufficient': available_quantity >= needed_quantity
@@ -434,15 +468,11 @@ class ProductionPlan(db.Model):
         Returns:
             list: Список уникальных аллергенов из используемого сырья
         """
-        if not self.template or not self.template.recipe_items:
+        from .bom import get_bom
+        bom = get_bom(self.template)
+        if not bom:
             return []
-        
-        allergens = set()
-        for ingredient in self.template.recipe_items:
-            for allergen in ingredient.material_type.allergens:
-                allergens.add(allergen.name)
-        
-        return sorted(list(allergens))
+        return bom.all_allergen_names()
 
     def get_bezallergennost_allergens(self):
         """Аллергены, заданные вручную на рецептуре (колонка «Безаллергенность»)."""
@@ -475,22 +505,17 @@ class ProductionPlan(db.Model):
             str: "Контролируется" если есть хотя бы одно сырьё со статусом Контролируется,
                  "Не указано" если нет сырья со статусом или все не указано
         """
-        if not self.template or not self.template.recipe_items:
+        from .bom import get_bom
+        bom = get_bom(self.template)
+        if not bom:
             return "Не указано"
-
-        has_controlled = False
-        for ingredient in self.template.recipe_items:
-            status = ingredient.material_type.mass_control
-            if status == MassControlStatus.CONTROLLED:
-                has_controlled = True
-                break
-        return "Контролируется" if has_controlled else "Не указано"
+        return "Контролируется" if bom.has_mass_control() else "Не указано"
 
 class ProductionBatch(db.Model):
     __tablename__ = "production_batches"
 
     id = Column(Integer, primary_key=True, index=True)
-    plan_id = Column(Integer, ForeignKey("production_plans.id"))
+    plan_id = Column(Integer, ForeignKey("production_plans.id"), index=True)
     batch_number = Column(String)
     weight = Column(Float)
     production_date = Column(DateTime(timezone=True), nullable=True)  # Реальная дата производства замеса
@@ -507,8 +532,8 @@ class BatchMaterial(db.Model):
     __tablename__ = "batch_materials"
 
     id = Column(Integer, primary_key=True, index=True)
-    batch_id = Column(Integer, ForeignKey("production_batches.id"))
-    material_batch_id = Column(Integer, ForeignKey("material_batches.id"))
+    batch_id = Column(Integer, ForeignKey("production_batches.id"), index=True)
+    material_batch_id = Column(Integer, ForeignKey("material_batches.id"), index=True)
     quantity = Column(Float)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -517,6 +542,149 @@ class BatchMaterial(db.Model):
     batch = relationship("ProductionBatch", back_populates="materials")
     material_batch = relationship("MaterialBatch", back_populates="batch_materials") 
 
+class StockLotBalance(db.Model):
+    """Остаток партии сырья: на складе, в резерве незавершённых планов и свободно.
+
+    Производная таблица — пересчитывается из raw_materials и batch_materials
+    (app/stock_ledger.py), поэтому без внешних ключей.
+    """
+    __tablename__ = "stock_lot_balances"
+
+    material_id = Column(Integer, primary_key=True)
+    type_id = Column(Integer, index=True)
+    on_hand_kg = Column(Float, nullable=False, default=0.0)
+    reserved_kg = Column(Float, nullable=False, default=0.0)
+    free_kg = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StockTypeBalance(db.Model):
+    """Итоги по виду сырья: сумма остатков, резерва и свободного количества его партий."""
+    __tablename__ = "stock_type_balances"
+
+    type_id = Column(Integer, primary_key=True)
+    on_hand_kg = Column(Float, nullable=False, default=0.0)
+    reserved_kg = Column(Float, nullable=False, default=0.0)
+    free_kg = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ProductionDailyRollup(db.Model):
+    """Произведено по завершённым планам: продукт × рецептура × день создания плана.
+
+    Производная таблица — пересчитывается из production_plans
+    (app/production_rollups.py), поэтому без внешних ключей.
+    """
+    __tablename__ = "production_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    template_id = Column(Integer, primary_key=True)
+    plans_count = Column(Integer, nullable=False, default=0)
+    produced_kg = Column(Float, nullable=False, default=0.0)
+
+class MaterialUsageDailyRollup(db.Model):
+    """Израсходовано сырья завершёнными планами: партия × день создания плана.
+
+    Вид сырья не копируется: отчёты соединяют партию с raw_materials при чтении.
+    """
+    __tablename__ = "material_usage_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    material_batch_id = Column(Integer, primary_key=True)
+    used_kg = Column(Float, nullable=False, default=0.0)
+
+class PlanEvent(db.Model):
+    """Запись журнала плана: смена статуса, замесы, даты, недовыполнение.
+
+    Журнал только дополняется. Текст записи собирается из kind и payload
+    (app/plan_events.py), поэтому payload хранит значения, а не готовые строки.
+    """
+    __tablename__ = "plan_events"
+
+    id = Column(Integer, primary_key=True)
+    plan_id = Column(Integer, ForeignKey("production_plans.id"), nullable=False)
+    # Местное время, как у прежних записей в примечаниях плана
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+    kind = Column(String(30), nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON значений записи
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    plan = relationship("ProductionPlan", back_populates="events")
+    user = relationship("User")
+
+    __table_args__ = (
+        # Лента плана: новые записи первыми
+        Index('ix_plan_events_plan_id_created_at', 'plan_id', 'created_at'),
+    )
+
+    @property
+    def message(self):
+        from .plan_events import describe
+        return describe(self)
+
+class ExportJob(db.Model):
+    """Фоновое задание на Excel-выгрузку и его готовый файл в instance/exports."""
+    __tablename__ = "export_jobs"
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    params = Column(Text, nullable=False, default="{}")  # JSON параметров выгрузки
+    params_key = Column(String(64), nullable=False, index=True)  # sha256 от вида и параметров
+    data_fingerprint = Column(String(64), nullable=False)  # версия данных отчётов на момент запуска
+    status = Column(String(20), nullable=False, default=STATUS_PENDING)
+    rows_written = Column(Integer, nullable=False, default=0)
+    filename = Column(String(255))
+    artifact_path = Column(String(500))
+    error = Column(Text)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+class EmailOutbox(db.Model):
+    """Письмо в очереди на отправку (app/email_outbox.py).
+
+    Строка пишется в той же транзакции, что и изменение, о котором письмо;
+    отправляет её фоновый диспетчер с повторами.
+    """
+    __tablename__ = "email_outbox"
+
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON данных письма
+    status = Column(String(20), nullable=False, default=STATUS_PENDING, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    recipients = Column(Text)  # адреса, на которые письмо ушло
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.now)
+    sent_at = Column(DateTime(timezone=True))
+
+class DataVersion(db.Model):
+    """Версия набора данных для кэшей в памяти процессов (app/reference_data.py).
+
+    Маршруты, меняющие набор, увеличивают version в своей транзакции; процессы
+    сверяют версии один раз за запрос и перечитывают устаревшие наборы.
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
 class MonthlyPlan(db.Model):
     __tablename__ = "monthly_plans"
     
@@ -542,17 +710,8 @@ class MonthlyPlan(db.Model):
         Returns:
             dict: Словарь {material_type_id: quantity_kg}
         """
-        if not self.template or not self.template.recipe_items:
+        from .bom import get_bom
+        bom = get_bom(self.template)
+        if not bom:
             return {}
-        
-        needs = {}
-        for ingredient in self.template.recipe_items:
-            material_type_id = ingredient.material_type_id
-            needed_quantity = (self.quantity_kg * float(ingredient.percentage)) / 100
-            
-            if material_type_id in needs:
-                needs[material_type_id] += needed_quantity
-            else:
-                needs[material_type_id] = needed_quantity
-        
-        return needs 
\ No newline at end of file
+        return bom.needs_by_type(self.quantity_kg) 
\ No newline at end of file
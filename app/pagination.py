@@ -0,0 +1,172 @@
+"""Курсорная (keyset) пагинация списков.
+
+Страница выбирается условием «строго после последней показанной строки» по
+упорядочивающим колонкам вместо OFFSET, поэтому время ответа не растёт вместе
+с историей. Курсор — base64 от JSON с направлением, именем сортировки и
+значениями ключей граничной строки; последним ключом всегда идёт id, чтобы
+порядок был строгим.
+
+Значения ключей читаются и подставляются обратно «как есть», без обработки типом
+колонки: SQLite хранит даты строками в разных форматах ('2026-01-01 10:00:00' из
+server_default и '2026-01-01 10:00:00.000000' из Python), и сравнивать нужно с
+тем же представлением, по которому идёт сортировка.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, bindparam, or_, type_coerce
+from sqlalchemy.types import NullType
+
+PER_PAGE_CHOICES = (25, 50, 100, 200)
+DEFAULT_PER_PAGE = 50
+
+
+class KeysetPage:
+    """Одна страница списка и ссылки на соседние страницы."""
+
+    def __init__(self, items, per_page, sort, next_url=None, prev_url=None, first_url=None,
+                 per_page_urls=()):
+        self.items = items
+        self.per_page = per_page
+        self.sort = sort
+        self.next_url = next_url
+        self.prev_url = prev_url
+        self.first_url = first_url
+        # [(размер страницы, ссылка)] — курсор не зависит от размера страницы и сохраняется
+        self.per_page_urls = per_page_urls
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_url is not None
+
+
+def get_sort(sort_options, default):
+    """Имя и ключи сортировки из параметра sort; неизвестное имя заменяется на default.
+
+    sort_options: {'имя': [(выражение, по_убыванию), ...]} — последним ключом должен быть id.
+    """
+    name = request.args.get('sort')
+    if name not in sort_options:
+        name = default
+    return name, sort_options[name]
+
+
+def get_per_page():
+    per_page = request.args.get('per_page', type=int)
+    return per_page if per_page in PER_PAGE_CHOICES else DEFAULT_PER_PAGE
+
+
+def paginate(query, keys, sort='', cursor_param='cursor'):
+    """Возвращает KeysetPage для запроса по ключам keys = [(выражение, по_убыванию), ...].
+
+    Курсор берётся из request.args[cursor_param]; курсор другой сортировки или
+    испорченный курсор игнорируются — показывается первая страница.
+    """
+    per_page = get_per_page()
+    direction, values = 'next', None
+    token = request.args.get(cursor_param)
+    if token:
+        decoded = decode_cursor(token)
+        if decoded and decoded[1] == sort and len(decoded[2]) == len(keys):
+            direction, _, values = decoded
+    backwards = direction == 'prev'
+
+    if values is not None:
+        query = query.filter(_after(keys, values, backwards))
+    order_by = [
+        expr.desc() if descending != backwards else expr.asc()
+        for expr, descending in keys
+    ]
+    rows = (
+        query.order_by(None)
+        .order_by(*order_by)
+        .add_columns(*[type_coerce(expr, NullType()) for expr, _ in keys])
+        .limit(per_page + 1)
+        .all()
+    )
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    has_next = has_more if not backwards else values is not None
+    has_prev = has_more if backwards else values is not None
+
+    def page_url(cursor, **overrides):
+        args = request.args.to_dict()
+        args.pop(cursor_param, None)
+        if cursor:
+            args[cursor_param] = cursor
+        args.update(overrides)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    next_url = prev_url = None
+    if rows and has_next:
+        next_url = page_url(encode_cursor('next', sort, rows[-1][1:]))
+    if rows and has_prev:
+        prev_url = page_url(encode_cursor('prev', sort, rows[0][1:]))
+    first_url = page_url(None) if values is not None else None
+    per_page_urls = [(size, page_url(token, per_page=size)) for size in PER_PAGE_CHOICES]
+    return KeysetPage(items, per_page, sort, next_url, prev_url, first_url, per_page_urls)
+
+
+def encode_cursor(direction, sort, values):
+    payload = {'d': direction, 's': sort, 'v': [_dump_value(value) for value in values]}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """(направление, сортировка, значения) или None, если курсор не разбирается."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        direction = payload['d']
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, payload['s'], [_load_value(value) for value in payload['v']]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _after(keys, values, backwards):
+    """Лексикографическое условие (k1, k2, ...) строго после (v1, v2, ...) в порядке сортировки."""
+    clauses = []
+    keys = [(type_coerce(expr, NullType()), descending) for expr, descending in keys]
+    values = [bindparam(None, value, type_=NullType()) for value in values]
+    for position, (expr, descending) in enumerate(keys):
+        value = values[position]
+        equal_prefix = [
+            prefix_expr == prefix_value
+            for (prefix_expr, _), prefix_value in zip(keys[:position], values[:position])
+        ]
+        step = expr < value if descending != backwards else expr > value
+        clauses.append(and_(*equal_prefix, step))
+    return or_(*clauses)
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError('unknown cursor value')
+    return value
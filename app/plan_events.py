@@ -0,0 +1,101 @@
+"""Журнал плана производства (таблица plan_events).
+
+Раньше каждое событие дописывалось строкой в начало ProductionPlan.notes, и
+каждое изменение переписывало весь растущий текст, который к тому же читался
+со всеми строками планов. Теперь событие — отдельная вставка: вид записи (kind)
+и значения (payload, JSON). Текст для ленты на странице плана собирает describe().
+"""
+
+import json
+from datetime import date
+
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy.orm import joinedload
+
+from . import db
+from .models import PlanEvent
+from .pagination import paginate
+
+STATUS_CHANGED = 'status_changed'
+PRODUCTION_DATE_SET = 'production_date_set'
+PRODUCTION_DATE_CHANGED = 'production_date_changed'
+SHORTFALL = 'shortfall'
+BATCH_ADDED = 'batch_added'
+BATCHES_ADDED = 'batches_added'
+BATCHES_DELETED = 'batches_deleted'
+QUANTITY_CHANGED = 'quantity_changed'
+BATCH_NUMBER_CHANGED = 'batch_number_changed'
+COMPLETION_UNDONE = 'completion_undone'
+# Запись из прежних примечаний, которую миграция не разобрала
+LEGACY = 'legacy'
+
+TIMELINE_SORT = [(PlanEvent.created_at, True), (PlanEvent.id, True)]
+
+
+def record(plan, kind, **payload):
+    """Добавляет запись в журнал плана (в текущей транзакции)."""
+    user_id = None
+    if has_request_context() and current_user.is_authenticated:
+        user_id = current_user.id
+    db.session.add(PlanEvent(
+        plan_id=plan.id,
+        kind=kind,
+        payload=json.dumps(payload, ensure_ascii=False, default=_json_default),
+        user_id=user_id,
+    ))
+
+
+def timeline(plan_id):
+    """Страница ленты плана (новые записи первыми), курсор в параметре events_cursor."""
+    query = PlanEvent.query.filter(PlanEvent.plan_id == plan_id).options(joinedload(PlanEvent.user))
+    return paginate(query, TIMELINE_SORT, 'newest', cursor_param='events_cursor')
+
+
+def describe(event):
+    """Текст записи журнала — в тех же формулировках, что были в примечаниях."""
+    payload = json.loads(event.payload or '{}')
+    formatter = _FORMATTERS.get(event.kind)
+    if formatter is None:
+        return payload.get('text', event.kind)
+    text = formatter(payload)
+    if payload.get('comment'):
+        text += f"\n{payload['comment']}"
+    return text
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в журнал плана')
+
+
+def _date(value):
+    return date.fromisoformat(value[:10]).strftime('%d.%m.%Y')
+
+
+def _batch_added(payload):
+    text = f"Добавлен замес №{payload['batch_number']} ({payload['weight']} кг)"
+    if payload.get('ingredients_added'):
+        text += "\nАвтоматически добавлены ингредиенты"
+    if payload.get('missing'):
+        text += f"\nНедостаточно сырья: {', '.join(payload['missing'])}"
+    return text
+
+
+_FORMATTERS = {
+    STATUS_CHANGED: lambda p: f"Статус изменен: {p['old']} → {p['new']}",
+    PRODUCTION_DATE_SET: lambda p: f"Дата производства установлена: {_date(p['date'])}",
+    PRODUCTION_DATE_CHANGED: lambda p: f"Дата производства изменена: {_date(p['old'])} → {_date(p['new'])}",
+    SHORTFALL: lambda p: (
+        f"Завершён с недовыполнением: план {p['planned_kg']:.2f} кг, факт {p['produced_kg']:.2f} кг. "
+        f"Причина: {p['reason']}"
+    ),
+    BATCH_ADDED: _batch_added,
+    BATCHES_ADDED: lambda p: f"Добавлено {p['count']} замесов по {p['weight']} кг каждый",
+    BATCHES_DELETED: lambda p: f"Удалено {p['count']} замесов",
+    QUANTITY_CHANGED: lambda p: f"Изменено количество с {p['old']:.2f} кг на {p['new']:.2f} кг",
+    BATCH_NUMBER_CHANGED: lambda p: f"Изменен номер партии с '{p['old']}' на '{p['new']}'",
+    COMPLETION_UNDONE: lambda p: f"Отменено завершение плана. Восстановлено сырья: {p['restored']}",
+    LEGACY: lambda p: p['text'],
+}
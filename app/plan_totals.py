@@ -0,0 +1,86 @@
+"""Итоги замесов на плане: ProductionPlan.produced_kg и ProductionPlan.batch_count.
+
+Поля пересчитываются из production_batches в той же транзакции, что и
+изменение замесов (add_batch, add_multiple_batches, delete_batch,
+delete_all_batches), поэтому списки, отчёты и выгрузки читают прогресс плана
+из самой строки плана, не обращаясь к замесам. Сверка и пересборка —
+скрипт check_plan_totals.py.
+"""
+
+from sqlalchemy import func, or_, select, update
+
+from . import db
+from .models import ProductionPlan, ProductionBatch
+
+# Расхождение меньше этого (кг) считается погрешностью float
+PRODUCED_KG_TOLERANCE = 1e-6
+
+
+def _actual_produced_kg():
+    return (
+        select(func.coalesce(func.sum(ProductionBatch.weight), 0.0))
+        .where(ProductionBatch.plan_id == ProductionPlan.id)
+        .scalar_subquery()
+    )
+
+
+def _actual_batch_count():
+    return (
+        select(func.count(ProductionBatch.id))
+        .where(ProductionBatch.plan_id == ProductionPlan.id)
+        .scalar_subquery()
+    )
+
+
+def _refresh(*criteria):
+    db.session.execute(
+        update(ProductionPlan)
+        .where(*criteria)
+        .values(
+            produced_kg=_actual_produced_kg(),
+            batch_count=_actual_batch_count(),
+            # updated_at служит датой завершения плана (склад) — пересчёт итогов её не сдвигает
+            updated_at=ProductionPlan.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_plan_totals(plan):
+    """Пересчитывает produced_kg и batch_count плана после изменения его замесов."""
+    db.session.flush()
+    _refresh(ProductionPlan.id == plan.id)
+    db.session.expire(plan, ['produced_kg', 'batch_count'])
+
+
+def rebuild():
+    """Пересчитывает итоги всех планов (первичное заполнение и исправление расхождений)."""
+    db.session.flush()
+    _refresh()
+    db.session.expire_all()
+
+
+def find_mismatches():
+    """Планы, у которых сохранённые итоги не совпадают с замесами.
+
+    Returns:
+        list: [(plan_id, batch_number, produced_kg, фактически_кг, batch_count, фактически_замесов), ...]
+    """
+    actual_kg = _actual_produced_kg()
+    actual_count = _actual_batch_count()
+    return (
+        db.session.query(
+            ProductionPlan.id,
+            ProductionPlan.batch_number,
+            ProductionPlan.produced_kg,
+            actual_kg,
+            ProductionPlan.batch_count,
+            actual_count,
+        )
+        .filter(or_(
+            func.abs(ProductionPlan.produced_kg - actual_kg) > PRODUCED_KG_TOLERANCE,
+            ProductionPlan.batch_count != actual_count,
+        ))
+        .order_by(ProductionPlan.id)
+        .all()
+    )
@@ -0,0 +1,76 @@
+"""Кэш вошедших пользователей для login_manager.user_loader.
+
+load_user вызывается в начале каждого запроса с сессией, включая JSON-запросы
+из форм, и каждый раз читал строку users. Теперь загрузчик возвращает Principal
+— отсоединённый от сессии снимок (id, username, role, is_active), который
+хранится в процессе не дольше PRINCIPAL_CACHE_TTL секунд. Маршруты управления
+пользователями сбрасывают запись (invalidate) сразу, другие процессы gunicorn
+увидят изменение не позже чем через TTL. Деактивированный пользователь при
+следующей загрузке из базы теряет сессию.
+"""
+
+import threading
+import time
+
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from . import app, db
+from .models import User, UserRole
+
+DEFAULT_TTL = 60
+
+_cache = {}  # user_id → (истекает, Principal)
+_lock = threading.Lock()
+
+
+class Principal(UserMixin):
+    """Текущий пользователь без привязки к сессии SQLAlchemy."""
+
+    def __init__(self, id, username, role, active):
+        self.id = id
+        self.username = username
+        self.role = role
+        self._active = active
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def is_admin(self):
+        return self.role == UserRole.ADMIN
+
+    def is_operator(self):
+        return self.role == UserRole.OPERATOR
+
+    def is_manager(self):
+        return self.role == UserRole.MANAGER
+
+    def __repr__(self):
+        return f"<Principal {self.username}>"
+
+
+def load(user_id):
+    """Principal пользователя или None, если его нет или он деактивирован."""
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        principal = cached[1]
+    else:
+        row = db.session.execute(
+            select(User.id, User.username, User.role, User.is_active).where(User.id == user_id)
+        ).first()
+        principal = Principal(row.id, row.username, row.role, bool(row.is_active)) if row else None
+        ttl = app.config.get('PRINCIPAL_CACHE_TTL', DEFAULT_TTL)
+        with _lock:
+            _cache[user_id] = (now + ttl, principal)
+    if principal is None or not principal.is_active:
+        return None
+    return principal
+
+
+def invalidate(user_id):
+    """Сбрасывает запись пользователя (смена пароля, роли, активации)."""
+    with _lock:
+        _cache.pop(user_id, None)
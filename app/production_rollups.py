@@ -0,0 +1,199 @@
+"""Сводные таблицы для отчётов о производстве и расходе сырья.
+
+Раньше отчёты (статистика производства, использование сырья) на каждый запрос
+соединяли планы, замесы, ингредиенты и партии сырья за весь период. Теперь
+итоги завершённых планов хранятся по дням создания плана — день, по которому
+отчёты фильтруют период:
+
+- production_daily_rollups — число планов и произведённые кг по продукту и рецептуре;
+- material_usage_daily_rollups — израсходованные кг по партии сырья; вид сырья
+  не копируется, а берётся из raw_materials при чтении, так что правка вида в
+  карточке сырья сразу видна в отчётах.
+
+Маршруты замесов (add_batch, add_multiple_batches, add_batch_ingredient,
+delete_batch, delete_all_batches, delete_batch_ingredient) отклоняют
+завершённые планы, поэтому итоги меняются только при завершении плана и
+отмене завершения (update_plan_status, undo_plan_completion): строки дня плана
+пересчитываются в той же транзакции. Новый маршрут, меняющий замесы или
+produced_kg завершённого плана, должен либо так же отклонять его, либо
+вызывать refresh_plan(). Первичное заполнение и сверка — скрипт
+rebuild_production_rollups.py.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from . import db
+from .models import (
+    ProductionPlan, PlanStatus, ProductionBatch, BatchMaterial, MaterialBatch, RawMaterial,
+    RawMaterialType, Product, RecipeTemplate, ProductionDailyRollup, MaterialUsageDailyRollup,
+)
+
+
+def refresh_plan(plan):
+    """Пересчитывает итоги дня плана после его завершения или отмены завершения."""
+    if plan.created_at is not None:
+        refresh_days([_day(plan.created_at)])
+
+
+def refresh_days(days):
+    """Пересчитывает строки сводных таблиц за указанные дни."""
+    days = set(days)
+    if not days:
+        return
+    db.session.flush()
+    # Окно шире дня: граница дня в запросе и _day() могут разойтись на записях ровно в полночь
+    criteria = [
+        ProductionPlan.created_at >= min(days) - timedelta(days=1),
+        ProductionPlan.created_at < max(days) + timedelta(days=2),
+    ]
+    db.session.execute(delete(ProductionDailyRollup).where(ProductionDailyRollup.day.in_(days)))
+    db.session.execute(delete(MaterialUsageDailyRollup).where(MaterialUsageDailyRollup.day.in_(days)))
+    _insert(criteria, days)
+
+
+def rebuild():
+    """Полностью пересобирает сводные таблицы из планов и замесов."""
+    db.session.flush()
+    db.session.execute(delete(ProductionDailyRollup))
+    db.session.execute(delete(MaterialUsageDailyRollup))
+    _insert([], None)
+
+
+def production_totals(date_from=None, date_to=None):
+    """Итоги по продуктам и рецептурам за период (включительно).
+
+    Returns:
+        list: [(product_name, recipe_name, plans_count, produced_kg), ...]
+    """
+    return (
+        db.session.query(
+            Product.name,
+            RecipeTemplate.name,
+            func.sum(ProductionDailyRollup.plans_count),
+            func.sum(ProductionDailyRollup.produced_kg),
+        )
+        .select_from(ProductionDailyRollup)
+        .join(Product, Product.id == ProductionDailyRollup.product_id)
+        .join(RecipeTemplate, RecipeTemplate.id == ProductionDailyRollup.template_id)
+        .filter(*_period(ProductionDailyRollup.day, date_from, date_to))
+        .group_by(Product.name, RecipeTemplate.name)
+        .order_by(Product.name, func.min(ProductionDailyRollup.day), RecipeTemplate.name)
+        .all()
+    )
+
+
+def material_usage(date_from=None, date_to=None):
+    """Расход сырья по виду и номеру партии за период: строки с type_name, batch_number, used_qty."""
+    return (
+        db.session.query(
+            RawMaterialType.name.label('type_name'),
+            MaterialBatch.batch_number,
+            func.sum(MaterialUsageDailyRollup.used_kg).label('used_qty'),
+        )
+        .select_from(MaterialUsageDailyRollup)
+        .join(MaterialBatch, MaterialBatch.id == MaterialUsageDailyRollup.material_batch_id)
+        .join(RawMaterial, RawMaterial.id == MaterialBatch.material_id)
+        .join(RawMaterialType, RawMaterialType.id == RawMaterial.type_id)
+        .filter(*_period(MaterialUsageDailyRollup.day, date_from, date_to))
+        .group_by(RawMaterialType.name, MaterialBatch.batch_number)
+        .order_by(RawMaterialType.name, MaterialBatch.batch_number)
+        .all()
+    )
+
+
+def production_by_day():
+    """Строки (день, продукт, рецептура, планов, кг) — новые дни первыми."""
+    return (
+        db.session.query(
+            ProductionDailyRollup.day,
+            Product.name,
+            RecipeTemplate.name,
+            ProductionDailyRollup.plans_count,
+            ProductionDailyRollup.produced_kg,
+        )
+        .select_from(ProductionDailyRollup)
+        .join(Product, Product.id == ProductionDailyRollup.product_id)
+        .join(RecipeTemplate, RecipeTemplate.id == ProductionDailyRollup.template_id)
+        .order_by(ProductionDailyRollup.day.desc(), Product.name, RecipeTemplate.name)
+    )
+
+
+def material_usage_by_day():
+    """Строки (день, вид сырья, номер партии, кг) — новые дни первыми."""
+    return (
+        db.session.query(
+            MaterialUsageDailyRollup.day,
+            RawMaterialType.name,
+            MaterialBatch.batch_number,
+            MaterialUsageDailyRollup.used_kg,
+        )
+        .select_from(MaterialUsageDailyRollup)
+        .join(MaterialBatch, MaterialBatch.id == MaterialUsageDailyRollup.material_batch_id)
+        .join(RawMaterial, RawMaterial.id == MaterialBatch.material_id)
+        .join(RawMaterialType, RawMaterialType.id == RawMaterial.type_id)
+        .order_by(MaterialUsageDailyRollup.day.desc(), RawMaterialType.name, MaterialBatch.batch_number)
+    )
+
+
+def _period(column, date_from, date_to):
+    criteria = []
+    if date_from:
+        criteria.append(column >= date_from)
+    if date_to:
+        criteria.append(column <= date_to)
+    return criteria
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _insert(criteria, days):
+    """Собирает итоги завершённых планов по дням и вставляет строки (days=None — все дни)."""
+    completed = ProductionPlan.status == PlanStatus.COMPLETED
+
+    production = {}
+    for created_at, product_id, template_id, produced_kg in db.session.execute(
+        select(
+            ProductionPlan.created_at, ProductionPlan.product_id,
+            ProductionPlan.template_id, ProductionPlan.produced_kg,
+        )
+        .where(
+            completed, ProductionPlan.product_id.isnot(None),
+            ProductionPlan.template_id.isnot(None), *criteria,
+        )
+    ):
+        day = _day(created_at)
+        if days is not None and day not in days:
+            continue
+        plans_count, total_kg = production.get((day, product_id, template_id), (0, 0.0))
+        production[(day, product_id, template_id)] = (plans_count + 1, total_kg + (produced_kg or 0.0))
+
+    usage = {}
+    for created_at, material_batch_id, quantity in db.session.execute(
+        select(
+            ProductionPlan.created_at, BatchMaterial.material_batch_id, func.sum(BatchMaterial.quantity),
+        )
+        .join(ProductionBatch, ProductionBatch.plan_id == ProductionPlan.id)
+        .join(BatchMaterial, BatchMaterial.batch_id == ProductionBatch.id)
+        .where(completed, BatchMaterial.quantity > 0, BatchMaterial.material_batch_id.isnot(None), *criteria)
+        .group_by(ProductionPlan.id, ProductionPlan.created_at, BatchMaterial.material_batch_id)
+    ):
+        day = _day(created_at)
+        if days is not None and day not in days:
+            continue
+        usage[(day, material_batch_id)] = usage.get((day, material_batch_id), 0.0) + (quantity or 0.0)
+
+    if production:
+        db.session.execute(insert(ProductionDailyRollup), [
+            {'day': day, 'product_id': product_id, 'template_id': template_id,
+             'plans_count': plans_count, 'produced_kg': produced_kg}
+            for (day, product_id, template_id), (plans_count, produced_kg) in production.items()
+        ])
+    if usage:
+        db.session.execute(insert(MaterialUsageDailyRollup), [
+            {'day': day, 'material_batch_id': material_batch_id, 'used_kg': used_kg}
+            for (day, material_batch_id), used_kg in usage.items()
+        ])
@@ -0,0 +1,26 @@
+"""Профили жадной загрузки (selectinload) для страниц со списками.
+
+Шаблоны списков планов вызывают get_allergens(), get_halal_status(),
+get_mass_control_status() и get_bezallergennost_allergens(). Состав рецептуры
+и аллергены сырья берутся из скомпилированного BOM (app/bom.py, preload_boms),
+поэтому профиль загружает только продукт и рецептуру с её аллергенами —
+фиксированным числом запросов, независимо от количества строк.
+"""
+
+from sqlalchemy.orm import selectinload
+
+from .models import ProductionPlan, RecipeTemplate
+
+
+def plan_list_options():
+    """Продукт и рецептура с аллергенами (безаллергенность)."""
+    template = selectinload(ProductionPlan.template)
+    return (
+        selectinload(ProductionPlan.product),
+        template.selectinload(RecipeTemplate.allergens),
+    )
+
+
+def plan_report_options():
+    """plan_list_options() и замесы плана — для отчётов с прогрессом производства."""
+    return plan_list_options() + (selectinload(ProductionPlan.batches),)
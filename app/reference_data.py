@@ -0,0 +1,113 @@
+"""Справочники в памяти процесса: продукты, виды сырья, аллергены, сотрудники.
+
+Почти каждая форма и многие страницы заново читали эти таблицы целиком ради
+выпадающих списков (на странице плана — несколько форм сразу). Теперь наборы
+хранятся в процессе неизменяемыми кортежами (id, название), отсортированными
+по названию. Актуальность проверяется по счётчикам data_versions: они читаются
+одним запросом не чаще раза за HTTP-запрос. Маршруты, меняющие справочник,
+вызывают bump() в своей транзакции, и остальные процессы gunicorn перечитают
+набор при следующем обращении.
+"""
+
+from collections import namedtuple
+
+from flask import g, has_request_context
+from sqlalchemy import insert, select, update
+
+from . import db
+from .models import AllergenType, DataVersion, Employee, Product, RawMaterialType
+
+PRODUCTS = 'products'
+MATERIAL_TYPES = 'raw_material_types'
+ALLERGENS = 'allergen_types'
+EMPLOYEES = 'employees'
+
+ProductRef = namedtuple('ProductRef', 'id name')
+MaterialTypeRef = namedtuple('MaterialTypeRef', 'id name')
+AllergenRef = namedtuple('AllergenRef', 'id name')
+
+
+class EmployeeRef(namedtuple('EmployeeRef', 'id first_name last_name')):
+    __slots__ = ()
+
+    def get_full_name(self):
+        return f"{self.last_name} {self.first_name}"
+
+
+_LOADERS = {
+    PRODUCTS: (ProductRef, select(Product.id, Product.name).order_by(Product.name, Product.id)),
+    MATERIAL_TYPES: (
+        MaterialTypeRef,
+        select(RawMaterialType.id, RawMaterialType.name).order_by(RawMaterialType.name, RawMaterialType.id),
+    ),
+    ALLERGENS: (AllergenRef, select(AllergenType.id, AllergenType.name).order_by(AllergenType.name, AllergenType.id)),
+    EMPLOYEES: (
+        EmployeeRef,
+        select(Employee.id, Employee.first_name, Employee.last_name)
+        .order_by(Employee.last_name, Employee.first_name, Employee.id),
+    ),
+}
+
+# name → (версия, кортеж записей)
+_cache = {}
+
+
+def products():
+    return _get(PRODUCTS)
+
+
+def material_types():
+    return _get(MATERIAL_TYPES)
+
+
+def allergens():
+    return _get(ALLERGENS)
+
+
+def employees():
+    return _get(EMPLOYEES)
+
+
+def choices(rows):
+    """[(id, название)] для SelectField."""
+    return [(row.id, row.name) for row in rows]
+
+
+def employee_choices():
+    """Сотрудники для SelectField с пунктом «Не указан» (пустая строка → None)."""
+    return [('', 'Не указан')] + [(e.id, e.get_full_name()) for e in employees()]
+
+
+def bump(*names):
+    """Отмечает справочники изменёнными (в текущей транзакции)."""
+    for name in names:
+        result = db.session.execute(
+            update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1)
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(DataVersion).values(name=name, version=2))
+        _cache.pop(name, None)
+    if has_request_context():
+        g.pop('_data_versions', None)
+
+
+def _versions():
+    """{name: version}; в пределах HTTP-запроса читается один раз."""
+    if has_request_context() and '_data_versions' in g:
+        return g._data_versions
+    versions = dict(db.session.execute(select(DataVersion.name, DataVersion.version)).all())
+    if has_request_context():
+        g._data_versions = versions
+    return versions
+
+
+def _get(name):
+    # Набора ещё нет в data_versions (база без миграции) — версия 1, как у новой строки
+    version = _versions().get(name, 1)
+    cached = _cache.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    row_type, statement = _LOADERS[name]
+    rows = tuple(row_type(*row) for row in db.session.execute(statement))
+    _cache[name] = (version, rows)
+    return rows
@@ -0,0 +1,227 @@
+"""Кэш результатов отчётов, общий для процессов gunicorn.
+
+Отчёты (статистика производства, использование сырья, прогноз потребности,
+отчёт по планам) пересчитывали одни и те же ответы на одни и те же фильтры по
+многу раз в день, хотя данные под ними меняются лишь несколько раз в час.
+Теперь результат хранится под ключом «отчёт + нормализованные фильтры» вместе
+с версией данных — счётчиком reports в data_versions.
+
+Счётчик увеличивает хук after_commit, если транзакция изменила планы, замесы,
+партии сырья, рецептуры или производные от них таблицы — через объекты сессии
+или массовыми insert/update/delete. Записи прежних версий больше не находятся
+и вытесняются. Хранилище — файл SQLite в instance/ (REPORT_CACHE_PATH), общий
+для процессов одной машины, с ограничением объёма REPORT_CACHE_MAX_BYTES: при
+переполнении удаляются давно не читавшиеся записи (LRU). Пустой
+REPORT_CACHE_PATH отключает кэш.
+
+Изменения данных мимо сессии SQLAlchemy (SQL-скрипты, psql) счётчик не видят —
+после них нужно вызвать bump().
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from itertools import chain
+
+from sqlalchemy import event, insert, select, update
+
+from . import app, db
+from .models import DataVersion
+
+REPORTS = 'reports'
+
+DEFAULT_PATH = os.path.join(app.instance_path, 'report_cache.sqlite3')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Таблицы, от которых зависят отчёты
+TRACKED_TABLES = frozenset({
+    'production_plans', 'production_batches', 'batch_materials', 'material_batches',
+    'raw_materials', 'raw_material_types', 'products', 'recipe_templates', 'recipe_items',
+    'stock_lot_balances', 'stock_type_balances',
+    'production_daily_rollups', 'material_usage_daily_rollups',
+})
+
+# Флаг в session.info: транзакция меняла отслеживаемые таблицы
+_CHANGED = 'report_data_changed'
+
+_MISS = object()
+_store = None
+_store_lock = threading.Lock()
+
+
+def cached(report, params, compute):
+    """Результат compute() для отчёта report с фильтрами params (dict) — из кэша или заново.
+
+    Результат должен сохраняться через pickle: простые значения, списки, словари, строки.
+    """
+    store = _get_store()
+    if store is None:
+        return compute()
+
+    version = data_version()
+    key = _key(report, params)
+    try:
+        value = store.get(key, version)
+    except (sqlite3.Error, pickle.UnpicklingError) as e:
+        app.logger.warning('Кэш отчётов недоступен: %s', e)
+        return compute()
+    if value is not _MISS:
+        return value
+
+    value = compute()
+    try:
+        store.put(key, version, value)
+    except sqlite3.Error as e:
+        app.logger.warning('Не удалось сохранить отчёт в кэш: %s', e)
+    return value
+
+
+def data_version():
+    """Текущая версия данных отчётов."""
+    # Строки ещё нет (база без миграции) — версия 1, как у новой строки
+    return db.session.scalar(select(DataVersion.version).where(DataVersion.name == REPORTS)) or 1
+
+
+def bump(connection=None):
+    """Увеличивает версию данных отчётов; без connection — отдельной транзакцией."""
+    if connection is None:
+        with db.engine.begin() as connection:
+            return bump(connection)
+    result = connection.execute(
+        update(DataVersion).where(DataVersion.name == REPORTS).values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(DataVersion).values(name=REPORTS, version=2))
+
+
+def clear():
+    """Удаляет все записи кэша (например, после ручной правки данных)."""
+    store = _get_store()
+    if store is not None:
+        store.clear()
+
+
+def _key(report, params):
+    normalized = json.dumps(params, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(f'{report}:{normalized}'.encode()).hexdigest()
+
+
+def _get_store():
+    global _store
+    path = app.config.get('REPORT_CACHE_PATH', DEFAULT_PATH)
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = SqliteStore(path, app.config.get('REPORT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        return _store
+
+
+class SqliteStore:
+    """LRU-хранилище в файле SQLite: ключ → (версия данных, pickle результата)."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def get(self, key, version):
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value FROM entries WHERE key = ? AND version = ?', (key, version)
+        ).fetchone()
+        if row is None:
+            return _MISS
+        connection.execute('UPDATE entries SET used_at = ? WHERE key = ?', (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, version, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            # Записи прежних версий уже не прочитать
+            connection.execute('DELETE FROM entries WHERE version < ?', (version,))
+            connection.execute(
+                'INSERT OR REPLACE INTO entries (key, version, value, size, used_at) VALUES (?, ?, ?, ?, ?)',
+                (key, version, data, len(data), time.time()),
+            )
+            self._evict(connection)
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM entries')
+
+    def _evict(self, connection):
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in connection.execute('SELECT key, size FROM entries ORDER BY used_at'):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        connection.executemany('DELETE FROM entries WHERE key = ?', stale)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # isolation_level=None — без неявных транзакций; put открывает свою явно
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL, '
+                'size INTEGER NOT NULL, used_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_entries_used_at ON entries (used_at)')
+            self._local.connection = connection
+        return connection
+
+
+def _tracked(mapper):
+    return mapper is not None and mapper.local_table.name in TRACKED_TABLES
+
+
+@event.listens_for(db.session, 'after_flush')
+def _note_flush(session, flush_context):
+    if any(
+        _tracked(getattr(obj, '__mapper__', None))
+        for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info[_CHANGED] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_bulk(orm_execute_state):
+    if (
+        (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete)
+        and _tracked(orm_execute_state.bind_mapper)
+    ):
+        orm_execute_state.session.info[_CHANGED] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_after_commit(session):
+    if not session.info.pop(_CHANGED, False):
+        return
+    # Сессия после коммита уже вне транзакции — счётчик пишется своей
+    try:
+        with session.get_bind().begin() as connection:
+            bump(connection)
+    except Exception:
+        app.logger.exception('Не удалось увеличить версию данных отчётов')
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGED, None)
@@ -0,0 +1,200 @@
+"""Материализованные остатки сырья по партиям и видам сырья.
+
+На складе — RawMaterial.quantity_kg; в резерве — количество партии в замесах
+незавершённых планов (в завершённых сырьё уже списано); свободно — разница,
+не меньше нуля. Строки пересчитываются в той же транзакции, что и изменение:
+приход/правка/удаление партии, добавление/удаление замесов и ингредиентов,
+завершение и отмена завершения плана.
+"""
+
+from sqlalchemy import func
+
+from . import db
+from .models import (
+    RawMaterial, MaterialBatch, BatchMaterial, ProductionBatch, ProductionPlan, PlanStatus,
+    StockLotBalance, StockTypeBalance,
+)
+
+
+def reserved_by_material_query(*criteria):
+    """Запрос (material_id, reserved_kg): занятое в замесах незавершённых планов по партиям сырья."""
+    return (
+        db.session.query(
+            MaterialBatch.material_id.label('material_id'),
+            func.sum(BatchMaterial.quantity).label('reserved_kg'),
+        )
+        .join(BatchMaterial, BatchMaterial.material_batch_id == MaterialBatch.id)
+        .join(ProductionBatch, BatchMaterial.batch_id == ProductionBatch.id)
+        .join(ProductionPlan, ProductionBatch.plan_id == ProductionPlan.id)
+        .filter(ProductionPlan.status != PlanStatus.COMPLETED, *criteria)
+        .group_by(MaterialBatch.material_id)
+    )
+
+
+def lot_ids_for_plan(plan_id):
+    """id партий сырья, использованных в замесах плана."""
+    rows = (
+        db.session.query(MaterialBatch.material_id)
+        .join(BatchMaterial, BatchMaterial.material_batch_id == MaterialBatch.id)
+        .join(ProductionBatch, BatchMaterial.batch_id == ProductionBatch.id)
+        .filter(ProductionBatch.plan_id == plan_id)
+        .distinct()
+        .all()
+    )
+    return {material_id for (material_id,) in rows}
+
+
+def lot_ids_for_batch(batch_id):
+    """id партий сырья, использованных в замесе."""
+    rows = (
+        db.session.query(MaterialBatch.material_id)
+        .join(BatchMaterial, BatchMaterial.material_batch_id == MaterialBatch.id)
+        .filter(BatchMaterial.batch_id == batch_id)
+        .distinct()
+        .all()
+    )
+    return {material_id for (material_id,) in rows}
+
+
+def attach_usage(materials):
+    """Проставляет партиям сырья расход в замесах одним сгруппированным запросом.
+
+    Для каждой партии заполняет usage_kg (всего использовано, кг) и
+    usage_batch_count (число разных замесов), которые читают
+    RawMaterial.get_usage() и get_batch_count() вместо обхода связей.
+    """
+    materials = [material for material in materials if material is not None]
+    if not materials:
+        return
+    usage = {
+        material_id: (used_kg, batch_count)
+        for material_id, used_kg, batch_count in db.session.query(
+            MaterialBatch.material_id,
+            func.sum(BatchMaterial.quantity),
+            func.count(BatchMaterial.batch_id.distinct()),
+        )
+        .join(BatchMaterial, BatchMaterial.material_batch_id == MaterialBatch.id)
+        .filter(MaterialBatch.material_id.in_({material.id for material in materials}))
+        .group_by(MaterialBatch.material_id)
+    }
+    for material in materials:
+        used_kg, batch_count = usage.get(material.id, (0.0, 0))
+        material.usage_kg = used_kg or 0.0
+        material.usage_batch_count = batch_count
+
+
+def refresh_lots(material_ids):
+    """Пересчитывает остатки указанных партий и итоги по их видам сырья.
+
+    Вызывается до commit, чтобы остатки фиксировались вместе с изменением.
+    """
+    material_ids = {material_id for material_id in material_ids if material_id is not None}
+    if not material_ids:
+        return
+    db.session.flush()
+
+    lots = {
+        material_id: (type_id, quantity_kg)
+        for material_id, type_id, quantity_kg in db.session.query(
+            RawMaterial.id, RawMaterial.type_id, RawMaterial.quantity_kg
+        ).filter(RawMaterial.id.in_(material_ids))
+    }
+    reserved = dict(
+        reserved_by_material_query(MaterialBatch.material_id.in_(material_ids)).all()
+    )
+    balances = {
+        balance.material_id: balance
+        for balance in StockLotBalance.query.filter(StockLotBalance.material_id.in_(material_ids))
+    }
+
+    # Итоги пересчитываются и для прежнего вида сырья, если партию перенесли в другой
+    type_ids = {balance.type_id for balance in balances.values()}
+    for material_id in material_ids:
+        balance = balances.get(material_id)
+        if material_id not in lots:
+            if balance is not None:
+                db.session.delete(balance)
+            continue
+        type_id, quantity_kg = lots[material_id]
+        if balance is None:
+            balance = StockLotBalance(material_id=material_id)
+            db.session.add(balance)
+        balance.type_id = type_id
+        _set_amounts(balance, quantity_kg or 0.0, reserved.get(material_id) or 0.0)
+        type_ids.add(type_id)
+
+    db.session.flush()
+    refresh_types(type_ids)
+
+
+def refresh_plan_lots(plan_id):
+    """Пересчитывает остатки всех партий, использованных в плане."""
+    refresh_lots(lot_ids_for_plan(plan_id))
+
+
+def refresh_types(type_ids):
+    """Пересчитывает итоги по видам сырья из остатков их партий."""
+    type_ids = {type_id for type_id in type_ids if type_id is not None}
+    if not type_ids:
+        return
+
+    totals = {
+        type_id: (on_hand, reserved, free)
+        for type_id, on_hand, reserved, free in db.session.query(
+            StockLotBalance.type_id,
+            func.sum(StockLotBalance.on_hand_kg),
+            func.sum(StockLotBalance.reserved_kg),
+            func.sum(StockLotBalance.free_kg),
+        )
+        .filter(StockLotBalance.type_id.in_(type_ids))
+        .group_by(StockLotBalance.type_id)
+    }
+    balances = {
+        balance.type_id: balance
+        for balance in StockTypeBalance.query.filter(StockTypeBalance.type_id.in_(type_ids))
+    }
+    for type_id in type_ids:
+        balance = balances.get(type_id)
+        if balance is None:
+            balance = StockTypeBalance(type_id=type_id)
+            db.session.add(balance)
+        on_hand, reserved, free = totals.get(type_id, (0.0, 0.0, 0.0))
+        balance.on_hand_kg = on_hand or 0.0
+        balance.reserved_kg = reserved or 0.0
+        balance.free_kg = free or 0.0
+
+
+def rebuild():
+    """Полностью пересобирает остатки из исходных таблиц (первичное заполнение и сверка)."""
+    StockLotBalance.query.delete()
+    StockTypeBalance.query.delete()
+    db.session.flush()
+
+    reserved = dict(reserved_by_material_query().all())
+    for material_id, type_id, quantity_kg in db.session.query(
+        RawMaterial.id, RawMaterial.type_id, RawMaterial.quantity_kg
+    ):
+        balance = StockLotBalance(material_id=material_id, type_id=type_id)
+        _set_amounts(balance, quantity_kg or 0.0, reserved.get(material_id) or 0.0)
+        db.session.add(balance)
+    db.session.flush()
+
+    refresh_types(type_id for (type_id,) in db.session.query(StockLotBalance.type_id).distinct())
+
+
+def on_hand_by_type(type_ids=None):
+    """Остаток на складе по видам сырья: {type_id: кг}."""
+    query = db.session.query(StockTypeBalance.type_id, StockTypeBalance.on_hand_kg)
+    if type_ids is not None:
+        type_ids = list(type_ids)
+        if not type_ids:
+            return {}
+        query = query.filter(StockTypeBalance.type_id.in_(type_ids))
+    return dict(query.all())
+
+
+def _set_amounts(balance, on_hand, reserved):
+    balance.on_hand_kg = on_hand
+    balance.reserved_kg = reserved
+    # Свободный остаток не может быть отрицательным
+    balance.free_kg = max(0.0, on_hand - reserved)
@@ -1,53 +1,116 @@
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from flask import send_file
+from functools import lru_cache
+from itertools import islice
 from datetime import datetime
-import io
-
-def style_header_row(ws, row=1):
-    """Стилизация заголовков таблицы"""
-    header_fill = PatternFill(start_color='CCE5FF', end_color='CCE5FF', fill_type='solid')
-    header_font = Font(bold=True)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+import tempfile
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Сколько первых строк листа используется для расчёта ширины столбцов
+WIDTH_SAMPLE_ROWS = 500
+# Размер пачки при чтении строк выгрузки из БД (Query.yield_per)
+EXPORT_YIELD_PER = 1000
+# Как часто выгрузка сообщает о прогрессе
+PROGRESS_EVERY_ROWS = 1000
+
+@lru_cache(maxsize=None)
+def default_header_style():
+    """Стиль строки заголовков по умолчанию (openpyxl загружается при первой выгрузке)."""
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+    return dict(
+        fill=PatternFill(start_color='CCE5FF', end_color='CCE5FF', fill_type='solid'),
+        font=Font(bold=True),
+        border=Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        ),
+        alignment=Alignment(horizontal='center'),
     )
-    
-    for cell in ws[row]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center')
-
-def adjust_column_width(ws):
-    """Автоматическая настройка ширины столбцов"""
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column_letter].width = adjusted_width
-
-def create_excel_report():
-    """Создание нового Excel файла с базовыми настройками"""
-    wb = Workbook()
-    wb.remove(wb.active)  # Удаляем стандартный лист
-    output = io.BytesIO()
-    return wb, output
-
-def save_excel_report(wb, output):
-    """Сохранение Excel файла в BytesIO"""
-    wb.save(output)
-    output.seek(0)
-    return output
+
+class XlsxStream:
+    """Потоковая выгрузка XLSX на openpyxl в режиме write-only.
+
+    Строки листа пишутся по мере поступления и в памяти не накапливаются.
+    Ширина столбцов считается по первым WIDTH_SAMPLE_ROWS строкам: openpyxl
+    требует задать её до первой записанной строки, поэтому только эти строки
+    и буферизуются. Сам openpyxl импортируется при создании выгрузки, а не при
+    старте приложения.
+    """
+
+    def __init__(self, progress=None):
+        from openpyxl import Workbook
+
+        self.workbook = Workbook(write_only=True)
+        self._sheet = None
+        # progress(rows_written) вызывается каждые PROGRESS_EVERY_ROWS строк (фоновые задания)
+        self.progress = progress
+        self.rows_written = 0
+
+    def cell(self, value, **style):
+        """Ячейка со стилем (fill, font, border, alignment) для строк текущего листа add_sheet."""
+        from openpyxl.cell import WriteOnlyCell
+
+        cell = WriteOnlyCell(self._sheet, value=value)
+        for name, style_value in style.items():
+            setattr(cell, name, style_value)
+        return cell
+
+    def add_sheet(self, title, headers, rows, header_style=None, widths=None):
+        """Добавляет лист: строка заголовков и строки из итерируемого rows.
+
+        widths — фиксированная ширина столбцов {номер столбца: ширина}; для
+        остальных ширина считается по заголовку и образцу строк.
+        """
+        from openpyxl.cell import Cell
+        from openpyxl.utils import get_column_letter
+
+        ws = self._sheet = self.workbook.create_sheet(title)
+        rows = iter(rows)
+        sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+
+        column_widths = {}
+        for row in [headers] + sample:
+            for col, value in enumerate(row, start=1):
+                if isinstance(value, Cell):
+                    value = value.value
+                length = len(str(value)) if value is not None else 0
+                column_widths[col] = max(column_widths.get(col, 0), length + 2)
+        column_widths.update(widths or {})
+        for col, width in column_widths.items():
+            ws.column_dimensions[get_column_letter(col)].width = width
+
+        style = default_header_style() if header_style is None else header_style
+        ws.append([self.cell(title, **style) for title in headers])
+        for row in sample:
+            self._append(ws, row)
+        for row in rows:
+            self._append(ws, row)
+        return ws
+
+    def _append(self, ws, row):
+        ws.append(row)
+        self.rows_written += 1
+        if self.progress is not None and self.rows_written % PROGRESS_EVERY_ROWS == 0:
+            self.progress(self.rows_written)
+
+    def save(self, path):
+        """Сохраняет книгу в файл (артефакт фонового задания)."""
+        self.workbook.save(path)
+
+    def send(self, filename):
+        """Сохраняет книгу во временный файл и отдаёт его частями (send_file)."""
+        output = tempfile.TemporaryFile()
+        self.workbook.save(output)
+        output.seek(0)
+        return send_file(
+            output,
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=filename
+        )
 
 def format_datetime(dt):
     """Форматирование даты и времени для имени файла"""
@@ -0,0 +1,26 @@
+"""Разделы приложения в виде блюпринтов.
+
+Раньше все маршруты жили в одном app/routes.py (более 3000 строк), и при
+старте каждого процесса импортировались вместе со всеми зависимостями
+выгрузок — openpyxl, python-docx, NumPy. Теперь разделы разнесены по модулям,
+а тяжёлые библиотеки загружаются в функциях, которым они нужны.
+
+Блюпринты регистрируются без url_prefix: адреса страниц прежние, меняются
+только имена конечных точек — url_for('planning.production_plans') и т.п.
+"""
+
+from . import admin, inventory, managers, planning, recipes, reports
+
+BLUEPRINTS = (
+    planning.bp,
+    inventory.bp,
+    recipes.bp,
+    reports.bp,
+    admin.bp,
+    managers.bp,
+)
+
+
+def register_blueprints(app):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
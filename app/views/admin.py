@@ -0,0 +1,364 @@
+"""Администрирование: сотрудники, учётные записи, обслуживание базы, производительность."""
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from app import db
+from app.models import (
+    RawMaterial, ProductionPlan, ProductionBatch, MaterialBatch, BatchMaterial, User, UserRole,
+    Employee,
+)
+from app.forms import EmployeeForm, CreateUserForm, ChangeUserPasswordForm
+from app import principals, reference_data
+from app.instrumentation import endpoint_report, reset as reset_request_stats
+from flask_login import current_user
+from app.decorators import admin_required
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.route('/employees', methods=['GET', 'POST'])
+@admin_required
+def employees():
+    form = EmployeeForm()
+    if form.validate_on_submit():
+        employee = Employee(
+            first_name=form.first_name.data,
+            last_name=form.last_name.data
+        )
+        db.session.add(employee)
+        reference_data.bump(reference_data.EMPLOYEES)
+        db.session.commit()
+        flash('Сотрудник добавлен!', 'success')
+        return redirect(url_for('admin.employees'))
+    employees_list = Employee.query.order_by(Employee.last_name, Employee.first_name).all()
+    return render_template('employees.html', form=form, employees=employees_list)
+
+@bp.route('/employees/delete/<int:id>', methods=['POST'])
+@admin_required
+def delete_employee(id):
+    employee = Employee.query.get_or_404(id)
+    # Проверяем, не используется ли сотрудник в замесах
+    if ProductionBatch.query.filter_by(employee_id=id).first():
+        flash('Нельзя удалить сотрудника, который указан как ответственный в замесах!', 'error')
+        return redirect(url_for('admin.employees'))
+    db.session.delete(employee)
+    reference_data.bump(reference_data.EMPLOYEES)
+    db.session.commit()
+    flash('Сотрудник удален!', 'success')
+    return redirect(url_for('admin.employees'))
+
+def _active_admin_count():
+    return User.query.filter_by(role=UserRole.ADMIN, is_active=True).count()
+
+def _role_from_form(raw):
+    try:
+        return UserRole(str(raw).strip())
+    except ValueError:
+        return None
+
+@bp.route('/users', methods=['GET', 'POST'])
+@admin_required
+def users():
+    """Управление учётными записями (создание / список)."""
+    form = CreateUserForm()
+    if form.validate_on_submit():
+        role = _role_from_form(form.role.data)
+        if role is None:
+            flash('Некорректная роль пользователя.', 'error')
+            return redirect(url_for('admin.users'))
+        user = User(
+            username=form.username.data.strip(),
+            email=form.email.data.strip(),
+            role=role,
+            is_active=True,
+        )
+        user.set_password(form.password.data)
+        db.session.add(user)
+        db.session.commit()
+        flash(f'Пользователь «{user.username}» создан.', 'success')
+        return redirect(url_for('admin.users'))
+    users_list = User.query.order_by(User.username.asc()).all()
+    password_form = ChangeUserPasswordForm()
+    return render_template(
+        'users.html',
+        form=form,
+        password_form=password_form,
+        users=users_list,
+        UserRole=UserRole,
+    )
+
+@bp.route('/users/<int:user_id>/change_password', methods=['POST'])
+@admin_required
+def change_user_password(user_id):
+    user = User.query.get_or_404(user_id)
+    form = ChangeUserPasswordForm()
+    if form.validate_on_submit():
+        user.set_password(form.password.data)
+        db.session.commit()
+        principals.invalidate(user.id)
+        flash(f'Пароль пользователя «{user.username}» изменён.', 'success')
+    else:
+        for field_errors in form.errors.values():
+            for err in field_errors:
+                flash(err, 'error')
+    return redirect(url_for('admin.users'))
+
+@bp.route('/users/<int:user_id>/deactivate', methods=['POST'])
+@admin_required
+def deactivate_user(user_id):
+    user = User.query.get_or_404(user_id)
+    if user.id == current_user.id:
+        flash('Нельзя деактивировать свою учётную запись.', 'error')
+        return redirect(url_for('admin.users'))
+    if not user.is_active:
+        flash('Пользователь уже деактивирован.', 'info')
+        return redirect(url_for('admin.users'))
+    if user.role == UserRole.ADMIN and _active_admin_count() <= 1:
+        flash('Нельзя деактивировать последнего активного администратора.', 'error')
+        return redirect(url_for('admin.users'))
+    user.is_active = False
+    db.session.commit()
+    principals.invalidate(user.id)
+    flash(f'Пользователь «{user.username}» деактивирован.', 'success')
+    return redirect(url_for('admin.users'))
+
+@bp.route('/users/<int:user_id>/activate', methods=['POST'])
+@admin_required
+def activate_user(user_id):
+    user = User.query.get_or_404(user_id)
+    if user.is_active:
+        flash('Пользователь уже активен.', 'info')
+        return redirect(url_for('admin.users'))
+    user.is_active = True
+    db.session.commit()
+    principals.invalidate(user.id)
+    flash(f'Пользователь «{user.username}» активирован.', 'success')
+    return redirect(url_for('admin.users'))
+
+@bp.route('/apply_migrations')
+@admin_required
+def apply_migrations():
+    """Применяет миграции базы данных"""
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            ['alembic', '-c', 'migrations/alembic.ini', 'upgrade', 'head'],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return f"Миграции применены успешно!<br><pre>{result.stdout}</pre>"
+    except subprocess.CalledProcessError as e:
+        return f"Ошибка при применении миграций:<br><pre>{e.stderr}</pre>"
+    except FileNotFoundError:
+        return "Alembic не найден" 
+
+@bp.route('/admin/cleanup_orphaned_data')
+@admin_required
+def cleanup_orphaned_data():
+    """Временный маршрут для очистки 'висящих' ссылок на удалённое сырьё"""
+    
+    try:
+        # Инициализируем переменные SQL диагностики
+        orphaned_mb_sql = []
+        orphaned_bm_sql = []
+        orphaned_pb_sql = []
+        
+        # Диагностика: находим "висящие" ссылки
+        orphaned_material_batches = db.session.query(MaterialBatch).filter(
+            ~MaterialBatch.material_id.in_(
+                db.session.query(RawMaterial.id)
+            )
+        ).all()
+        
+        orphaned_batch_materials = db.session.query(BatchMaterial).filter(
+            ~BatchMaterial.material_batch_id.in_(
+                db.session.query(MaterialBatch.id)
+            )
+        ).all()
+        
+        # Дополнительная диагностика: находим "висящие" ссылки на уровне SQL
+        try:
+            from sqlalchemy import text
+            
+            # Проверяем MaterialBatch с несуществующим material_id
+            orphaned_mb_sql = db.session.execute(text("""
+                SELECT mb.id, mb.material_id, mb.batch_number, mb.quantity
+                FROM material_batches mb
+                LEFT JOIN raw_materials rm ON mb.material_id = rm.id
+                WHERE rm.id IS NULL
+            """)).fetchall()
+            
+            # Проверяем BatchMaterial с несуществующим material_batch_id
+            orphaned_bm_sql = db.session.execute(text("""
+                SELECT bm.id, bm.material_batch_id, bm.batch_id, bm.quantity
+                FROM batch_materials bm
+                LEFT JOIN material_batches mb ON bm.material_batch_id = mb.id
+                WHERE mb.id IS NULL
+            """)).fetchall()
+            
+            # Проверяем ProductionBatch с несуществующим plan_id
+            orphaned_pb_sql = db.session.execute(text("""
+                SELECT pb.id, pb.plan_id, pb.batch_number, pb.weight
+                FROM production_batches pb
+                LEFT JOIN production_plans pp ON pb.plan_id = pp.id
+                WHERE pp.id IS NULL
+            """)).fetchall()
+            
+        except Exception as e:
+            orphaned_mb_sql = []
+            orphaned_bm_sql = []
+            orphaned_pb_sql = []
+            print(f"Ошибка SQL диагностики: {e}")
+        
+        # Диагностика: находим планы с проблемами
+        problematic_plans = []
+        for plan in ProductionPlan.query.all():
+            plan_problems = []
+            
+            try:
+                # Проверяем продукт
+                if not plan.product:
+                    plan_problems.append("Продукт не найден")
+                
+                # Проверяем рецептуру
+                if not plan.template:
+                    plan_problems.append("Рецептура не найдена")
+                
+                # Проверяем замесы
+                for batch in plan.batches:
+                    batch_problems = []
+                    
+                    # Проверяем ингредиенты замеса
+                    for batch_material in batch.materials:
+                        ingredient_problems = []
+                        
+                        # Проверяем MaterialBatch
+                        if not batch_material.material_batch:
+                            ingredient_problems.append("MaterialBatch не найден")
+                        else:
+                            # Проверяем сырьё
+                            if not batch_material.material_batch.material:
+                                ingredient_problems.append("Сырьё не найдено")
+                            else:
+                                # Проверяем тип сырья
+                                if not batch_material.material_batch.material.type:
+                                    ingredient_problems.append("Тип сырья не найден")
+                        
+                        if ingredient_problems:
+                            batch_problems.append(f"Ингредиент {batch_material.id}: {', '.join(ingredient_problems)}")
+                    
+                    if batch_problems:
+                        plan_problems.append(f"Замес {batch.batch_number}: {', '.join(batch_problems)}")
+                
+                # Если есть проблемы, добавляем план в список
+                if plan_problems:
+                    problematic_plans.append({
+                        'id': plan.id,
+                        'batch_number': plan.batch_number,
+                        'product': plan.product.name if plan.product else 'Неизвестно',
+                        'status': plan.status,
+                        'problems': plan_problems,
+                        'problem_count': len(plan_problems)
+                    })
+                    
+            except Exception as e:
+                problematic_plans.append({
+                    'id': plan.id,
+                    'batch_number': plan.batch_number,
+                    'product': 'Ошибка загрузки',
+                    'status': 'Ошибка',
+                    'problems': [f'Критическая ошибка: {str(e)}'],
+                    'problem_count': 1
+                })
+        
+        if request.method == 'POST':
+            # Выполняем очистку
+            action = request.form.get('action')
+            
+            if action == 'cleanup_material_batches':
+                # Удаляем "висящие" MaterialBatch
+                count = 0
+                for orphan in orphaned_material_batches:
+                    db.session.delete(orphan)
+                    count += 1
+                db.session.commit()
+                flash(f'Удалено {count} "висящих" MaterialBatch', 'success')
+                
+            elif action == 'cleanup_batch_materials':
+                # Удаляем "висящие" BatchMaterial
+                count = 0
+                for orphan in orphaned_batch_materials:
+                    db.session.delete(orphan)
+                    count += 1
+                db.session.commit()
+                flash(f'Удалено {count} "висящих" BatchMaterial', 'success')
+                
+            elif action == 'cleanup_all':
+                # Удаляем всё "висящее"
+                count_mb = 0
+                for orphan in orphaned_material_batches:
+                    db.session.delete(orphan)
+                    count_mb += 1
+                
+                count_bm = 0
+                for orphan in orphaned_batch_materials:
+                    db.session.delete(orphan)
+                    count_bm += 1
+                
+                db.session.commit()
+                flash(f'Удалено {count_mb} MaterialBatch и {count_bm} BatchMaterial', 'success')
+            
+            # Перезагружаем страницу для обновления данных
+            return redirect(url_for('admin.cleanup_orphaned_data'))
+        
+        return render_template(
+            'cleanup_orphaned_data.html',
+            orphaned_material_batches=orphaned_material_batches,
+            orphaned_batch_materials=orphaned_batch_materials,
+            problematic_plans=problematic_plans,
+            orphaned_mb_sql=orphaned_mb_sql,
+            orphaned_bm_sql=orphaned_bm_sql,
+            orphaned_pb_sql=orphaned_pb_sql
+        )
+        
+    except Exception as e:
+        flash(f'Ошибка при диагностике: {str(e)}', 'error')
+        return redirect(url_for('index'))
+
+@bp.route('/admin/analyze_users')
+@admin_required
+def analyze_users():
+    """Анализ пользователей в базе данных"""
+    try:
+        users = User.query.all()
+        user_analysis = []
+        
+        for user in users:
+            user_info = {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+                'role': user.role.value if user.role else None,
+                'is_active': user.is_active,
+                'created_at': user.created_at.isoformat() if user.created_at else None,
+                'hashed_password': user.hashed_password,
+                'password_length': len(user.hashed_password) if user.hashed_password else 0
+            }
+            user_analysis.append(user_info)
+        
+        return render_template('analyze_users.html', users=user_analysis)
+        
+    except Exception as e:
+        flash(f'Ошибка при анализе пользователей: {e}', 'error')
+        return redirect(url_for('index'))
+
+@bp.route('/admin/performance', methods=['GET', 'POST'])
+@admin_required
+def admin_performance():
+    """Перцентили времени ответа и числа SQL-запросов по endpoint (данные текущего процесса)"""
+    if request.method == 'POST':
+        reset_request_stats()
+        flash('Статистика производительности сброшена', 'success')
+        return redirect(url_for('admin.admin_performance'))
+    return render_template('admin_performance.html', report=endpoint_report())
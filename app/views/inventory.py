@@ -0,0 +1,511 @@
+"""Склад: виды сырья и аллергены, партии сырья, склад готовой продукции."""
+
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from app import db
+from app.models import (
+    RawMaterial, RawMaterialType, ProductionPlan, PlanStatus, MaterialBatch, AllergenType,
+    HalalStatus, MassControlStatus,
+)
+from app.forms import (
+    RawMaterialForm, RawMaterialTypeForm, AllergenTypeForm, EditRawMaterialTypeForm,
+)
+from app import reference_data
+from app.pagination import get_sort, paginate
+from app.bom import bump_bom_versions_for_material_types
+from app.stock_ledger import refresh_lots, attach_usage
+from sqlalchemy import func, case
+from sqlalchemy.orm import selectinload
+from flask_login import login_required, current_user
+from app.decorators import admin_required
+from app.http_cache import conditional_get
+
+bp = Blueprint('inventory', __name__)
+
+
+# --- Только для ADMIN ---
+@bp.route('/raw_material_types', methods=['GET', 'POST'])
+@admin_required
+def raw_material_types():
+    form = RawMaterialTypeForm()
+    if form.validate_on_submit():
+        t = RawMaterialType(name=form.name.data)
+        
+        # Установить halal_status
+        if form.halal_status.data:
+            t.halal_status = HalalStatus(form.halal_status.data)
+        else:
+            t.halal_status = None
+        
+        # Установить mass_control
+        if form.mass_control.data:
+            t.mass_control = MassControlStatus(form.mass_control.data)
+        else:
+            t.mass_control = None
+        
+        db.session.add(t)
+        db.session.flush()  # Получить ID
+        
+        # Добавить аллергены
+        for allergen_id in form.allergen_type_ids.data:
+            allergen = AllergenType.query.get(allergen_id)
+            if allergen:
+                t.allergens.append(allergen)
+        
+        reference_data.bump(reference_data.MATERIAL_TYPES)
+        db.session.commit()
+        flash('Вид сырья добавлен!', 'success')
+        return redirect(url_for('inventory.raw_material_types'))
+    types = RawMaterialType.query.all()
+    return render_template('raw_material_types.html', form=form, types=types)
+
+@bp.route('/raw_material_types/delete/<int:id>', methods=['POST'])
+@admin_required
+def delete_raw_material_type(id):
+    t = RawMaterialType.query.get_or_404(id)
+    bump_bom_versions_for_material_types([t.id])
+    reference_data.bump(reference_data.MATERIAL_TYPES)
+    db.session.delete(t)
+    db.session.commit()
+    flash('Вид сырья удалён!', 'success')
+    return redirect(url_for('inventory.raw_material_types'))
+
+# --- Управление аллергенами ---
+@bp.route('/allergen_types', methods=['GET', 'POST'])
+@admin_required
+def allergen_types():
+    form = AllergenTypeForm()
+    if form.validate_on_submit():
+        a = AllergenType(name=form.name.data)
+        db.session.add(a)
+        reference_data.bump(reference_data.ALLERGENS)
+        db.session.commit()
+        flash('Аллерген добавлен!', 'success')
+        return redirect(url_for('inventory.allergen_types'))
+    allergens = AllergenType.query.all()
+    return render_template('allergen_types.html', form=form, allergens=allergens)
+
+@bp.route('/allergen_types/delete/<int:id>', methods=['POST'])
+@admin_required
+def delete_allergen_type(id):
+    a = AllergenType.query.get_or_404(id)
+    if a.raw_material_types or a.recipe_templates:
+        flash('Нельзя удалить аллерген, который используется в видах сырья или рецептурах!', 'error')
+        return redirect(url_for('inventory.allergen_types'))
+    db.session.delete(a)
+    reference_data.bump(reference_data.ALLERGENS)
+    db.session.commit()
+    flash('Аллерген удален!', 'success')
+    return redirect(url_for('inventory.allergen_types'))
+
+@bp.route('/raw_material_types/edit/<int:id>', methods=['GET', 'POST'])
+@admin_required
+def edit_raw_material_type(id):
+    material_type = RawMaterialType.query.get_or_404(id)
+    form = EditRawMaterialTypeForm()
+    
+    # Устанавливаем значения для формы
+    if request.method == 'GET':
+        form.name.data = material_type.name
+        form.allergen_type_ids.data = [a.id for a in material_type.allergens]
+        # Устанавливаем halal_status
+        if material_type.halal_status:
+            form.halal_status.data = material_type.halal_status.value
+        else:
+            form.halal_status.data = ''
+        # Устанавливаем mass_control
+        if material_type.mass_control:
+            form.mass_control.data = material_type.mass_control.value
+        else:
+            form.mass_control.data = ''
+    
+    if form.validate_on_submit():
+        material_type.name = form.name.data
+        
+        # Установить halal_status
+        if form.halal_status.data and form.halal_status.data.strip():
+            try:
+                # Создаем Enum из значения формы
+                halal_enum = HalalStatus(form.halal_status.data)
+                # Явно устанавливаем значение через присваивание Enum объекта
+                material_type.halal_status = halal_enum
+            except ValueError:
+                flash('Некорректное значение статуса Харам/Халяль', 'error')
+                return render_template('edit_raw_material_type.html', form=form, material_type=material_type)
+        else:
+            material_type.halal_status = None
+        
+        # Установить mass_control
+        if form.mass_control.data and form.mass_control.data.strip():
+            try:
+                material_type.mass_control = MassControlStatus(form.mass_control.data)
+            except ValueError:
+                flash('Некорректное значение статуса контроля массы', 'error')
+                return render_template('edit_raw_material_type.html', form=form, material_type=material_type)
+        else:
+            material_type.mass_control = None
+        
+        # Очистить существующие аллергены
+        material_type.allergens.clear()
+        
+        # Добавить новые аллергены
+        for allergen_id in form.allergen_type_ids.data:
+            allergen = AllergenType.query.get(allergen_id)
+            if allergen:
+                material_type.allergens.append(allergen)
+        
+        bump_bom_versions_for_material_types([material_type.id])
+        reference_data.bump(reference_data.MATERIAL_TYPES)
+        db.session.commit()
+        flash('Вид сырья обновлен!', 'success')
+        return redirect(url_for('inventory.raw_material_types'))
+    
+    return render_template('edit_raw_material_type.html', form=form, material_type=material_type)
+
+# --- Сырьё (партии) ---
+
+def sync_material_batch_numbers(raw_material_id):
+    """Синхронизирует номера партий во всех связанных записях material_batches"""
+    
+    try:
+        raw_material = RawMaterial.query.get(raw_material_id)
+        if not raw_material:
+            return False
+        
+        # Находим все material_batches с этим сырьём
+        material_batches = MaterialBatch.query.filter_by(
+            material_id=raw_material_id
+        ).all()
+        
+        updated_count = 0
+        for mb in material_batches:
+            if mb.batch_number != raw_material.batch_number:
+                mb.batch_number = raw_material.batch_number
+                updated_count += 1
+        
+        if updated_count > 0:
+            db.session.commit()
+            return updated_count
+        
+        return 0
+        
+    except Exception as e:
+        # В случае ошибки откатываем изменения
+        db.session.rollback()
+        print(f"Ошибка при синхронизации номеров партий: {e}")
+        return False
+
+RAW_MATERIAL_SORTS = {
+    'newest': [(RawMaterial.created_at, True), (RawMaterial.id, True)],
+    'oldest': [(RawMaterial.created_at, False), (RawMaterial.id, False)],
+}
+
+@bp.route('/raw_materials', methods=['GET', 'POST'])
+@login_required
+@conditional_get
+def raw_materials():
+    form = RawMaterialForm()
+    form.type_id.choices = reference_data.choices(reference_data.material_types())
+    if form.validate_on_submit():
+        # Проверяем права на создание
+        if not current_user.is_admin():
+            flash('Доступ запрещен. Требуются права администратора для создания.', 'error')
+            return redirect(url_for('inventory.raw_materials'))
+        
+        raw = RawMaterial(
+            name=form.batch_number.data,
+            type_id=form.type_id.data,
+            batch_number=form.batch_number.data,
+            quantity_kg=form.quantity_kg.data,
+            date_received=form.date_received.data or None,
+            expiration_date=form.expiration_date.data or None
+        )
+        db.session.add(raw)
+        db.session.flush()
+        refresh_lots([raw.id])
+        db.session.commit()
+        flash('Партия сырья добавлена!', 'success')
+        return redirect(url_for('inventory.raw_materials'))
+    sort, sort_keys = get_sort(RAW_MATERIAL_SORTS, 'newest')
+    lots = RawMaterial.query.options(
+        selectinload(RawMaterial.type).selectinload(RawMaterialType.allergens)
+    )
+    # Доступное сырьё
+    page = paginate(lots.filter(RawMaterial.quantity_kg > 0), sort_keys, sort)
+    materials = page.items
+    # Выработанное сырьё — свой курсор, списки листаются независимо
+    used_up_page = paginate(lots.filter(RawMaterial.quantity_kg == 0), sort_keys, sort, cursor_param='used_cursor')
+    used_up_materials = used_up_page.items
+    # Расход обеих страниц списка — одним запросом, без обхода партий и замесов по строкам
+    attach_usage(materials + used_up_materials)
+    
+    # Добавляем информацию о днях до истечения срока годности
+    today = datetime.now().date()
+    for material in materials:
+        if material.expiration_date:
+            expiration_date = material.expiration_date.date()
+            days_until_expiry = (expiration_date - today).days
+            material.days_until_expiry = days_until_expiry
+        else:
+            material.days_until_expiry = None
+    for material in used_up_materials:
+        if material.expiration_date:
+            expiration_date = material.expiration_date.date()
+            days_until_expiry = (expiration_date - today).days
+            material.days_until_expiry = days_until_expiry
+        else:
+            material.days_until_expiry = None
+    
+    return render_template(
+        'raw_materials.html',
+        form=form,
+        materials=materials,
+        used_up_materials=used_up_materials,
+        page=page,
+        used_up_page=used_up_page,
+        sort=sort,
+    )
+
+@bp.route('/raw_materials/edit/<int:id>', methods=['GET', 'POST'])
+
+@admin_required
+def edit_raw_material(id):
+    material = RawMaterial.query.get_or_404(id)
+    form = RawMaterialForm(obj=material)
+    form.type_id.choices = reference_data.choices(reference_data.material_types())
+    if form.validate_on_submit():
+        # Сохраняем старые значения для логирования изменений
+        old_quantity = material.quantity_kg
+        old_batch_number = material.batch_number
+        new_quantity = form.quantity_kg.data
+        new_batch_number = form.batch_number.data
+        
+        material.type_id = form.type_id.data
+        material.batch_number = new_batch_number
+        material.quantity_kg = new_quantity
+        material.date_received = form.date_received.data or material.date_received
+        material.expiration_date = form.expiration_date.data or material.expiration_date
+        
+        try:
+            refresh_lots([material.id])
+            db.session.commit()
+            
+            # Синхронизируем номера партий в связанных записях
+            if old_batch_number != new_batch_number:
+                updated_count = sync_material_batch_numbers(material.id)
+                if updated_count > 0:
+                    flash(f'Номер партии синхронизирован в {updated_count} замесах', 'info')
+            
+            # Показываем информацию об изменении количества
+            if old_quantity != new_quantity:
+                change = new_quantity - old_quantity
+                if change > 0:
+                    flash(f'Партия сырья обновлена! Количество увеличено на {change:.2f} кг (с {old_quantity:.2f} до {new_quantity:.2f} кг)', 'success')
+                else:
+                    flash(f'Партия сырья обновлена! Количество уменьшено на {abs(change):.2f} кг (с {old_quantity:.2f} до {new_quantity:.2f} кг)', 'success')
+            else:
+                flash('Партия сырья обновлена!', 'success')
+                
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при обновлении: {e}', 'error')
+            
+        return redirect(url_for('inventory.raw_materials'))
+    return render_template('edit_raw_material.html', form=form, material=material)
+
+@bp.route('/raw_materials/delete/<int:id>', methods=['POST'])
+@admin_required
+def delete_raw_material(id):
+    material = RawMaterial.query.get_or_404(id)
+    db.session.delete(material)
+    refresh_lots([id])
+    db.session.commit()
+    flash('Партия сырья удалена!', 'success')
+    return redirect(url_for('inventory.raw_materials'))
+
+@bp.route('/raw_materials/edit_used_up/<int:material_id>', methods=['POST'])
+@admin_required
+def edit_used_up_material(material_id):
+    """Редактирует количество выработанного сырья с автоматическим перемещением между категориями"""
+    material = RawMaterial.query.get_or_404(material_id)
+    
+    try:
+        new_quantity = float(request.form.get('new_quantity', 0))
+        
+        if new_quantity < 0:
+            flash('Количество не может быть отрицательным', 'error')
+            return redirect(url_for('inventory.raw_materials'))
+        
+        old_quantity = material.quantity_kg
+        
+        # Обновляем количество
+        material.quantity_kg = new_quantity
+        
+        # Логирование изменений (без поля notes, так как его нет в модели)
+        timestamp = datetime.now().strftime('%d.%m.%Y %H:%M')
+        print(f"[{timestamp}] Сырьё ID {material.id} ({material.batch_number}): количество изменено с {old_quantity:.2f} кг на {new_quantity:.2f} кг")
+        
+        refresh_lots([material.id])
+        db.session.commit()
+        
+        # Определяем тип сообщения в зависимости от изменения
+        if old_quantity == 0 and new_quantity > 0:
+            flash(f'Сырьё "{material.batch_number}" перемещено в доступное! Количество: {new_quantity:.2f} кг', 'success')
+        elif old_quantity > 0 and new_quantity == 0:
+            flash(f'Сырьё "{material.batch_number}" перемещено в выработанное!', 'info')
+        else:
+            flash(f'Количество сырья "{material.batch_number}" изменено с {old_quantity:.2f} кг на {new_quantity:.2f} кг', 'success')
+        
+    except ValueError:
+        flash('Некорректное значение количества', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при обновлении: {e}', 'error')
+    
+    return redirect(url_for('inventory.raw_materials'))
+
+@bp.route('/raw_materials/by_type/<int:type_id>')
+@login_required
+@conditional_get
+def raw_materials_by_type(type_id):
+    materials = RawMaterial.query.filter_by(type_id=type_id).all()
+    return jsonify([{
+        'id': m.id,
+        'type_name': m.type.name,
+        'batch_number': m.batch_number,
+        'quantity_kg': m.quantity_kg
+    } for m in materials])
+
+@bp.route('/raw_materials/available/<int:type_id>')
+@login_required
+@conditional_get
+def get_available_raw_materials(type_id):
+    materials = RawMaterial.query.filter_by(type_id=type_id).all()
+    return jsonify([{
+        'id': m.id,
+        'name': f"{m.batch_number} ({m.quantity_kg:.2f} кг)"
+    } for m in materials if m.quantity_kg > 0])
+
+# Дата завершения — updated_at; у планов без правок после создания берётся created_at
+_PLAN_COMPLETED_AT = func.coalesce(ProductionPlan.updated_at, ProductionPlan.created_at)
+
+_PLAN_PICKED_FLAG = case((ProductionPlan.picked_up_at.is_(None), 0), else_=1)  # Не забранные сначала (0 < 1)
+
+WAREHOUSE_SORTS = {
+    'not_picked_first': [(_PLAN_PICKED_FLAG, False), (_PLAN_COMPLETED_AT, True), (ProductionPlan.id, True)],
+    'completed_desc': [(_PLAN_COMPLETED_AT, True), (ProductionPlan.id, True)],
+    'completed_asc': [(_PLAN_COMPLETED_AT, False), (ProductionPlan.id, False)],
+}
+
+@bp.route('/warehouse/production')
+@login_required
+@conditional_get
+def warehouse_production():
+    """Страница склада производства - список завершённых планов"""
+    # Получаем параметры фильтрации
+    filter_status = request.args.get('filter', 'not_picked')  # not_picked, picked, all
+    product_id = request.args.get('product_id', type=int)
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+    
+    # Базовый запрос - только завершённые планы
+    query = ProductionPlan.query.filter(ProductionPlan.status == PlanStatus.COMPLETED)
+    
+    # Фильтр по статусу забора
+    if filter_status == 'not_picked':
+        query = query.filter(ProductionPlan.picked_up_at.is_(None))
+    elif filter_status == 'picked':
+        query = query.filter(ProductionPlan.picked_up_at.isnot(None))
+    # 'all' - показываем все завершённые планы
+    
+    # Фильтр по продукту
+    if product_id:
+        query = query.filter(ProductionPlan.product_id == product_id)
+    
+    # Фильтр по дате завершения (используем updated_at как приблизительную дату завершения)
+    if date_from_str:
+        try:
+            date_from = datetime.strptime(date_from_str, '%Y-%m-%d')
+            query = query.filter(ProductionPlan.updated_at >= date_from)
+        except ValueError:
+            flash('Неверный формат даты начала периода.', 'error')
+    
+    if date_to_str:
+        try:
+            date_to = datetime.strptime(date_to_str, '%Y-%m-%d')
+            query = query.filter(ProductionPlan.updated_at <= date_to + timedelta(days=1, seconds=-1))
+        except ValueError:
+            flash('Неверный формат даты конца периода.', 'error')
+    
+    # Сортировка и постраничный вывод (по умолчанию: сначала не забранные, потом по дате завершения)
+    sort, sort_keys = get_sort(WAREHOUSE_SORTS, 'not_picked_first')
+    page = paginate(
+        query.options(selectinload(ProductionPlan.product)),
+        sort_keys,
+        sort,
+    )
+    
+    # Данные для фильтров
+    products = reference_data.products()
+    
+    # Статистика одним запросом
+    total_plans, not_picked_count = db.session.query(
+        func.count(ProductionPlan.id),
+        func.count(case((ProductionPlan.picked_up_at.is_(None), 1))),
+    ).filter(ProductionPlan.status == PlanStatus.COMPLETED).one()
+    picked_count = total_plans - not_picked_count
+    
+    return render_template(
+        'warehouse_production.html',
+        plans=page.items,
+        page=page,
+        sort=sort,
+        products=products,
+        filter_status=filter_status,
+        product_id=product_id,
+        date_from=date_from_str,
+        date_to=date_to_str,
+        total_plans=total_plans,
+        not_picked_count=not_picked_count,
+        picked_count=picked_count
+    )
+
+@bp.route('/production_plans/<int:plan_id>/mark_picked_up', methods=['POST'])
+@login_required
+def mark_plan_picked_up(plan_id):
+    """Отметить план как забранный со склада производства"""
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    # Проверяем, что план завершён
+    if plan.status != PlanStatus.COMPLETED:
+        flash('Можно отмечать только завершённые планы!', 'error')
+        return redirect(url_for('inventory.warehouse_production'))
+    
+    # Отмечаем как забранный
+    if plan.picked_up_at is None:
+        plan.picked_up_at = datetime.now()
+        db.session.commit()
+        flash(f'План производства {plan.batch_number} отмечен как забранный со склада', 'success')
+    else:
+        flash('Этот план уже был отмечен как забранный', 'info')
+    
+    return redirect(url_for('inventory.warehouse_production', filter='not_picked'))
+
+@bp.route('/production_plans/<int:plan_id>/unmark_picked_up', methods=['POST'])
+@login_required
+def unmark_plan_picked_up(plan_id):
+    """Снять отметку о заборе со склада (только для администраторов)"""
+    if not current_user.is_admin():
+        flash('Только администраторы могут снимать отметку о заборе', 'error')
+        return redirect(url_for('inventory.warehouse_production'))
+    
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    if plan.picked_up_at is not None:
+        plan.picked_up_at = None
+        db.session.commit()
+        flash(f'Отметка о заборе снята с плана {plan.batch_number}', 'success')
+    else:
+        flash('Этот план не был отмечен как забранный', 'info')
+    
+    return redirect(url_for('inventory.warehouse_production', filter='picked'))
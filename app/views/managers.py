@@ -0,0 +1,284 @@
+"""Панель менеджеров: плановые даты и отметки ОКК по планам, выгрузка панели."""
+
+import re
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from app import db
+from app.models import ProductionPlan, PlanStatus
+from app.forms import ManagersDashboardForm
+from app import email_outbox, reference_data
+from app.email_notifications import is_mail_configured
+from app.views.planning import PLAN_LIST_SORTS
+from app.pagination import get_sort, paginate
+from app.utils import XlsxStream, EXPORT_YIELD_PER
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from flask_login import login_required, current_user
+from app.http_cache import conditional_get
+
+bp = Blueprint('managers', __name__)
+
+
+def _parse_optional_date_form_field(field_name):
+    raw = request.form.get(field_name)
+    if raw is None or str(raw).strip() == '':
+        return None
+    try:
+        return datetime.strptime(str(raw).strip()[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+MANAGER_DASHBOARD_EXCLUDED_STATUSES = (
+    PlanStatus.DRAFT,
+    PlanStatus.PENDING_APPROVAL,
+    PlanStatus.CANCELLED,
+)
+
+def _managers_build_query(filter_product_id):
+    """Тот же порядок, что на /production_plans: по дате создания, новые сверху."""
+    query = (
+        ProductionPlan.query.filter(
+            ~ProductionPlan.status.in_(MANAGER_DASHBOARD_EXCLUDED_STATUSES)
+        )
+        .options(joinedload(ProductionPlan.product))
+        .order_by(ProductionPlan.created_at.desc())
+    )
+    if filter_product_id:
+        query = query.filter(ProductionPlan.product_id == filter_product_id)
+    return query
+
+# Редактируемые ячейки панели: префикс поля формы → (столбец плана, кто может менять)
+MANAGER_DASHBOARD_FIELDS = {
+    'manager_planned': ('manager_planned_production_date', lambda user: user.is_admin()),
+    'handed_okk': ('handed_to_okk_date', lambda user: user.is_admin()),
+    'actual_okk_check': ('actual_okk_check_date', lambda user: user.is_admin() or user.is_operator()),
+}
+
+MANAGER_DASHBOARD_FIELD_RE = re.compile(r'^(%s)_(\d+)$' % '|'.join(MANAGER_DASHBOARD_FIELDS))
+
+# Исходное значение ячейки не пришло (форма отправлена без JavaScript)
+_NO_ORIGINAL = object()
+
+def _managers_collect_edits():
+    """Изменённые ячейки из формы: {plan_id: {столбец: (исходное значение, новое)}}.
+
+    Страница отправляет только изменённые поля и рядом orig_<поле> — значение,
+    которое было на странице. Без JavaScript приходят все поля без orig_,
+    исходное значение тогда _NO_ORIGINAL.
+    """
+    edits = {}
+    for name in request.form:
+        match = MANAGER_DASHBOARD_FIELD_RE.match(name)
+        if not match:
+            continue
+        column, allowed = MANAGER_DASHBOARD_FIELDS[match.group(1)]
+        if not allowed(current_user):
+            continue
+        original = _NO_ORIGINAL
+        if f'orig_{name}' in request.form:
+            original = _parse_optional_date_form_field(f'orig_{name}')
+        edits.setdefault(int(match.group(2)), {})[column] = (
+            original, _parse_optional_date_form_field(name)
+        )
+    return edits
+
+def _managers_apply_edits(query, edits):
+    """Одним пакетным UPDATE записывает изменённые ячейки.
+
+    Текущие значения читаются одним запросом; ячейка, которую после загрузки
+    страницы уже изменил кто-то другой (текущее значение ≠ исходного), не
+    записывается. Строки без изменений не обновляются, их updated_at не меняется.
+
+    Returns:
+        tuple: (planned_date_changes [(plan_id, старая дата, новая)], номера партий с конфликтами)
+    """
+    columns = sorted({column for cells in edits.values() for column in cells})
+    current = {
+        row.id: row
+        for row in db.session.execute(
+            query.with_entities(
+                ProductionPlan.id, ProductionPlan.batch_number,
+                *(getattr(ProductionPlan, column) for column in columns),
+            )
+            .filter(ProductionPlan.id.in_(edits))
+            .order_by(None)
+            .statement
+        )
+    }
+
+    updates = []
+    planned_date_changes = []
+    conflicts = []
+    for plan_id, cells in edits.items():
+        row = current.get(plan_id)
+        if row is None:
+            # План пропал с панели (удалён или сменил статус)
+            continue
+        values = {}
+        for column, (original, new_value) in cells.items():
+            value = getattr(row, column)
+            if value == new_value:
+                continue
+            if original is not _NO_ORIGINAL and value != original:
+                conflicts.append(row.batch_number or f'#{plan_id}')
+                continue
+            values[column] = new_value
+            if column == 'manager_planned_production_date':
+                planned_date_changes.append((plan_id, value, new_value))
+        if values:
+            updates.append({'id': plan_id, **values})
+
+    if updates:
+        db.session.execute(update(ProductionPlan), updates)
+    return planned_date_changes, conflicts
+
+@bp.route('/managers', methods=['GET', 'POST'])
+@login_required
+@conditional_get
+def managers_dashboard():
+    """Сводка для менеджеров: планы не в черновике / на утверждении / отменённые."""
+    form = ManagersDashboardForm()
+
+    if request.method == 'POST':
+        filter_product_id = request.form.get('filter_product_id', type=int)
+    else:
+        filter_product_id = request.args.get('product_id', type=int)
+
+    query = _managers_build_query(filter_product_id)
+    products = reference_data.products()
+
+    ctx = dict(
+        form=form,
+        products=products,
+        filter_product_id=filter_product_id,
+    )
+
+    # После сохранения возвращаемся на ту же страницу списка
+    rd = {}
+    if filter_product_id:
+        rd['product_id'] = filter_product_id
+    for arg in ('cursor', 'per_page', 'sort'):
+        if request.form.get(arg):
+            rd[arg] = request.form[arg]
+
+    if request.method == 'POST':
+        if current_user.is_manager():
+            flash('Роль «Менеджер» может только просматривать эту страницу.', 'error')
+            return redirect(url_for('managers.managers_dashboard', **rd))
+
+        if not form.validate_on_submit():
+            flash('Ошибка проверки формы.', 'error')
+            return redirect(url_for('managers.managers_dashboard', **rd))
+
+        planned_date_changes, conflicts = _managers_apply_edits(query, _managers_collect_edits())
+        if planned_date_changes:
+            plans = {
+                plan.id: plan
+                for plan in query.filter(
+                    ProductionPlan.id.in_([plan_id for plan_id, _, _ in planned_date_changes])
+                )
+            }
+            planned_date_changes = [
+                (plans[plan_id], old_date, new_date)
+                for plan_id, old_date, new_date in planned_date_changes
+            ]
+
+        # Письмо-сводка пишется в очередь в одной транзакции с датами и уходит в фоне
+        mail_queued = bool(planned_date_changes) and is_mail_configured()
+        if mail_queued:
+            email_outbox.queue_planned_date_changes(
+                planned_date_changes, current_user.username, current_user.id
+            )
+        db.session.commit()
+        if mail_queued:
+            email_outbox.dispatch_soon()
+
+        if planned_date_changes and not mail_queued:
+            flash(
+                'Данные сохранены, но email-уведомления не отправлены. '
+                'Проверьте настройки почты на Render.',
+                'warning',
+            )
+        elif not conflicts:
+            flash('Данные сохранены.', 'success')
+        if conflicts:
+            flash(
+                'Не сохранены изменения, которые уже внёс другой пользователь (партии: '
+                f'{", ".join(sorted(set(conflicts)))}). Проверьте значения и сохраните ещё раз.',
+                'warning',
+            )
+        return redirect(url_for('managers.managers_dashboard', **rd))
+
+    sort, sort_keys = get_sort(PLAN_LIST_SORTS, 'newest')
+    page = paginate(query, sort_keys, sort)
+    ctx['plans'] = page.items
+    ctx['page'] = page
+    return render_template('managers.html', **ctx)
+
+def _format_date_dmy(value):
+    """Дата/время в формате ДД.ММ.ГГГГ для Excel и отчётов."""
+    if value is None:
+        return ""
+    if hasattr(value, "strftime"):
+        return value.strftime("%d.%m.%Y")
+    return str(value)
+
+@bp.route("/managers/export")
+@login_required
+def export_managers_dashboard():
+    """Выгрузка таблицы «Для менеджеров» в Excel (с учётом фильтра по продукту)."""
+    filter_product_id = request.args.get("product_id", type=int)
+    plans = _managers_build_query(filter_product_id).yield_per(EXPORT_YIELD_PER)
+
+    headers = (
+        "Продукт",
+        "Партия",
+        "Кол-во, кг",
+        "Планируемая дата производства",
+        "Факт производства, дата",
+        "Статус по производству",
+        "Местонахождение партии",
+        "Передано в ОКК, дата",
+        "План завершения проверки (+10 к.д.)",
+        "Факт проверки, дата",
+        "Статус ОКК",
+    )
+
+    def rows():
+        for plan in plans:
+            if plan.actual_okk_check_date:
+                okk_status = "Одобрено"
+            elif plan.handed_to_okk_date:
+                okk_status = "Проверка"
+            else:
+                okk_status = "Ожидание"
+
+            planned_okk = ""
+            if plan.manager_okk_planned_completion_date:
+                planned_okk = plan.manager_okk_planned_completion_date.strftime("%d.%m.%Y")
+
+            yield [
+                plan.product.name if plan.product else "—",
+                plan.batch_number or "—",
+                plan.get_report_quantity_kg() if plan.quantity is not None else "",
+                _format_date_dmy(plan.manager_planned_production_date),
+                _format_date_dmy(plan.production_date),
+                plan.manager_production_status_label,
+                plan.manager_location_label,
+                _format_date_dmy(plan.handed_to_okk_date),
+                planned_okk,
+                _format_date_dmy(plan.actual_okk_check_date),
+                okk_status,
+            ]
+
+    export = XlsxStream()
+    export.add_sheet(
+        "Для менеджеров",
+        headers,
+        rows(),
+        header_style={},
+        widths={col: 28 if col == 1 else 18 for col in range(1, 12)},
+    )
+
+    fname = f"dlya_menedzherov_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+    return export.send(fname)
@@ -0,0 +1,1223 @@
+"""Планирование производства: планы, замесы и их ингредиенты, годовое планирование."""
+
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from app import db
+from app.models import (
+    RawMaterial, RecipeTemplate as Recipe, Product, ProductionPlan, PlanStatus, ProductionBatch,
+    MaterialBatch, BatchMaterial, MonthlyPlan, PalletType,
+)
+from app.forms import (
+    ProductionPlanForm, ProductionBatchForm, ProductionStatusForm, BatchIngredientForm,
+    MonthlyPlanForm, EditBatchProductionDateForm, EditBatchEmployeeForm,
+)
+from app import production_rollups, reference_data, yearly_plan
+from app.query_profiles import plan_list_options
+from app.pagination import get_sort, paginate
+from app.bom import get_bom, preload_boms
+from app.plan_totals import refresh_plan_totals
+from app import plan_events
+from app.allocation import StockSnapshot, plan_batches, insert_planned_batches
+from app.stock_ledger import (
+    refresh_lots, refresh_plan_lots, lot_ids_for_plan, lot_ids_for_batch, on_hand_by_type,
+)
+from sqlalchemy.orm import selectinload, contains_eager
+from flask_login import login_required, current_user
+from app.decorators import admin_required, operator_required
+from app.http_cache import conditional_get
+
+bp = Blueprint('planning', __name__)
+
+
+def _plan_batch_materials(plan_id):
+    """Внесённые ингредиенты всех замесов плана одним запросом.
+
+    Returns:
+        dict: {batch_id: {material_type_id: [BatchMaterial, ...]}} — с подгруженными
+        material_batch и material; записи с удалённым сырьём не попадают.
+    """
+    matrix = {}
+    batch_materials = (
+        BatchMaterial.query
+        .join(BatchMaterial.material_batch)
+        .join(MaterialBatch.material)
+        .join(ProductionBatch, ProductionBatch.id == BatchMaterial.batch_id)
+        .filter(ProductionBatch.plan_id == plan_id)
+        .options(contains_eager(BatchMaterial.material_batch).contains_eager(MaterialBatch.material))
+        .order_by(BatchMaterial.id)
+    )
+    for bi in batch_materials:
+        matrix.setdefault(bi.batch_id, {}).setdefault(bi.material_batch.material.type_id, []).append(bi)
+    return matrix
+
+def _plan_batches_ingredients_complete(plan):
+    """Проверяет, что ингредиенты в каждом замесе соответствуют весу замеса."""
+    if not plan.template:
+        return True, None
+    bom = get_bom(plan.template)
+    batch_materials = _plan_batch_materials(plan.id)
+    for batch in plan.batches:
+        by_type = batch_materials.get(batch.id, {})
+        for line, need_qty in zip(bom.lines(), bom.quantities(batch.weight)):
+            added_qty = sum(bi.quantity for bi in by_type.get(line.id, ()))
+            if abs(added_qty - need_qty) > 0.01:
+                return False, (
+                    f'В замесе №{batch.batch_number} для ингредиента '
+                    f'"{line.name}" внесено {added_qty:.2f} кг '
+                    f'из {need_qty:.2f} кг.'
+                )
+    return True, None
+
+PLAN_LIST_SORTS = {
+    'newest': [(ProductionPlan.created_at, True), (ProductionPlan.id, True)],
+    'oldest': [(ProductionPlan.created_at, False), (ProductionPlan.id, False)],
+}
+
+@bp.route('/production_plans')
+@login_required
+@conditional_get
+def production_plans():
+    # Получаем параметры фильтрации
+    product_id = request.args.get('product_id', type=int)
+    status = request.args.get('status')
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+
+    query = ProductionPlan.query
+# Скрываем планы "черновик" и "на утверждении" для операторов
+    if not current_user.is_admin():
+        query = query.filter(
+            ProductionPlan.status != PlanStatus.DRAFT,
+            ProductionPlan.status != PlanStatus.PENDING_APPROVAL
+        )
+    # Применяем фильтры
+    if product_id:
+        query = query.filter(ProductionPlan.product_id == product_id)
+    if status:
+        # Преобразуем строковый статус в enum
+        try:
+            if status == PlanStatus.DRAFT.value:
+                status_enum = PlanStatus.DRAFT
+            elif status == PlanStatus.PENDING_APPROVAL.value:
+                status_enum = PlanStatus.PENDING_APPROVAL
+            elif status == PlanStatus.APPROVED.value:
+                status_enum = PlanStatus.APPROVED
+            elif status == PlanStatus.IN_PROGRESS.value:
+                status_enum = PlanStatus.IN_PROGRESS
+            elif status == PlanStatus.COMPLETED.value:
+                status_enum = PlanStatus.COMPLETED
+            elif status == PlanStatus.CANCELLED.value:
+                status_enum = PlanStatus.CANCELLED
+            else:
+                status_enum = None
+                
+            if status_enum:
+                query = query.filter(ProductionPlan.status == status_enum)
+        except Exception as e:
+            flash(f'Ошибка фильтрации по статусу: {e}', 'error')
+    
+    if date_from_str:
+        try:
+            date_from = datetime.strptime(date_from_str, '%Y-%m-%d')
+            query = query.filter(ProductionPlan.created_at >= date_from)
+        except ValueError:
+            flash('Неверный формат даты начала периода.', 'error')
+    
+    if date_to_str:
+        try:
+            date_to = datetime.strptime(date_to_str, '%Y-%m-%d')
+            # Включаем весь день до 23:59:59
+            query = query.filter(ProductionPlan.created_at <= date_to + timedelta(days=1, seconds=-1))
+        except ValueError:
+            flash('Неверный формат даты конца периода.', 'error')
+
+    # Сортировка и постраничный вывод
+    sort, sort_keys = get_sort(PLAN_LIST_SORTS, 'newest')
+    page = paginate(query.options(*plan_list_options()), sort_keys, sort)
+    preload_boms(plan.template for plan in page.items)
+
+    # Данные для форм фильтров
+    products = reference_data.products()
+
+    # Цвета для статусов
+    status_colors = {
+        PlanStatus.DRAFT: 'secondary',
+        PlanStatus.PENDING_APPROVAL: 'warning',
+        PlanStatus.APPROVED: 'info',
+        PlanStatus.IN_PROGRESS: 'primary',
+        PlanStatus.COMPLETED: 'success',
+        PlanStatus.CANCELLED: 'danger'
+    }
+
+    return render_template(
+        'production_plans.html',
+        plans=page.items,
+        page=page,
+        products=products,
+        status_colors=status_colors,
+        PlanStatus=PlanStatus
+    )
+
+@bp.route('/production_plans/<int:plan_id>/update_status', methods=['POST'])
+@operator_required
+def update_plan_status(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    form = ProductionStatusForm(plan=plan)
+
+    # Операторам запрещаем любые действия с планом в статусе "На утверждении".
+    if not current_user.is_admin() and plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    if form.validate_on_submit():
+        old_status = plan.status
+        new_status = form.status.data
+
+        # Non-admin не может переводить план в статус "На утверждении".
+        if not current_user.is_admin() and new_status == PlanStatus.PENDING_APPROVAL:
+            flash('Перевод плана в статус "На утверждении" доступен только администраторам.', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+        # Проверка перед установкой статуса "завершен"
+        if new_status == PlanStatus.COMPLETED:
+            if not form.production_date.data:
+                flash('Для завершения плана необходимо указать дату производства', 'error')
+                return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+            total_produced = plan.get_produced_kg()
+            if total_produced <= 0:
+                flash('Невозможно завершить план без замесов (произведено 0 кг).', 'error')
+                return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+            ingredients_ok, ingredients_error = _plan_batches_ingredients_complete(plan)
+            if not ingredients_ok:
+                flash(f'Невозможно завершить план. {ingredients_error}', 'error')
+                return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+            is_shortfall = total_produced < plan.quantity * 0.999
+            if old_status != PlanStatus.COMPLETED:
+                if is_shortfall:
+                    if not form.complete_with_shortfall.data:
+                        flash(
+                            f'Произведено {total_produced:.2f} кг из {plan.quantity:.2f} кг. '
+                            f'Отметьте «Завершить с недовыполнением» и укажите причину.',
+                            'error',
+                        )
+                        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+                    shortfall_reason = (form.shortfall_reason.data or '').strip()
+                    if len(shortfall_reason) < 3:
+                        flash('Укажите причину недовыполнения (не менее 3 символов).', 'error')
+                        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+                    plan.completed_with_shortfall = True
+                    plan.shortfall_reason = shortfall_reason
+                    plan_events.record(
+                        plan, plan_events.SHORTFALL,
+                        planned_kg=plan.quantity, produced_kg=total_produced, reason=shortfall_reason,
+                    )
+                else:
+                    plan.completed_with_shortfall = False
+                    plan.shortfall_reason = None
+        
+        # Списание сырья при завершении плана
+        if old_status != PlanStatus.COMPLETED and new_status == PlanStatus.COMPLETED:
+            try:
+                for batch in plan.batches:
+                    for batch_ingredient in batch.materials:
+                        raw_material = batch_ingredient.material_batch.material
+                        if raw_material:
+                            raw_material.quantity_kg = max(0, raw_material.quantity_kg - batch_ingredient.quantity)
+                # Фиксируется вместе со сменой статуса, чтобы остатки и резерв не расходились
+                db.session.flush()
+                flash('Сырьё списано при завершении плана', 'success')
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Ошибка при списании сырья: {str(e)}', 'error')
+                return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+        
+        # Обновляем дату производства при завершении плана или если указана новая дата
+        if new_status == PlanStatus.COMPLETED and form.production_date.data:
+            # Сохраняем дату производства при завершении
+            old_date = plan.production_date
+            plan.production_date = form.production_date.data
+            
+            # Логируем установку даты производства
+            if old_date != plan.production_date:
+                if old_date:
+                    plan_events.record(
+                        plan, plan_events.PRODUCTION_DATE_CHANGED, old=old_date, new=plan.production_date,
+                    )
+                else:
+                    plan_events.record(plan, plan_events.PRODUCTION_DATE_SET, date=plan.production_date)
+        elif new_status != PlanStatus.COMPLETED and form.production_date.data:
+            # Обновляем дату производства для незавершённых планов
+            old_date = plan.production_date
+            plan.production_date = form.production_date.data
+            
+            # Логируем изменение даты производства
+            if old_date != plan.production_date:
+                if old_date:
+                    plan_events.record(
+                        plan, plan_events.PRODUCTION_DATE_CHANGED, old=old_date, new=plan.production_date,
+                    )
+                else:
+                    plan_events.record(plan, plan_events.PRODUCTION_DATE_SET, date=plan.production_date)
+        
+        # Обработка старого формата статуса (без ё)
+        old_status_normalized = old_status.replace("утвержден", "утверждён")
+        
+        # Получаем отображаемые значения статусов, с защитой от отсутствующих ключей
+        old_status_display = old_status_normalized
+        new_status_display = new_status
+        
+        plan_events.record(
+            plan, plan_events.STATUS_CHANGED,
+            old=f"{old_status_display}", new=f"{new_status_display}", comment=form.notes.data or None,
+        )
+
+        pallet = (form.pallet_type.data or '').strip()
+        plan.pallet_type = pallet if pallet in (PalletType.EURO.value, PalletType.FIN.value) else None
+        plan.kg_per_pallet = form.kg_per_pallet.data
+
+        plan.status = new_status
+        if (old_status == PlanStatus.COMPLETED) != (new_status == PlanStatus.COMPLETED):
+            # Резерв партий учитывает только незавершённые планы, сводные отчёты — только завершённые
+            refresh_plan_lots(plan.id)
+            production_rollups.refresh_plan(plan)
+        db.session.commit()
+
+        flash('Статус успешно обновлен!', 'success')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    if request.method == 'POST':
+        for field_errors in form.errors.values():
+            for err in field_errors:
+                flash(err, 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+@bp.route('/production_plans/<int:plan_id>/add_batch', methods=['POST'])
+@operator_required
+def add_batch(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    form = ProductionBatchForm()
+
+    # Операторам запрещаем создавать замесы в планах "На утверждении".
+    if not current_user.is_admin() and plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+    if plan.status == PlanStatus.COMPLETED:
+        flash('Нельзя добавлять замесы в завершённый план', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    if form.validate_on_submit():
+        # Проверяем максимальный вес замеса
+        if form.quantity.data > 1200:
+            flash('Вес замеса не может превышать 1200 кг', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Проверяем уникальность номера замеса в рамках текущего плана
+        existing_batch = ProductionBatch.query.filter_by(
+            plan_id=plan.id,
+            batch_number=form.batch_number.data
+        ).first()
+        if existing_batch:
+            flash('Замес с таким номером уже существует в текущем плане', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Проверяем, не превышает ли общее количество план
+        total_quantity = plan.get_produced_kg() + form.quantity.data
+        if total_quantity > plan.quantity:
+            flash(f'Общее количество замесов ({total_quantity} кг) превышает план ({plan.quantity} кг)', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        batch = ProductionBatch(
+            plan=plan,
+            batch_number=form.batch_number.data,
+            weight=form.quantity.data,
+            production_date=datetime.now(),  # Автоматически устанавливаем текущую дату
+            employee_id=form.employee_id.data if form.employee_id.data else None
+        )
+        db.session.add(batch)
+        db.session.flush()  # Получаем ID замеса
+        
+        # Автоматически добавляем все ингредиенты из рецептуры
+        added_ingredients = []
+        missing_ingredients = []
+        used_material_ids = set()
+        bom = get_bom(plan.template)
+        stock = StockSnapshot.load(bom.type_ids)
+        
+        for line, needed_qty in zip(bom.lines(), bom.quantities(batch.weight)):
+            # Получаем список партий с нужным количеством
+            materials_to_use, shortage = stock.allocate(needed_qty, line.id)
+            
+            if shortage > 0:
+                missing_ingredients.append(f"{line.name} (нужно {needed_qty:.2f} кг, недостаточно {shortage:.2f} кг)")
+                continue
+            
+            # Создаём записи для каждой использованной партии
+            for material_info in materials_to_use:
+                material = material_info['material']
+                qty = material_info['quantity']
+                used_material_ids.add(material.id)
+                
+                # Создаём MaterialBatch и BatchMaterial
+                material_batch = MaterialBatch(
+                    material=material,
+                    batch_number=material.batch_number,
+                    quantity=qty,
+                    remaining_quantity=qty
+                )
+                db.session.add(material_batch)
+                db.session.flush()
+                
+                ingredient = BatchMaterial(
+                    batch=batch,
+                    material_batch=material_batch,
+                    quantity=qty
+                )
+                db.session.add(ingredient)
+            
+            # Добавляем информацию об ингредиенте
+            total_used = sum(m['quantity'] for m in materials_to_use)
+            if len(materials_to_use) == 1:
+                added_ingredients.append(f"{line.name} ({total_used:.2f} кг из партии {materials_to_use[0]['material'].batch_number})")
+            else:
+                batches_info = [f"{m['material'].batch_number}({m['quantity']:.2f} кг)" for m in materials_to_use]
+                added_ingredients.append(f"{line.name} ({total_used:.2f} кг из партий: {', '.join(batches_info)})")
+        
+        plan_events.record(
+            plan, plan_events.BATCH_ADDED,
+            batch_number=batch.batch_number, weight=batch.weight,
+            ingredients_added=bool(added_ingredients), missing=missing_ingredients,
+        )
+        
+        refresh_lots(used_material_ids)
+        refresh_plan_totals(plan)
+        db.session.commit()
+        
+        if missing_ingredients:
+            flash(f'Замес добавлен. Недостаточно сырья: {", ".join(missing_ingredients)}', 'warning')
+        else:
+            flash('Замес добавлен с автоматическим заполнением ингредиентов', 'success')
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f'Ошибка в поле {getattr(form, field).label.text}: {error}', 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+@bp.route('/production_plans/<int:plan_id>/add_batch_ingredient', methods=['GET', 'POST'])
+@operator_required
+def add_batch_ingredient(plan_id):
+    form = BatchIngredientForm()
+    batch_id = request.args.get('batch_id') or request.form.get('batch_id')
+    ingredient_type_id = request.args.get('ingredient_type_id') or request.form.get('ingredient_type_id')
+    if not batch_id or not ingredient_type_id:
+        flash('Не выбран замес или ингредиент для добавления', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    batch = ProductionBatch.query.get_or_404(batch_id)
+
+    # Операторам запрещаем добавлять ингредиенты в замесы планов "На утверждении".
+    if not current_user.is_admin() and batch.plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=batch.plan_id))
+
+    if batch.plan.status == PlanStatus.COMPLETED:
+        flash('Нельзя добавлять ингредиенты в замесы завершённого плана', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=batch.plan_id))
+
+    bom = get_bom(batch.plan.template)
+    position = bom.position(int(ingredient_type_id)) if bom and str(ingredient_type_id).isdigit() else None
+    if position is None:
+        flash('Выбран некорректный ингредиент', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    ingredient_info = bom.line(position)
+    available_materials = RawMaterial.query.filter_by(type_id=ingredient_info.id).all()
+    form.raw_material_id.choices = [(m.id, f"{m.batch_number} ({m.quantity_kg} кг)") for m in available_materials]
+    if form.validate_on_submit():
+        raw_material = RawMaterial.query.get(form.raw_material_id.data)
+        if not raw_material or raw_material.type_id != ingredient_info.id:
+            flash('Выбрано неверное сырье', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        need_qty = (batch.weight * ingredient_info.percent / 100) - sum([
+            bi.quantity for bi in batch.materials
+            if bi.material_batch and bi.material_batch.material and bi.material_batch.material.type_id == ingredient_info.id
+        ])
+        # Используем epsilon для учёта погрешности вычислений с плавающей точкой
+        epsilon = 0.01  # Погрешность 0.01 кг (1 грамм)
+        if form.quantity.data > need_qty + epsilon:
+            flash(f'Нельзя добавить больше чем нужно ({need_qty:.2f} кг)', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        if form.quantity.data > raw_material.quantity_kg:
+            flash(f'Недостаточно сырья (доступно {raw_material.quantity_kg:.2f} кг)', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        material_batch = MaterialBatch(
+            material=raw_material,
+            batch_number=raw_material.batch_number,
+            quantity=form.quantity.data,
+            remaining_quantity=form.quantity.data
+        )
+        db.session.add(material_batch)
+        db.session.flush()
+        ingredient = BatchMaterial(
+            batch=batch,
+            material_batch=material_batch,
+            quantity=form.quantity.data
+        )
+        db.session.add(ingredient)
+        refresh_lots([raw_material.id])
+        db.session.commit()
+        flash('Ингредиент добавлен!', 'success')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    return render_template('add_batch_ingredient.html', form=form, batch=batch)
+
+@bp.route('/production_plans/<int:plan_id>')
+@login_required
+def production_plan_detail(plan_id):
+    plan = ProductionPlan.query.options(
+        selectinload(ProductionPlan.batches).selectinload(ProductionBatch.employee)
+    ).get_or_404(plan_id)
+
+    # План "На утверждении" видят и редактируют только администраторы.
+    if not current_user.is_admin() and plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plans'))
+    
+    # Проверяем существование рецептуры
+    if not plan.template:
+        flash('Рецептура для данного плана была удалена. Измените статус плана на "черновик" или "отменён", чтобы удалить его.', 'warning')
+    
+    # Вычисляем прогресс производства
+    total_produced = plan.get_produced_kg()
+    progress_percent = (total_produced / plan.quantity * 100) if plan.quantity > 0 else 0
+    can_complete_with_shortfall = (
+        plan.status != PlanStatus.COMPLETED
+        and total_produced > 0
+        and plan.quantity
+        and total_produced < plan.quantity * 0.999
+    )
+    
+    # Проверяем наличие сырья только если есть рецептура
+    raw_materials_availability = {}
+    can_start = True
+    start_message = ""
+    
+    bom = get_bom(plan.template)
+    if bom is not None:
+        on_hand = on_hand_by_type(bom.type_ids)
+        for line, needed_qty in zip(bom.lines(), bom.quantities(plan.quantity)):
+            type_id = line.id
+            available_qty = on_hand.get(type_id, 0.0)
+            
+            raw_materials_availability[type_id] = {
+                'type': line,
+                'quantity_needed': needed_qty,
+                'quantity_available': available_qty,
+                'is_available': available_qty >= needed_qty,
+                'shortage': max(0, needed_qty - available_qty)
+            }
+            
+            if available_qty < needed_qty:
+                can_start = False
+                start_message = "Недостаточно сырья для начала производства"
+
+    # Цвета для статусов
+    status_colors = {
+        PlanStatus.DRAFT: 'secondary',
+        PlanStatus.PENDING_APPROVAL: 'warning',
+        PlanStatus.APPROVED: 'info',
+        PlanStatus.IN_PROGRESS: 'primary',
+        PlanStatus.COMPLETED: 'success',
+        PlanStatus.CANCELLED: 'danger'
+    }
+
+    # Информация о замесах
+    batches_info = []
+    if bom is not None:
+        # Матрица замес × ингредиент — из одного запроса по ингредиентам всех замесов плана
+        batch_materials = _plan_batch_materials(plan.id)
+        lines = bom.lines()
+        for batch in plan.batches:
+            ingredients_info = []
+            by_type = batch_materials.get(batch.id, {})
+            for line, need_qty in zip(lines, bom.quantities(batch.weight)):
+                batch_ingredients = by_type.get(line.id, [])
+                added_qty = sum(bi.quantity for bi in batch_ingredients)
+
+                # Группируем партии по batch_number
+                grouped_batches = {}
+                for bi in batch_ingredients:
+                    key = bi.material_batch.batch_number or 'N/A'
+                    if key not in grouped_batches:
+                        grouped_batches[key] = {
+                            'batch_number': bi.material_batch.batch_number or 'N/A',
+                            'material_name': bi.material_batch.material.name,
+                            'quantity': 0.0
+                        }
+                    grouped_batches[key]['quantity'] += bi.quantity
+
+                ingredients_info.append({
+                    'type': line,
+                    'need_qty': need_qty,
+                    'added_qty': added_qty,
+                    'to_add_qty': max(0, need_qty - added_qty),
+                    'added_materials': list(grouped_batches.values()),
+                    'original_batch_materials': batch_ingredients
+                })
+            
+            batches_info.append({
+                'batch': batch,
+                'ingredients': ingredients_info
+            })
+
+    # Создаем формы
+    status_form = ProductionStatusForm(plan=plan)
+    status_form.status.data = plan.status  # Устанавливаем текущий статус
+    if plan.production_date:
+        status_form.production_date.data = (
+            plan.production_date.date()
+            if hasattr(plan.production_date, 'date')
+            else plan.production_date
+        )
+    status_form.pallet_type.data = plan.pallet_type or ''
+    status_form.kg_per_pallet.data = plan.kg_per_pallet
+    batch_form = ProductionBatchForm()  # Форма автоматически загрузит список сотрудников
+    batch_ingredient_form = BatchIngredientForm()
+
+    # Получаем список сотрудников для выбора в модальном окне множественного добавления
+    employees_list = reference_data.employees()
+    
+    return render_template(
+        'production_plan_detail.html',
+        plan=plan,
+        events_page=plan_events.timeline(plan.id),
+        raw_materials_availability=raw_materials_availability,
+        can_start=can_start,
+        start_message=start_message,
+        progress_percent=progress_percent,
+        total_produced=total_produced,
+        can_complete_with_shortfall=can_complete_with_shortfall,
+        status_colors=status_colors,
+        batches_info=batches_info,
+        status_form=status_form,
+        batch_form=batch_form,
+        batch_ingredient_form=batch_ingredient_form,
+        employees=employees_list,
+        PlanStatus=PlanStatus)
+
+@bp.route('/batches/delete/<int:batch_id>', methods=['POST'])
+@login_required
+def delete_batch(batch_id):
+    batch = ProductionBatch.query.get_or_404(batch_id)
+    plan = batch.plan
+
+    # Операторам запрещаем удалять замесы в планах "На утверждении".
+    if not current_user.is_admin() and plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+    if plan.status == PlanStatus.COMPLETED:
+        flash('Нельзя удалять замес после завершения плана!', 'danger')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    material_ids = lot_ids_for_batch(batch.id)
+    db.session.delete(batch)
+    refresh_lots(material_ids)
+    refresh_plan_totals(plan)
+    db.session.commit()
+    flash('Замес удалён!', 'success')
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+
+@bp.route('/batches/<int:batch_id>/edit_production_date', methods=['GET', 'POST'])
+@login_required
+def edit_batch_production_date(batch_id):
+    """Редактирование даты производства замеса"""
+    batch = ProductionBatch.query.get_or_404(batch_id)
+    plan = batch.plan
+    
+    # Проверяем, что план в производстве или завершён
+    if plan.status not in [PlanStatus.IN_PROGRESS, PlanStatus.COMPLETED]:
+        flash('Дату производства можно редактировать только для планов в производстве или завершённых', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    # Для завершённых планов редактирование доступно только администраторам
+    if plan.status == PlanStatus.COMPLETED and not current_user.is_admin():
+        flash('Дату производства завершённых планов могут редактировать только администраторы', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    form = EditBatchProductionDateForm(obj=batch)
+    
+    if form.validate_on_submit():
+        if form.production_date.data:
+            # Преобразуем date в datetime с временем (полночь)
+            from datetime import time
+            batch.production_date = datetime.combine(form.production_date.data, time())
+        else:
+            batch.production_date = None
+        
+        db.session.commit()
+        flash('Дата производства замеса обновлена!', 'success')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    return render_template('edit_batch_production_date.html', form=form, batch=batch, plan=plan)
+
+@bp.route('/batches/<int:batch_id>/edit_employee', methods=['GET', 'POST'])
+@login_required
+def edit_batch_employee(batch_id):
+    """Редактирование ответственного сотрудника для замеса"""
+    batch = ProductionBatch.query.get_or_404(batch_id)
+    plan = batch.plan
+    
+    # Проверяем, что план в производстве или завершён
+    if plan.status not in [PlanStatus.IN_PROGRESS, PlanStatus.COMPLETED]:
+        flash('Ответственного можно редактировать только для планов в производстве или завершённых', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    # Для завершённых планов редактирование доступно только администраторам
+    if plan.status == PlanStatus.COMPLETED and not current_user.is_admin():
+        flash('Ответственного завершённых планов могут редактировать только администраторы', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    form = EditBatchEmployeeForm(obj=batch)
+    
+    if form.validate_on_submit():
+        batch.employee_id = form.employee_id.data
+        db.session.commit()
+        flash('Ответственный сотрудник обновлён!', 'success')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+    
+    return render_template('edit_batch_employee.html', form=form, batch=batch, plan=plan)
+
+@bp.route('/batch_ingredients/delete/<int:ingredient_id>', methods=['POST'])
+@login_required
+def delete_batch_ingredient(ingredient_id):
+    # Находим ингредиент, который нужно удалить
+    ingredient = BatchMaterial.query.get_or_404(ingredient_id)
+    plan_id = ingredient.batch.plan_id
+
+    # Операторам запрещаем удалять ингредиенты в планах "На утверждении".
+    if not current_user.is_admin() and ingredient.batch.plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+    # Проверяем статус плана, чтобы запретить изменения в завершенных планах
+    if ingredient.batch.plan.status == PlanStatus.COMPLETED:
+        flash('Нельзя удалять ингредиенты из завершенного плана!', 'danger')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+    try:
+        # Удаляем запись об использовании ингредиента
+        material_id = ingredient.material_batch.material_id if ingredient.material_batch else None
+        db.session.delete(ingredient)
+        refresh_lots([material_id])
+        db.session.commit()
+        flash('Ингредиент удален из замеса!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при удалении ингредиента: {str(e)}', 'error')
+        
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+@bp.route('/production_plans/create', methods=['GET', 'POST'])
+@admin_required
+def create_production_plan():
+    form = ProductionPlanForm()
+    
+    # Заполняем список продуктов
+    products = reference_data.products()
+    form.product_id.choices = reference_data.choices(products)
+    
+    # Заполняем список рецептур для выбранного продукта
+    if request.method == 'POST':
+        selected_product_id = int(request.form.get('product_id', 0))
+    else:
+        selected_product_id = request.args.get('product_id', type=int)
+        if not selected_product_id and products:
+            selected_product_id = products[0].id
+    
+    if selected_product_id:
+        recipes = Recipe.query.filter_by(
+            product_id=selected_product_id,
+            status='saved'
+        ).order_by(Recipe.name).all()
+        form.template_id.choices = [(r.id, r.name) for r in recipes]
+    else:
+        form.template_id.choices = []
+    
+    if form.validate_on_submit():
+        plan = ProductionPlan(
+            product_id=form.product_id.data,
+            template_id=form.template_id.data,
+            batch_number=form.batch_number.data,
+            quantity=form.quantity.data,
+            notes=form.notes.data,
+            status=PlanStatus.DRAFT
+        )
+        
+        # Если нажата кнопка "Утвердить"
+        if form.approve.data:
+            # Проверка наличия сырья уже выполнена в validate_quantity
+            plan.status = PlanStatus.APPROVED
+            flash('План производства создан и утверждён!', 'success')
+        else:
+            flash('План производства создан как черновик', 'success')
+        
+        db.session.add(plan)
+        try:
+            db.session.commit()
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan.id))
+        except Exception as e:
+            db.session.rollback()
+            if 'UNIQUE constraint' in str(e):
+                flash('План производства с таким номером партии уже существует', 'error')
+            else:
+                flash('Произошла ошибка при сохранении плана', 'error')
+            return redirect(url_for('planning.create_production_plan'))
+    
+    return render_template('create_production_plan.html',
+                         form=form,
+                         selected_product_id=selected_product_id)
+
+@bp.route('/production_plans/<int:plan_id>/delete', methods=['POST'])
+@admin_required
+def delete_production_plan(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    # Проверяем, можно ли удалить план
+    if plan.status not in [PlanStatus.DRAFT, PlanStatus.CANCELLED]:
+        flash('Можно удалить только черновик плана производства или отмененный план', 'error')
+        return redirect(url_for('planning.production_plans'))
+    
+    # Получаем номер партии для сообщения
+    batch_number = plan.batch_number or f'#{plan.id}'
+    
+    try:
+        # Удаляем все замесы и их ингредиенты
+        material_ids = lot_ids_for_plan(plan.id)
+        for batch in plan.batches:
+            db.session.delete(batch)
+        
+        # Удаляем сам план
+        db.session.delete(plan)
+        refresh_lots(material_ids)
+        db.session.commit()
+        
+        flash(f'План производства {batch_number} удален', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при удалении плана производства: {str(e)}', 'error')
+    
+    return redirect(url_for('planning.production_plans'))
+
+@bp.route('/production_plans/<int:plan_id>/add_multiple_batches', methods=['POST'])
+@operator_required
+def add_multiple_batches(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+
+    # Операторам запрещаем создавать замесы в планах "На утверждении".
+    if not current_user.is_admin() and plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+    if plan.status == PlanStatus.COMPLETED:
+        flash('Нельзя добавлять замесы в завершённый план', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    try:
+        # Получаем данные из формы
+        num_batches = int(request.form.get('num_batches', 0))
+        weight_per_batch = float(request.form.get('weight_per_batch', 0))
+        employee_id = request.form.get('employee_id', None)
+        if employee_id:
+            try:
+                employee_id = int(employee_id)
+            except (ValueError, TypeError):
+                employee_id = None
+        else:
+            employee_id = None
+        
+        if num_batches <= 0 or weight_per_batch <= 0:
+            flash('Количество замесов и вес должны быть больше 0', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Проверяем максимальный вес замеса
+        if weight_per_batch > 1200:
+            flash('Вес замеса не может превышать 1200 кг', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Проверяем, не превышает ли общее количество план
+        total_quantity = plan.get_produced_kg() + (num_batches * weight_per_batch)
+        if total_quantity > plan.quantity:
+            flash(f'Общее количество замесов ({total_quantity} кг) превышает план ({plan.quantity} кг)', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Находим следующий номер замеса
+        existing_batch_numbers = [batch.batch_number for batch in plan.batches]
+        next_batch_number = 1
+        while str(next_batch_number) in existing_batch_numbers:
+            next_batch_number += 1
+        
+        # Планируем все замесы по одному снимку остатков и записываем их пакетно:
+        # замес с недостачей сырья пропускается, остальные сохраняются
+        bom = get_bom(plan.template)
+        stock = StockSnapshot.load(bom.type_ids)
+        batch_numbers = [str(next_batch_number + i) for i in range(num_batches)]
+        planned, failed = plan_batches(bom, batch_numbers, weight_per_batch, stock)
+        insert_planned_batches(
+            plan, planned, weight_per_batch, employee_id,
+            production_date=datetime.now(),  # Автоматически устанавливаем текущую дату
+        )
+        refresh_plan_totals(plan)
+        refresh_lots(
+            material_info['material'].id
+            for item in planned
+            for _, materials_to_use in item['allocations']
+            for material_info in materials_to_use
+        )
+        
+        created_batches = []
+        for item in planned:
+            batch_ingredients = []
+            for line, materials_to_use in item['allocations']:
+                # Добавляем информацию об ингредиенте
+                total_used = sum(m['quantity'] for m in materials_to_use)
+                if len(materials_to_use) == 1:
+                    batch_ingredients.append(f"{line.name} ({total_used:.2f} кг из партии {materials_to_use[0]['material'].batch_number})")
+                else:
+                    batches_info = [f"{m['material'].batch_number}({m['quantity']:.2f} кг)" for m in materials_to_use]
+                    batch_ingredients.append(f"{line.name} ({total_used:.2f} кг из партий: {', '.join(batches_info)})")
+            created_batches.append(f"Замес №{item['batch_number']} ({weight_per_batch} кг): {', '.join(batch_ingredients)}")
+        
+        failed_batches = [
+            f"Замес №{item['batch_number']}: недостаточно сырья - {', '.join(item['missing'])}"
+            for item in failed
+        ]
+        
+        plan_events.record(plan, plan_events.BATCHES_ADDED, count=len(created_batches), weight=weight_per_batch)
+            
+        db.session.commit()
+        
+        if created_batches:
+            flash(f'Успешно создано {len(created_batches)} замесов', 'success')
+        
+        if failed_batches:
+            flash(
+                f'Не удалось создать {len(failed_batches)} замесов из-за недостатка сырья: '
+                f'{"; ".join(failed_batches)}',
+                'warning',
+            )
+            
+    except ValueError:
+        flash('Некорректные данные в форме', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при создании замесов: {str(e)}', 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+@bp.route('/production_plans/<int:plan_id>/delete_all_batches', methods=['POST'])
+@operator_required
+def delete_all_batches(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+
+    # Операторам запрещаем удалять замесы в планах "На утверждении".
+    if not current_user.is_admin() and plan.status == PlanStatus.PENDING_APPROVAL:
+        flash('План в статусе "На утверждении" доступен только администраторам.', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    # Проверяем, что план не завершён
+    if plan.status == PlanStatus.COMPLETED:
+        flash('Нельзя удалять замесы из завершённого плана', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    # Подсчитываем количество удаляемых замесов
+    num_batches = plan.batch_count
+    
+    if num_batches == 0:
+        flash('В плане нет замесов для удаления', 'info')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    try:
+        # Удаляем все замесы (cascade="all, delete-orphan" в модели автоматически удалит связанные записи)
+        material_ids = lot_ids_for_plan(plan.id)
+        for batch in plan.batches:
+            db.session.delete(batch)
+        refresh_lots(material_ids)
+        refresh_plan_totals(plan)
+        
+        plan_events.record(plan, plan_events.BATCHES_DELETED, count=num_batches)
+            
+        db.session.commit()
+        flash(f'Удалено {num_batches} замесов', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при удалении замесов: {str(e)}', 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+# --- Годовое планирование ---
+@bp.route('/yearly_planning')
+@login_required
+def yearly_planning():
+    """Главная страница годового планирования"""
+    year = request.args.get('year', type=int)
+    if not year:
+        year = datetime.now().year
+    
+    monthly_counts = yearly_plan.month_counts(year)
+    
+    from datetime import datetime as dt
+    return render_template('yearly_planning.html', year=year, monthly_counts=monthly_counts, datetime=dt)
+
+@bp.route('/yearly_planning/<int:year>/<int:month>')
+@login_required
+def monthly_planning(year, month):
+    """Страница планирования для конкретного месяца"""
+    if month < 1 or month > 12:
+        flash('Некорректный месяц', 'error')
+        return redirect(url_for('planning.yearly_planning'))
+    
+    plans = (
+        MonthlyPlan.query.filter_by(year=year, month=month)
+        .options(selectinload(MonthlyPlan.product), selectinload(MonthlyPlan.template))
+        .all()
+    )
+    
+    # Потребность в сырье для месяца
+    material_needs = yearly_plan.material_needs(year, month).get(month, [])
+    
+    form = None
+    if current_user.is_admin():
+        form = MonthlyPlanForm()
+        form.year.data = year
+        form.month.data = month
+    
+    return render_template(
+        'monthly_planning.html',
+        year=year,
+        month=month,
+        month_name=yearly_plan.MONTH_NAMES[month-1],
+        plans=plans,
+        material_needs=material_needs,
+        form=form
+    )
+
+@bp.route('/yearly_planning/<int:year>/<int:month>/add', methods=['POST'])
+@admin_required
+def add_monthly_plan(year, month):
+    """Добавление плана для месяца"""
+    if month < 1 or month > 12:
+        flash('Некорректный месяц', 'error')
+        return redirect(url_for('planning.yearly_planning', year=year))
+    
+    form = MonthlyPlanForm()
+    form.year.data = year
+    form.month.data = month
+    
+    if form.validate_on_submit():
+        # Проверяем уникальность продукта в месяце
+        existing = MonthlyPlan.query.filter_by(
+            year=year,
+            month=month,
+            product_id=form.product_id.data
+        ).first()
+        
+        if existing:
+            flash('План для этого продукта в указанном месяце уже существует', 'error')
+            return redirect(url_for('planning.monthly_planning', year=year, month=month))
+        
+        plan = MonthlyPlan(
+            year=year,
+            month=month,
+            product_id=form.product_id.data,
+            template_id=form.template_id.data,
+            quantity_kg=form.quantity_kg.data
+        )
+        
+        db.session.add(plan)
+        db.session.commit()
+        flash('План добавлен!', 'success')
+    
+    return redirect(url_for('planning.monthly_planning', year=year, month=month))
+
+@bp.route('/yearly_planning/<int:plan_id>/edit', methods=['GET', 'POST'])
+@admin_required
+def edit_monthly_plan(plan_id):
+    """Редактирование месячного плана"""
+    plan = MonthlyPlan.query.get_or_404(plan_id)
+    form = MonthlyPlanForm(obj=plan)
+    form._edit_plan = plan  # Для валидации
+    
+    if form.validate_on_submit():
+        plan.year = form.year.data
+        plan.month = form.month.data
+        plan.product_id = form.product_id.data
+        plan.template_id = form.template_id.data
+        plan.quantity_kg = form.quantity_kg.data
+        
+        db.session.commit()
+        flash('План обновлен!', 'success')
+        return redirect(url_for('planning.monthly_planning', year=plan.year, month=plan.month))
+    
+    return render_template('edit_monthly_plan.html', form=form, plan=plan)
+
+@bp.route('/yearly_planning/<int:plan_id>/delete', methods=['POST'])
+@admin_required
+def delete_monthly_plan(plan_id):
+    """Удаление месячного плана"""
+    plan = MonthlyPlan.query.get_or_404(plan_id)
+    year = plan.year
+    month = plan.month
+    
+    db.session.delete(plan)
+    db.session.commit()
+    flash('План удален!', 'success')
+    
+    return redirect(url_for('planning.monthly_planning', year=year, month=month))
+
+@bp.route('/yearly_planning/<int:product_id>/recipes')
+@login_required
+@conditional_get
+def get_recipes_for_product(product_id):
+    """API для получения рецептур продукта (для динамического обновления формы)"""
+    product = Product.query.get_or_404(product_id)
+    recipes = Recipe.query.filter_by(product_id=product_id, status='saved').all()
+    
+    return jsonify([{
+        'id': recipe.id,
+        'name': recipe.name
+    } for recipe in recipes])
+
+@bp.route('/production_plans/<int:plan_id>/edit_quantity', methods=['POST'])
+@operator_required
+def edit_plan_quantity(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    # Проверяем, что план имеет статус "Черновик"
+    if plan.status != PlanStatus.DRAFT:
+        flash('Можно изменять количество только в планах со статусом "Черновик"', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    try:
+        # Получаем новое количество из формы
+        new_quantity = float(request.form.get('new_quantity', 0))
+        
+        if new_quantity <= 0:
+            flash('Количество должно быть больше 0', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Сохраняем старое количество для журнала плана
+        old_quantity = plan.quantity
+        
+        # Обновляем количество в плане
+        plan.quantity = new_quantity
+        
+        plan_events.record(plan, plan_events.QUANTITY_CHANGED, old=old_quantity, new=new_quantity)
+            
+        db.session.commit()
+        flash(f'Количество плана изменено с {old_quantity:.2f} кг на {new_quantity:.2f} кг', 'success')
+        
+    except ValueError:
+        flash('Некорректное значение количества', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при изменении количества: {str(e)}', 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+@bp.route('/production_plans/<int:plan_id>/edit_name', methods=['POST'])
+@operator_required
+def edit_plan_name(plan_id):
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    # Проверяем, что план имеет статус "Черновик"
+    if plan.status != PlanStatus.DRAFT:
+        flash('Можно изменять номер партии только в планах со статусом "Черновик"', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    try:
+        # Получаем новый номер партии из формы
+        new_batch_number = request.form.get('new_name', '').strip()
+        
+        if not new_batch_number:
+            flash('Номер партии не может быть пустым', 'error')
+            return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+        
+        # Сохраняем старый номер партии для журнала плана
+        old_batch_number = plan.batch_number
+        
+        # Обновляем номер партии в плане
+        plan.batch_number = new_batch_number
+        
+        plan_events.record(plan, plan_events.BATCH_NUMBER_CHANGED, old=old_batch_number, new=new_batch_number)
+            
+        db.session.commit()
+        flash(f'Номер партии изменен с "{old_batch_number}" на "{new_batch_number}"', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при изменении номера партии: {str(e)}', 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+def restore_raw_materials_from_plan(plan):
+    """Автоматически восстанавливает сырьё из завершённого плана"""
+    
+    restored_count = 0
+    restored_materials = []
+    
+    try:
+        for batch in plan.batches:
+            for batch_material in batch.materials:
+                # Находим соответствующее сырьё
+                raw_material = batch_material.material_batch.material
+                
+                if raw_material:
+                    # Восстанавливаем количество
+                    raw_material.quantity_kg += batch_material.quantity
+                    restored_count += 1
+                    
+                    restored_materials.append(f"{raw_material.batch_number}: +{batch_material.quantity:.2f} кг")
+        
+        return f"{restored_count} позиций: {', '.join(restored_materials)}"
+        
+    except Exception as e:
+        print(f"Ошибка при восстановлении сырья: {e}")
+        return f"Ошибка: {e}"
+
+@bp.route('/production_plans/<int:plan_id>/undo_completion', methods=['POST'])
+@admin_required
+def undo_plan_completion(plan_id):
+    """Отменяет завершение плана с автоматическим восстановлением сырья"""
+    
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    if plan.status != PlanStatus.COMPLETED:
+        flash('Можно отменить только завершённые планы', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    try:
+        # 1. Автоматически восстанавливаем сырьё
+        restored_materials = restore_raw_materials_from_plan(plan)
+        
+        # 2. Меняем статус на "Черновик"
+        plan.status = PlanStatus.DRAFT
+        plan.completed_with_shortfall = False
+        plan.shortfall_reason = None
+        refresh_plan_lots(plan.id)
+        production_rollups.refresh_plan(plan)
+        
+        # 3. Запись в журнал плана
+        plan_events.record(plan, plan_events.COMPLETION_UNDONE, restored=restored_materials)
+        
+        db.session.commit()
+        
+        flash(f'Завершение плана отменено! Восстановлено сырья: {restored_materials}', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при отмене завершения: {e}', 'error')
+    
+    return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
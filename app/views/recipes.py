@@ -0,0 +1,388 @@
+"""Продукты и рецептуры: состав, халяль-статус и аллергены рецептур."""
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from app import db
+from app.models import (
+    RecipeTemplate as Recipe, Product, RecipeItem as RecipeIngredient, RecipeItem, ProductionPlan,
+    PlanStatus, AllergenType, HalalStatus,
+)
+from app.forms import (
+    ProductForm, RecipeForm, RecipeIngredientForm, RecipeHalalForm, RecipeAllergenForm,
+)
+from app import reference_data
+from app.bom import bump_bom_version
+from flask_login import login_required, current_user
+from app.decorators import admin_required
+from app.http_cache import conditional_get
+
+bp = Blueprint('recipes', __name__)
+
+
+def _halal_status_from_form(raw):
+    if raw is None or str(raw).strip() == '':
+        return None
+    try:
+        return HalalStatus(str(raw).strip())
+    except ValueError:
+        return None
+
+def _apply_recipe_allergens(recipe, allergen_ids):
+    """Сохраняет выбранные аллергены на рецептуре (безаллергенность)."""
+    recipe.allergens.clear()
+    if not allergen_ids:
+        return
+    for allergen_id in allergen_ids:
+        allergen = AllergenType.query.get(int(allergen_id))
+        if allergen:
+            recipe.allergens.append(allergen)
+
+# --- Продукты ---
+@bp.route('/products', methods=['GET', 'POST'])
+@login_required
+@conditional_get
+def products():
+    form = ProductForm()
+    if form.validate_on_submit():
+        # Проверяем права на создание
+        if not current_user.is_admin():
+            flash('Доступ запрещен. Требуются права администратора для создания.', 'error')
+            return redirect(url_for('recipes.products'))
+        
+        product = Product(name=form.name.data)
+        db.session.add(product)
+        reference_data.bump(reference_data.PRODUCTS)
+        db.session.commit()
+        flash('Продукт добавлен!', 'success')
+        return redirect(url_for('recipes.products'))
+    products = Product.query.all()
+    return render_template('products.html', form=form, products=products)
+
+@bp.route('/products/delete/<int:id>', methods=['POST'])
+@admin_required
+def delete_product(id):
+    product = Product.query.get_or_404(id)
+    
+    # Проверяем, есть ли связанные рецептуры
+    if product.recipe_templates:
+        flash('Невозможно удалить продукт, так как для него существуют рецептуры.', 'error')
+        return redirect(url_for('recipes.products'))
+    
+    # Проверяем, есть ли связанные планы производства
+    if product.production_plans:
+        flash('Невозможно удалить продукт, так как для него существуют планы производства.', 'error')
+        return redirect(url_for('recipes.products'))
+    
+    db.session.delete(product)
+    reference_data.bump(reference_data.PRODUCTS)
+    db.session.commit()
+    flash('Продукт удален!', 'success')
+    return redirect(url_for('recipes.products'))
+
+# --- Рецептуры ---
+@bp.route('/recipes', methods=['GET', 'POST'])
+@login_required
+@conditional_get
+def recipes():
+    form = RecipeForm()
+    form.product_id.choices = reference_data.choices(reference_data.products())
+    if form.validate_on_submit():
+        # Проверяем права на создание
+        if not current_user.is_admin():
+            flash('Доступ запрещен. Требуются права администратора для создания.', 'error')
+            return redirect(url_for('recipes.recipes'))
+        
+        recipe = Recipe(
+            name=form.name.data,
+            product_id=form.product_id.data,
+            status='draft',
+            halal_status=_halal_status_from_form(form.halal_status.data),
+        )
+        db.session.add(recipe)
+        db.session.flush()
+        _apply_recipe_allergens(recipe, form.allergen_type_ids.data)
+        db.session.commit()
+        flash('Рецептура создана! Теперь добавьте ингредиенты.', 'success')
+        return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe.id))
+    recipes = Recipe.query.filter_by(status='saved').all()  # Показываем только сохраненные
+    drafts = Recipe.query.filter_by(status='draft').all()  # Отдельно показываем черновики
+    return render_template('recipes.html', form=form, recipes=recipes, drafts=drafts)
+
+@bp.route('/recipes/delete/<int:id>', methods=['POST'])
+@admin_required
+def delete_recipe(id):
+    recipe = Recipe.query.get_or_404(id)
+    
+    # Проверяем, используется ли рецептура в планах производства
+    plans_using_recipe = ProductionPlan.query.filter_by(template_id=recipe.id).all()
+    if plans_using_recipe:
+        plan_numbers = [str(plan.id) for plan in plans_using_recipe]
+        flash(f'Невозможно удалить рецептуру, так как она используется в планах производства: {", ".join(plan_numbers)}', 'error')
+        return redirect(url_for('recipes.recipes'))
+    
+    db.session.delete(recipe)
+    db.session.commit()
+    flash('Рецептура удалена!', 'success')
+    return redirect(url_for('recipes.recipes'))
+
+# --- Ингредиенты рецептуры ---
+@bp.route('/recipes/<int:recipe_id>/ingredients', methods=['GET', 'POST'])
+@login_required
+def recipe_ingredients(recipe_id):
+    recipe = Recipe.query.get_or_404(recipe_id)
+
+    halal_form = RecipeHalalForm()
+    if recipe.halal_status:
+        halal_form.halal_status.data = recipe.halal_status.value
+
+    allergen_form = RecipeAllergenForm()
+    allergen_form.allergen_type_ids.data = [a.id for a in recipe.allergens]
+
+    form = RecipeIngredientForm()
+    form.recipe = recipe  # для валидации
+
+    form.material_type_id.choices = reference_data.choices(reference_data.material_types())
+
+    if request.method == 'POST':
+        if not current_user.is_admin():
+            flash('Доступ запрещен. Требуются права администратора для изменения рецептуры.', 'error')
+            return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe_id))
+
+        if request.form.get('update_halal') == '1':
+            recipe.halal_status = _halal_status_from_form(request.form.get('halal_status'))
+            db.session.commit()
+            flash('Статус Халяль/Харам рецептуры сохранён.', 'success')
+            return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe_id))
+
+        if request.form.get('update_allergens') == '1':
+            _apply_recipe_allergens(recipe, request.form.getlist('allergen_type_ids'))
+            db.session.commit()
+            flash('Безаллергенность рецептуры сохранена.', 'success')
+            return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe_id))
+
+        if recipe.status == 'saved':
+            flash('Эта рецептура уже сохранена и не может быть изменена.', 'warning')
+            return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe_id))
+
+        if 'save_recipe' in request.form:  # Нажата кнопка "Сохранить рецептуру"
+            total_percent = sum(item.percentage for item in recipe.recipe_items)
+            if not recipe.recipe_items:
+                flash('Добавьте хотя бы один ингредиент перед сохранением рецептуры.', 'error')
+            elif abs(total_percent - 100) > 0.01:  # Учитываем возможную погрешность float
+                flash(f'Сумма процентов должна быть равна 100%. Текущая сумма: {total_percent:.3f}%', 'error')
+            else:
+                recipe.status = 'saved'
+                db.session.commit()
+                flash('Рецептура успешно сохранена!', 'success')
+                return redirect(url_for('recipes.recipes'))
+        elif form.validate():  # Нажата кнопка "Добавить ингредиент"
+            # Проверяем, не добавлен ли уже этот тип сырья
+            existing = RecipeIngredient.query.filter_by(
+                template_id=recipe.id,
+                material_type_id=form.material_type_id.data
+            ).first()
+            
+            if existing:
+                flash('Этот вид сырья уже добавлен в рецептуру.', 'error')
+            else:
+                ingredient = RecipeIngredient(
+                    template_id=recipe.id,
+                    material_type_id=form.material_type_id.data,
+                    percentage=form.percentage.data
+                )
+                db.session.add(ingredient)
+                bump_bom_version(recipe)
+                db.session.commit()
+                flash('Ингредиент добавлен!', 'success')
+                
+                # Показываем текущую сумму процентов
+                total_percent = sum(item.percentage for item in recipe.recipe_items)
+                if total_percent > 100:
+                    flash(f'Предупреждение: сумма процентов превышает 100% ({total_percent:.3f}%)', 'warning')
+                elif total_percent < 100:
+                    flash(f'Осталось добавить {100 - total_percent:.3f}%', 'info')
+            
+        return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe.id))
+        
+    ingredients = RecipeIngredient.query.filter_by(template_id=recipe.id).all()
+    total_percent = sum(item.percentage for item in ingredients)
+    return render_template(
+        'recipe_ingredients.html',
+        form=form if recipe.status != 'saved' else None,
+        halal_form=halal_form,
+        allergen_form=allergen_form,
+        recipe=recipe,
+        ingredients=ingredients,
+        total_percent=total_percent,
+    )
+
+@bp.route('/recipes/<int:recipe_id>/ingredients/<int:ingredient_id>/delete', methods=['POST'])
+@admin_required
+def delete_recipe_ingredient(recipe_id, ingredient_id):
+    recipe = Recipe.query.get_or_404(recipe_id)
+    if recipe.status == 'saved':
+        flash('Нельзя изменять сохраненную рецептуру.', 'error')
+        return redirect(url_for('recipes.recipes'))
+        
+    ingredient = RecipeIngredient.query.get_or_404(ingredient_id)
+    if ingredient.template_id != recipe_id:
+        flash('Ошибка: ингредиент не принадлежит указанной рецептуре.', 'error')
+        return redirect(url_for('recipes.recipes'))
+        
+    db.session.delete(ingredient)
+    bump_bom_version(recipe)
+    db.session.commit()
+    flash('Ингредиент удален из рецептуры!', 'success')
+    return redirect(url_for('recipes.recipe_ingredients', recipe_id=recipe_id))
+
+@bp.route('/recipes/by_product/<int:product_id>')
+@login_required
+@conditional_get
+def recipes_by_product(product_id):
+    recipes = Recipe.query.filter_by(
+        product_id=product_id,
+        status='saved'
+    ).all()
+    return jsonify([{
+        'id': recipe.id,
+        'name': recipe.name
+    } for recipe in recipes])
+
+@bp.route('/products/<int:product_id>/edit_recipe', methods=['GET'])
+@admin_required
+def choose_product_recipe(product_id):
+    """Выбор рецептуры продукта, если их несколько."""
+    product = Product.query.get_or_404(product_id)
+    recipe_templates = (
+        Recipe.query.filter_by(product_id=product_id)
+        .order_by(Recipe.status.desc(), Recipe.name.asc(), Recipe.id.asc())
+        .all()
+    )
+    if not recipe_templates:
+        flash('У продукта нет рецептуры для редактирования', 'error')
+        return redirect(url_for('recipes.products'))
+    if len(recipe_templates) == 1:
+        return redirect(
+            url_for('recipes.edit_product_recipe',
+                product_id=product_id,
+                recipe_id=recipe_templates[0].id,
+            )
+        )
+    return render_template(
+        'choose_product_recipe.html',
+        product=product,
+        recipe_templates=recipe_templates,
+    )
+
+@bp.route('/products/<int:product_id>/edit_recipe/<int:recipe_id>', methods=['GET', 'POST'])
+@admin_required
+def edit_product_recipe(product_id, recipe_id):
+    product = Product.query.get_or_404(product_id)
+    recipe_template = Recipe.query.filter_by(
+        id=recipe_id, product_id=product_id
+    ).first_or_404()
+
+    def _edit_url():
+        return url_for('recipes.edit_product_recipe', product_id=product_id, recipe_id=recipe_id
+        )
+
+    if request.method == 'GET':
+        recipe_items = RecipeItem.query.filter_by(
+            template_id=recipe_template.id
+        ).order_by(RecipeItem.id).all()
+        raw_material_types = [
+            {'id': t.id, 'name': t.name}
+            for t in reference_data.material_types()
+        ]
+        all_recipes = Recipe.query.filter_by(product_id=product_id).order_by(
+            Recipe.name.asc()
+        ).all()
+        allergen_types = reference_data.allergens()
+        selected_allergen_ids = {a.id for a in recipe_template.allergens}
+
+        return render_template(
+            'edit_product_recipe.html',
+            product=product,
+            recipe_template=recipe_template,
+            recipe_items=recipe_items,
+            raw_material_types=raw_material_types,
+            all_recipes=all_recipes,
+            allergen_types=allergen_types,
+            selected_allergen_ids=selected_allergen_ids,
+        )
+
+    try:
+        recipe_template.halal_status = _halal_status_from_form(
+            request.form.get('halal_status')
+        )
+        _apply_recipe_allergens(
+            recipe_template, request.form.getlist('allergen_type_ids')
+        )
+
+        active_plans = ProductionPlan.query.filter(
+            ProductionPlan.product_id == product_id,
+            ProductionPlan.status.in_([PlanStatus.APPROVED, PlanStatus.IN_PROGRESS]),
+        ).first()
+
+        if active_plans:
+            db.session.commit()
+            flash(
+                'Статус Халяль/Харам и безаллергенность сохранены. Состав рецептуры нельзя менять: '
+                'продукт используется в активных планах производства.',
+                'warning',
+            )
+            return redirect(_edit_url())
+
+        material_type_ids = request.form.getlist('material_type_id[]')
+        percentages = request.form.getlist('percentage[]')
+
+        if not material_type_ids or not percentages:
+            flash('Необходимо указать хотя бы один ингредиент', 'error')
+            return redirect(_edit_url())
+
+        if len(material_type_ids) != len(percentages):
+            flash('Ошибка в данных формы', 'error')
+            return redirect(_edit_url())
+
+        total_percentage = 0
+        for percentage_str in percentages:
+            try:
+                percentage = float(percentage_str)
+                if percentage <= 0:
+                    flash('Процент каждого ингредиента должен быть больше 0', 'error')
+                    return redirect(_edit_url())
+                total_percentage += percentage
+            except ValueError:
+                flash('Некорректное значение процента', 'error')
+                return redirect(_edit_url())
+
+        if abs(total_percentage - 100.0) > 0.001:
+            flash(
+                f'Сумма процентов должна быть равна 100%. '
+                f'Текущая сумма: {total_percentage:.3f}%',
+                'error',
+            )
+            return redirect(_edit_url())
+
+        if len(set(material_type_ids)) != len(material_type_ids):
+            flash('Каждый тип сырья может быть указан только один раз', 'error')
+            return redirect(_edit_url())
+
+        RecipeItem.query.filter_by(template_id=recipe_template.id).delete()
+
+        for material_type_id, percentage_str in zip(material_type_ids, percentages):
+            recipe_item = RecipeItem(
+                template_id=recipe_template.id,
+                material_type_id=int(material_type_id),
+                percentage=float(percentage_str),
+            )
+            db.session.add(recipe_item)
+
+        bump_bom_version(recipe_template)
+        db.session.commit()
+        flash('Рецептура продукта успешно обновлена', 'success')
+        return redirect(url_for('recipes.products'))
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при обновлении рецептуры: {str(e)}', 'error')
+        return redirect(_edit_url())
@@ -0,0 +1,608 @@
+"""Отчёты и выгрузки: страницы отчётов, Excel и Word, фоновые задания выгрузок."""
+
+from datetime import date, datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, abort
+from app.models import (
+    RawMaterial, RecipeTemplate as Recipe, Product, ProductionPlan, PlanStatus, ProductionBatch,
+    MaterialBatch, BatchMaterial, ExportJob,
+)
+from app.forms import RawMaterialUsageReportForm, ProductionStatisticsForm
+from app import production_rollups, reference_data, report_cache, yearly_plan
+from app.query_profiles import plan_report_options
+from app.exports import (
+    EXPORT_BUILDERS, build_raw_material_usage, build_production_statistics, build_production_plans,
+)
+from app.export_jobs import start_export, job_payload
+from app.pagination import get_sort, paginate
+from app.views.planning import PLAN_LIST_SORTS
+from app.utils import XlsxStream, format_datetime, XLSX_MIMETYPE
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+from flask_login import login_required, current_user
+import json
+import os
+from io import BytesIO
+
+bp = Blueprint('reports', __name__)
+
+
+@bp.route('/reports')
+@login_required
+def reports():
+    # Остатки сырья
+    raw_materials = RawMaterial.query.order_by(RawMaterial.type_id, RawMaterial.batch_number).all()
+    # История производства
+    plans_query = ProductionPlan.query
+    if not current_user.is_admin():
+        plans_query = plans_query.filter(ProductionPlan.status != PlanStatus.PENDING_APPROVAL)
+    plans = plans_query.order_by(ProductionPlan.created_at.desc()).all()
+    return render_template('reports.html', raw_materials=raw_materials, plans=plans)
+
+@bp.route('/reports/raw_material_usage', methods=['GET', 'POST'])
+@login_required
+def raw_material_usage_report():
+    form = RawMaterialUsageReportForm()
+    usage_data = None
+
+    if form.validate_on_submit():
+        date_from = form.date_from.data
+        date_to = form.date_to.data
+
+        # Сводная таблица: только завершённые планы, день date_to — целиком
+        usage_data = report_cache.cached(
+            'raw_material_usage',
+            {'date_from': date_from, 'date_to': date_to},
+            lambda: [row._asdict() for row in production_rollups.material_usage(date_from, date_to)],
+        )
+    else:
+        usage_data = None
+
+    return render_template(
+        'raw_material_usage_report.html',
+        form=form,
+        usage_data=usage_data
+    )
+
+def _production_statistics_results(date_from, date_to):
+    """HTML детализации и итогов статистики производства за период (кэшируется целиком)."""
+    query = (
+        ProductionPlan.query
+        .options(
+            joinedload(ProductionPlan.batches)
+            .joinedload(ProductionBatch.materials)
+            .joinedload(BatchMaterial.material_batch)
+            .joinedload(MaterialBatch.material)
+            .joinedload(RawMaterial.type)
+        )
+        .join(Product, Product.id == ProductionPlan.product_id)
+        .join(Recipe, Recipe.id == ProductionPlan.template_id)
+        .filter(ProductionPlan.status == PlanStatus.COMPLETED)
+    )
+
+    if date_from:
+        query = query.filter(ProductionPlan.created_at >= date_from)
+    if date_to:
+        date_to_end_of_day = date_to + timedelta(days=1, seconds=-1)
+        query = query.filter(ProductionPlan.created_at <= date_to_end_of_day)
+
+    # Сортировка по дате и продукту
+    statistics_data = query.order_by(Product.name, ProductionPlan.created_at).all()
+
+    # Итоги по продуктам — из сводной таблицы, без обхода планов
+    totals = {}
+    if statistics_data:
+        for product_name, recipe_name, plans_count, produced_kg in production_rollups.production_totals(
+            date_from, date_to
+        ):
+            totals[(product_name, recipe_name)] = {
+                'product_name': product_name,
+                'recipe_name': recipe_name,
+                'total_quantity': produced_kg or 0,
+                'plans_count': plans_count,
+            }
+
+    return render_template(
+        '_production_statistics_results.html',
+        statistics_data=statistics_data,
+        totals=totals if statistics_data else None
+    )
+
+@bp.route('/reports/production_statistics', methods=['GET', 'POST'])
+@login_required
+def production_statistics():
+    form = ProductionStatisticsForm()
+    results = None
+
+    if form.validate_on_submit():
+        date_from = form.date_from.data
+        date_to = form.date_to.data
+        results = report_cache.cached(
+            'production_statistics',
+            {'date_from': date_from, 'date_to': date_to},
+            lambda: _production_statistics_results(date_from, date_to),
+        )
+
+    return render_template(
+        'production_statistics.html',
+        form=form,
+        results=results
+    )
+
+@bp.route('/reports/raw_material_forecast', methods=['GET'])
+@login_required
+def raw_material_forecast():
+    # NumPy загружается при первом обращении к прогнозу, а не при старте приложения
+    from app.material_forecast import build_forecast
+
+    def compute():
+        forecast = build_forecast()
+        return forecast.type_rows(), forecast.daily_rows()
+
+    # Прогноз зависит от сегодняшней даты (пригодность партий по срокам)
+    type_rows, daily_rows = report_cache.cached('raw_material_forecast', {'today': date.today()}, compute)
+    return render_template(
+        'raw_material_forecast.html',
+        type_rows=type_rows,
+        daily_rows=daily_rows,
+    )
+
+def _plans_report_summary(query):
+    """Всего планов, завершённых, объём для отчёта и произведено (кг) по отфильтрованному запросу."""
+    produced_kg = ProductionPlan.produced_kg
+    is_completed = ProductionPlan.status == PlanStatus.COMPLETED
+    total, completed, report_volume, total_produced = (
+        query.order_by(None)
+        .with_entities(
+            func.count(ProductionPlan.id),
+            func.coalesce(func.sum(case((is_completed, 1), else_=0)), 0),
+            # Как get_report_quantity_kg: завершённый план — факт, иначе — план
+            func.coalesce(func.sum(case((is_completed, produced_kg), else_=func.coalesce(ProductionPlan.quantity, 0))), 0),
+            func.coalesce(func.sum(produced_kg), 0),
+        )
+        .one()
+    )
+    return {
+        'total': total,
+        'completed': completed,
+        'report_volume': float(report_volume),
+        'total_produced': float(total_produced),
+    }
+
+@bp.route('/reports/production_plans', methods=['GET'])
+@login_required
+def production_plans_report():
+    """Отчёт по планам производства"""
+    # Получаем параметры фильтрации
+    product_id = request.args.get('product_id', type=int)
+    status = request.args.get('status')
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+
+    query = ProductionPlan.query
+    # Применённые фильтры — ключ итогов в кэше отчётов
+    filters = {'admin': current_user.is_admin()}
+
+    # Операторам запрещаем видеть планы "На утверждении".
+    if not current_user.is_admin():
+        query = query.filter(ProductionPlan.status != PlanStatus.PENDING_APPROVAL)
+
+    # Применяем фильтры
+    if product_id:
+        query = query.filter(ProductionPlan.product_id == product_id)
+        filters['product_id'] = product_id
+    if status:
+        # Преобразуем строковый статус в enum
+        try:
+            if status == PlanStatus.DRAFT.value:
+                status_enum = PlanStatus.DRAFT
+            elif status == PlanStatus.APPROVED.value:
+                status_enum = PlanStatus.APPROVED
+            elif status == PlanStatus.IN_PROGRESS.value:
+                status_enum = PlanStatus.IN_PROGRESS
+            elif status == PlanStatus.COMPLETED.value:
+                status_enum = PlanStatus.COMPLETED
+            elif status == PlanStatus.CANCELLED.value:
+                status_enum = PlanStatus.CANCELLED
+            else:
+                status_enum = None
+                
+            if status_enum:
+                query = query.filter(ProductionPlan.status == status_enum)
+                filters['status'] = status_enum.value
+        except Exception as e:
+            flash(f'Ошибка фильтрации по статусу: {e}', 'error')
+    
+    if date_from_str:
+        try:
+            date_from = datetime.strptime(date_from_str, '%Y-%m-%d')
+            query = query.filter(ProductionPlan.created_at >= date_from)
+            filters['date_from'] = date_from
+        except ValueError:
+            flash('Неверный формат даты начала периода.', 'error')
+    
+    if date_to_str:
+        try:
+            date_to = datetime.strptime(date_to_str, '%Y-%m-%d')
+            # Включаем весь день до 23:59:59
+            query = query.filter(ProductionPlan.created_at <= date_to + timedelta(days=1, seconds=-1))
+            filters['date_to'] = date_to
+        except ValueError:
+            flash('Неверный формат даты конца периода.', 'error')
+
+    # Итоги по всем планам под фильтром — одним агрегирующим запросом
+    summary = report_cache.cached('production_plans_report', filters, lambda: _plans_report_summary(query))
+
+    # Сортировка и постраничный вывод
+    sort, sort_keys = get_sort(PLAN_LIST_SORTS, 'newest')
+    page = paginate(query.options(*plan_report_options()), sort_keys, sort)
+
+    # Данные для форм фильтров
+    products = reference_data.products()
+
+    # Цвета для статусов
+    status_colors = {
+        PlanStatus.DRAFT: 'secondary',
+        PlanStatus.PENDING_APPROVAL: 'warning',
+        PlanStatus.APPROVED: 'info',
+        PlanStatus.IN_PROGRESS: 'primary',
+        PlanStatus.COMPLETED: 'success',
+        PlanStatus.CANCELLED: 'danger'
+    }
+
+    return render_template(
+        'production_plans_report.html',
+        plans=page.items,
+        page=page,
+        summary=summary,
+        products=products,
+        status_colors=status_colors,
+        PlanStatus=PlanStatus
+    )
+
+@bp.route('/reports/raw_material_usage/export')
+@login_required
+def export_raw_material_usage():
+    export = XlsxStream()
+    filename = build_raw_material_usage(export, {})
+    return export.send(filename)
+
+@bp.route('/reports/production_statistics/export')
+@login_required
+def export_production_statistics():
+    export = XlsxStream()
+    filename = build_production_statistics(export, {})
+    return export.send(filename)
+
+@bp.route('/reports/raw_material_forecast/export')
+@login_required
+def export_raw_material_forecast():
+    from app.material_forecast import build_forecast
+
+    export = XlsxStream()
+    forecast = build_forecast()
+    type_rows = forecast.type_rows()
+
+    # Текущие остатки
+    export.add_sheet(
+        "Текущие остатки",
+        ["Вид сырья", "Остаток (кг)"],
+        ([row['name'], row['on_hand']] for row in type_rows),
+    )
+    
+    # Прогноз по дням, итоговая строка после пустой строки
+    forecast_rows = [[day] + values for day, values in forecast.daily_rows()]
+    forecast_rows += [[], ["Общая потребность"] + [row['total'] for row in type_rows]]
+    export.add_sheet("Прогноз по дням", ["Дата"] + [row['name'] for row in type_rows], forecast_rows)
+    
+    # Анализ достаточности
+    analysis_rows = []
+    for row in type_rows:
+        balance = row['balance']
+        status = "Достаточно" if balance >= 0 else f"Требуется докупить {abs(balance):.2f} кг"
+        analysis_rows.append([
+            row['name'],
+            row['on_hand'],
+            row['total'],
+            balance,
+            status,
+            row['shortage_date'] or "",
+        ])
+    export.add_sheet(
+        "Анализ достаточности",
+        ["Вид сырья", "Текущий остаток (кг)", "Общая потребность (кг)", "Баланс (кг)", "Статус",
+         "Дефицит с учётом сроков годности, с даты"],
+        analysis_rows,
+    )
+    
+    filename = f"raw_material_forecast_{format_datetime(datetime.now())}.xlsx"
+    return export.send(filename)
+
+@bp.route('/reports/production_plans/export')
+@login_required
+def export_production_plans():
+    """Экспорт отчёта по планам производства в Excel"""
+    export = XlsxStream()
+    filename = build_production_plans(export, {'include_pending': current_user.is_admin()})
+    return export.send(filename)
+
+def _export_job_params(kind):
+    """Параметры фоновой выгрузки для текущего пользователя (от них зависит и кэш, и доступ к файлу)."""
+    if kind == 'production_plans':
+        return {'include_pending': current_user.is_admin()}
+    return {}
+
+def _get_export_job_or_404(job_id):
+    job = ExportJob.query.get_or_404(job_id)
+    # Файл доступен тем, кто получил бы выгрузку с теми же параметрами
+    if json.loads(job.params) != _export_job_params(job.kind):
+        abort(403)
+    return job
+
+@bp.route('/exports/<kind>', methods=['POST'])
+@login_required
+def start_export_job(kind):
+    """Запуск фоновой выгрузки (или переиспользование готовой с теми же параметрами и данными)"""
+    if kind not in EXPORT_BUILDERS:
+        abort(404)
+    job = start_export(kind, _export_job_params(kind), current_user.id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(_export_job_status(job))
+    return redirect(url_for('reports.export_job', job_id=job.id))
+
+def _export_job_status(job):
+    payload = job_payload(job)
+    payload['status_url'] = url_for('reports.export_job_status', job_id=job.id)
+    payload['download_url'] = url_for('reports.download_export_job', job_id=job.id) if job.status == ExportJob.STATUS_DONE else None
+    return payload
+
+@bp.route('/exports/<int:job_id>')
+@login_required
+def export_job(job_id):
+    """Страница ожидания фоновой выгрузки"""
+    job = _get_export_job_or_404(job_id)
+    _, title = EXPORT_BUILDERS.get(job.kind, (None, job.kind))
+    return render_template('export_job.html', job=job, title=title, status=_export_job_status(job))
+
+@bp.route('/exports/<int:job_id>/status')
+@login_required
+def export_job_status(job_id):
+    """Состояние фоновой выгрузки (JSON для опроса)"""
+    return jsonify(_export_job_status(_get_export_job_or_404(job_id)))
+
+@bp.route('/exports/<int:job_id>/download')
+@login_required
+def download_export_job(job_id):
+    """Скачивание готового файла фоновой выгрузки"""
+    job = _get_export_job_or_404(job_id)
+    if job.status != ExportJob.STATUS_DONE or not job.artifact_path or not os.path.exists(job.artifact_path):
+        flash('Файл выгрузки недоступен, запустите выгрузку заново.', 'warning')
+        return redirect(url_for('reports.reports'))
+    return send_file(
+        job.artifact_path,
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=job.filename,
+    )
+
+@bp.route('/production_plans/<int:plan_id>/export_used_materials')
+@login_required
+def export_used_materials(plan_id):
+    """Экспорт отчёта по использованному сырью для завершённого плана"""
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    if plan.status != PlanStatus.COMPLETED:
+        flash('Отчёт доступен только для завершённых планов!', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+
+    # Сбор данных: (type_name, batch_number) -> total_quantity
+    usage = {}
+    for batch in plan.batches:
+        for bm in batch.materials:
+            # Пропускаем записи с удалённым сырьём
+            if not bm.material_batch or not bm.material_batch.material or not bm.material_batch.material.type:
+                continue
+            type_name = bm.material_batch.material.type.name
+            batch_number = bm.material_batch.material.batch_number or 'N/A'
+            key = (type_name, batch_number)
+            usage.setdefault(key, 0)
+            usage[key] += bm.quantity
+
+    # Формируем Excel
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Использованное сырьё"
+    ws.append(["Вид сырья", "Партия сырья", "Количество (кг)"])
+    for (type_name, batch_number), qty in usage.items():
+        ws.append([type_name, batch_number, round(qty, 3)])
+    # Форматирование ширины
+    for col in ws.columns:
+        max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
+        ws.column_dimensions[col[0].column_letter].width = max_length + 2
+    # Сохраняем в память
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    # Получаем имя продукта и номер партии плана
+    product_name = plan.product.name.replace(' ', '_')
+    batch_number = plan.batch_number
+    filename = f"{product_name}_{batch_number}.xlsx"
+    return send_file(
+        output,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=filename
+    )
+
+@bp.route('/production_plans/<int:plan_id>/export_word')
+@login_required
+def export_plan_to_word(plan_id):
+    """Экспорт плана производства в Word"""
+    plan = ProductionPlan.query.get_or_404(plan_id)
+    
+    # Проверяем статус плана
+    if plan.status not in [PlanStatus.IN_PROGRESS, PlanStatus.COMPLETED]:
+        flash('Экспорт в Word доступен только для планов в статусе "В производстве" или "Завершён"!', 'error')
+        return redirect(url_for('planning.production_plan_detail', plan_id=plan_id))
+    
+    # Создаём документ Word (python-docx загружается только для выгрузки)
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc = Document()
+    
+    # Заголовок
+    title = doc.add_heading('План производства', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # Информация о плане
+    doc.add_paragraph('Продукт: ' + plan.product.name)
+    doc.add_paragraph('Номер партии: ' + (plan.batch_number or 'Не указан'))
+    doc.add_paragraph('Количество: ' + f"{plan.get_report_quantity_kg():.2f} кг")
+    doc.add_paragraph('Статус: ' + plan.status_display_label)
+    doc.add_paragraph('Халяль/харам: ' + plan.get_halal_status())
+    doc.add_paragraph('Безаллергенность: ' + plan.get_bezallergennost_display())
+    doc.add_paragraph('Вид паллет: ' + plan.get_pallet_type_display())
+    doc.add_paragraph('Кг на одном паллете: ' + plan.get_kg_per_pallet_display())
+    doc.add_paragraph('')  # Пустая строка
+    
+    # Замесы
+    doc.add_heading('Замесы', level=1)
+    
+    for batch in plan.batches:
+        # Информация о замесе
+        doc.add_heading(f'Замес №{batch.batch_number}', level=2)
+        
+        if plan.production_date:
+            doc.add_paragraph('Дата производства: ' + plan.production_date.strftime('%d.%m.%Y'))
+        else:
+            doc.add_paragraph('Дата производства: не указана')
+        
+        if batch.employee:
+            doc.add_paragraph('Ответственный: ' + batch.employee.get_full_name())
+        else:
+            doc.add_paragraph('Ответственный: не указан')
+        
+        doc.add_paragraph('Вес: ' + f"{batch.weight:.2f} кг")
+        doc.add_paragraph('')  # Пустая строка
+        
+        # Таблица сырья
+        doc.add_heading('Используемое сырьё', level=3)
+        
+        # Собираем данные о сырье для этого замеса
+        materials_data = {}
+        for bm in batch.materials:
+            if bm.material_batch and bm.material_batch.material and bm.material_batch.material.type:
+                material_type = bm.material_batch.material.type
+                material_name = material_type.name
+                batch_number = bm.material_batch.batch_number or 'N/A'
+                quantity = bm.quantity
+                
+                # Собираем аллергены
+                allergens = [a.name for a in material_type.allergens] if material_type.allergens else []
+                allergens_str = ', '.join(allergens) if allergens else 'Нет'
+                
+                # Получаем статус контроля массы
+                mass_control_str = 'Не указано'
+                if material_type.mass_control:
+                    if material_type.mass_control.value == 'controlled':
+                        mass_control_str = 'Контролируется'
+                
+                # Получаем статус Харам/Халяль
+                halal_status_str = 'Не указано'
+                if material_type.halal_status:
+                    if material_type.halal_status.value == 'haram':
+                        halal_status_str = 'Харам'
+                    elif material_type.halal_status.value == 'halal':
+                        halal_status_str = 'Халяль'
+                
+                # Группируем по типу сырья, партии, аллергенам, контролю массы и статусу
+                key = (material_name, batch_number, allergens_str, mass_control_str, halal_status_str)
+                if key not in materials_data:
+                    materials_data[key] = 0
+                materials_data[key] += quantity
+        
+        # Создаём таблицу
+        if materials_data:
+            table = doc.add_table(rows=1, cols=7)
+            table.style = 'Light Grid Accent 1'
+            
+            # Заголовки
+            header_cells = table.rows[0].cells
+            header_cells[0].text = 'Название сырья'
+            header_cells[1].text = 'Количество (кг)'
+            header_cells[2].text = 'Партия сырья'
+            header_cells[3].text = 'Аллергены'
+            header_cells[4].text = 'Контроль массы добавки'
+            header_cells[5].text = 'Харам/Халяль'
+            header_cells[6].text = 'Масса норм. подпись'
+            
+            # Данные
+            for (material_name, batch_number, allergens_str, mass_control_str, halal_status_str), total_qty in materials_data.items():
+                row_cells = table.add_row().cells
+                row_cells[0].text = material_name
+                row_cells[1].text = f"{total_qty:.2f}"
+                row_cells[2].text = batch_number
+                row_cells[3].text = allergens_str
+                row_cells[4].text = mass_control_str
+                row_cells[5].text = halal_status_str
+                row_cells[6].text = ''  # Пустая ячейка для подписи
+        else:
+            doc.add_paragraph('Сырьё не добавлено')
+        
+        doc.add_paragraph('')  # Пустая строка между замесами
+    
+    # Сохраняем в память
+    output = BytesIO()
+    doc.save(output)
+    output.seek(0)
+    
+    # Формируем имя файла
+    product_name = plan.product.name.replace(' ', '_')
+    batch_number = plan.batch_number or f"plan_{plan.id}"
+    date_str = datetime.now().strftime('%Y%m%d')
+    filename = f"План_производства_{batch_number}_{date_str}.docx"
+    
+    return send_file(
+        output,
+        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        as_attachment=True,
+        download_name=filename
+    )
+
+@bp.route('/yearly_planning/<int:year>/export')
+@login_required
+def export_yearly_plan(year):
+    """Экспорт годового плана в Excel"""
+    from openpyxl.styles import Font, Alignment, PatternFill
+    
+    export = XlsxStream()
+    
+    # Стили для заголовков
+    header_style = dict(
+        fill=PatternFill(start_color="174FA3", end_color="174FA3", fill_type="solid"),
+        font=Font(bold=True, color="FFFFFF", size=12),
+        alignment=Alignment(horizontal='center', vertical='center'),
+    )
+    right = Alignment(horizontal='right')
+    
+    # Потребность за весь год одним запросом
+    needs = yearly_plan.material_needs(year)
+    
+    for month in range(1, 13):
+        # Данные, отсортированные по названию вида сырья
+        material_types = [(need.name, need.quantity_kg) for need in needs.get(month, [])]
+        if not material_types:
+            material_types = [('Нет данных', 0)]
+        
+        # Лист месяца; числа выравниваются по правому краю
+        export.add_sheet(
+            yearly_plan.MONTH_NAMES[month-1],
+            ['Вид сырья', 'Количество (кг)'],
+            ([material_name, export.cell(quantity, alignment=right)] for material_name, quantity in material_types),
+            header_style=header_style,
+            widths={1: 30, 2: 20},
+        )
+    
+    filename = f"yearly_plan_{year}.xlsx"
+    return export.send(filename)
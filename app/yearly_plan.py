@@ -0,0 +1,62 @@
+"""Сводки годового планирования (monthly_plans) сгруппированными запросами.
+
+Страница года считала планы отдельным COUNT на каждый месяц, а страница месяца
+и Excel-выгрузка года собирали потребность в сырье циклом по планам и видам
+сырья (выгрузка — для каждого из 12 месяцев, с запросом вида сырья на каждую
+строку). Теперь количество планов по месяцам — один GROUP BY, а матрица
+«месяц × вид сырья» — один запрос с соединением monthly_plans и recipe_items:
+потребность строки рецептуры = quantity_kg * percentage / 100, как в
+CompiledBom.quantities().
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import Float, cast, func, select
+
+from . import db
+from .models import MonthlyPlan, RawMaterialType, RecipeItem
+
+MONTH_NAMES = [
+    'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+    'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
+]
+
+# Потребность месяца в виде сырья; quantity_kg округлено до 0,01 кг
+MaterialNeed = namedtuple('MaterialNeed', 'type_id name quantity_kg')
+
+
+def month_counts(year):
+    """{месяц 1..12: число планов} одним запросом."""
+    counts = dict.fromkeys(range(1, 13), 0)
+    counts.update(db.session.execute(
+        select(MonthlyPlan.month, func.count(MonthlyPlan.id))
+        .where(MonthlyPlan.year == year)
+        .group_by(MonthlyPlan.month)
+    ).all())
+    return counts
+
+
+def material_needs(year, month=None):
+    """{месяц: [MaterialNeed, ...] по названию вида сырья} за год или один месяц.
+
+    Месяцы без планов в словарь не попадают.
+    """
+    quantity = func.sum(
+        cast(MonthlyPlan.quantity_kg, Float) * cast(RecipeItem.percentage, Float) / 100
+    )
+    query = (
+        select(MonthlyPlan.month, RawMaterialType.id, RawMaterialType.name, quantity)
+        .join(RecipeItem, RecipeItem.template_id == MonthlyPlan.template_id)
+        .join(RawMaterialType, RawMaterialType.id == RecipeItem.material_type_id)
+        .where(MonthlyPlan.year == year)
+        .group_by(MonthlyPlan.month, RawMaterialType.id, RawMaterialType.name)
+    )
+    if month is not None:
+        query = query.where(MonthlyPlan.month == month)
+
+    needs = {}
+    for plan_month, type_id, name, kg in db.session.execute(query):
+        needs.setdefault(plan_month, []).append(MaterialNeed(type_id, name, round(kg or 0, 2)))
+    for rows in needs.values():
+        rows.sort(key=lambda row: row.name)
+    return needs
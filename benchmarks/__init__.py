@@ -0,0 +1,21 @@
+"""Нагрузочные замеры планировщика на синтетических данных.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.seed_data --scale medium --reset
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.run --save-baseline
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.run --compare
+
+seed_data заполняет отдельную базу (SQLite или локальный PostgreSQL) сырьём,
+рецептурами, планами, замесами и ингредиентами в заданных объёмах; run
+прогоняет основные страницы и выгрузки через тестовый клиент Flask и
+сохраняет/сравнивает время ответа, число SQL-запросов и пик памяти.
+Рабочую базу instance/planner2.db оба скрипта не трогают.
+"""
+
+import os
+import sys
+
+
+def require_database_url():
+    """Останавливает скрипт, если база не указана явно: синтетические данные не должны попасть в рабочую базу."""
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('Укажите отдельную базу для замеров в DATABASE_URL (например, sqlite:////tmp/bench.db)')
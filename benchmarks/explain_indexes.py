@@ -0,0 +1,179 @@
+"""Планы и время горячих запросов без индексов и с индексами (миграция x_hot_path_indexes).
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.explain_indexes
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.explain_indexes --only warehouse fefo_lots
+
+Сначала индексы набора удаляются и каждый запрос замеряется без них, затем
+индексы создаются заново и замер повторяется. Для каждого запроса печатается
+план (EXPLAIN QUERY PLAN в SQLite, EXPLAIN ANALYZE в PostgreSQL) и медиана
+времени. Скрипт меняет схему, поэтому запускайте его только на базе для замеров.
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks import require_database_url
+
+require_database_url()
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+from sqlalchemy.sql.expression import ClauseElement, Executable  # noqa: E402
+
+from app import app, db  # noqa: E402
+from app.models import (  # noqa: E402
+    ProductionPlan, PlanStatus, ProductionBatch, BatchMaterial, MaterialBatch, RawMaterial,
+    RawMaterialType, MonthlyPlan,
+)
+from app.stock_ledger import reserved_by_material_query  # noqa: E402
+
+# Индексы из миграции x_hot_path_indexes (таблица → имена)
+INDEX_NAMES = {
+    'production_plans': (
+        'ix_production_plans_status_created_at',
+        'ix_production_plans_status_picked_up_at_updated_at',
+    ),
+    'raw_materials': ('ix_raw_materials_type_id_expiration_date', 'ix_raw_materials_active_fefo'),
+    'batch_materials': ('ix_batch_materials_batch_id', 'ix_batch_materials_material_batch_id'),
+    'material_batches': ('ix_material_batches_material_id',),
+    'production_batches': ('ix_production_batches_plan_id',),
+}
+# Частичные индексы, которые создаются только в PostgreSQL
+POSTGRESQL_ONLY = {'ix_raw_materials_active_fefo'}
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _explain_sqlite(element, compiler, **kw):
+    return 'EXPLAIN QUERY PLAN ' + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, 'postgresql')
+def _explain_postgresql(element, compiler, **kw):
+    return 'EXPLAIN ANALYZE ' + compiler.process(element.statement, **kw)
+
+
+def build_queries():
+    """Запросы, повторяющие фильтры и соединения маршрутов: имя → select."""
+    year = db.session.query(func.max(MonthlyPlan.year)).scalar()
+    plan_id = (
+        db.session.query(ProductionBatch.plan_id)
+        .group_by(ProductionBatch.plan_id)
+        .order_by(func.count(ProductionBatch.id).desc())
+        .limit(1)
+        .scalar()
+    )
+    type_ids = [type_id for (type_id,) in db.session.query(RawMaterialType.id).order_by(RawMaterialType.id).limit(10)]
+
+    return {
+        # Список планов с фильтром по статусу (production_plans, отчёты)
+        'plans_by_status': (
+            select(ProductionPlan.id)
+            .where(ProductionPlan.status == PlanStatus.IN_PROGRESS)
+            .order_by(ProductionPlan.created_at.desc(), ProductionPlan.id.desc())
+            .limit(50)
+        ),
+        # Склад производства: незабранные завершённые планы
+        'warehouse': (
+            select(ProductionPlan.id)
+            .where(ProductionPlan.status == PlanStatus.COMPLETED, ProductionPlan.picked_up_at.is_(None))
+            .order_by(ProductionPlan.updated_at.desc())
+            .limit(50)
+        ),
+        # StockSnapshot: партии с остатком в порядке FEFO
+        'fefo_lots': (
+            select(RawMaterial.id)
+            .where(RawMaterial.type_id.in_(type_ids), RawMaterial.quantity_kg > 0)
+            .order_by(RawMaterial.type_id, RawMaterial.expiration_date.asc().nullslast(), RawMaterial.id)
+        ),
+        # Резерв партий сырья видов type_ids (stock_ledger, allocation)
+        'reserved_by_material': reserved_by_material_query(
+            MaterialBatch.material_id.in_(select(RawMaterial.id).where(RawMaterial.type_id.in_(type_ids)))
+        ).statement,
+        # Матрица ингредиентов плана (production_plan_detail)
+        'plan_batch_materials': (
+            select(BatchMaterial.id, BatchMaterial.quantity, RawMaterial.type_id)
+            .join(MaterialBatch, MaterialBatch.id == BatchMaterial.material_batch_id)
+            .join(RawMaterial, RawMaterial.id == MaterialBatch.material_id)
+            .join(ProductionBatch, ProductionBatch.id == BatchMaterial.batch_id)
+            .where(ProductionBatch.plan_id == plan_id)
+        ),
+        # Годовое планирование: месячные планы
+        'monthly_plans': select(MonthlyPlan.id).where(MonthlyPlan.year == year, MonthlyPlan.month == 3),
+    }
+
+
+def pack_indexes():
+    """Объекты Index набора, существующие для текущего диалекта."""
+    postgresql = db.engine.dialect.name == 'postgresql'
+    return [
+        index
+        for table_name, names in INDEX_NAMES.items()
+        for index in db.Model.metadata.tables[table_name].indexes
+        if index.name in names and (postgresql or index.name not in POSTGRESQL_ONLY)
+    ]
+
+
+def measure(connection, statement, repeat):
+    """План запроса и медиана времени выполнения в мс."""
+    plan = [' '.join(str(value) for value in row) for row in connection.execute(Explain(statement))]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(statement).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    connection.rollback()
+    return plan, statistics.median(timings)
+
+
+def run_phase(connection, queries, repeat):
+    return {name: measure(connection, statement, repeat) for name, statement in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Планы и время горячих запросов без индексов и с индексами')
+    parser.add_argument('--repeat', type=int, default=20, help='прогонов на запрос')
+    parser.add_argument('--only', nargs='*', help='только указанные запросы')
+    args = parser.parse_args()
+
+    with app.app_context():
+        queries = build_queries()
+        if args.only:
+            queries = {name: statement for name, statement in queries.items() if name in args.only}
+        indexes = pack_indexes()
+
+        # DDL и замеры — на одном соединении, чтобы планы строились по актуальной схеме
+        with db.engine.connect() as connection:
+            for index in indexes:
+                index.drop(connection, checkfirst=True)
+            connection.commit()
+            try:
+                before = run_phase(connection, queries, args.repeat)
+            finally:
+                for index in indexes:
+                    index.create(connection, checkfirst=True)
+                connection.commit()
+            after = run_phase(connection, queries, args.repeat)
+
+    for name in queries:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        speedup = ms_before / ms_after if ms_after else float('inf')
+        print(f'== {name}: {ms_before:.2f} мс → {ms_after:.2f} мс (x{speedup:.1f})')
+        print('   без индексов:')
+        for line in plan_before:
+            print(f'     {line}')
+        print('   с индексами:')
+        for line in plan_after:
+            print(f'     {line}')
+
+
+if __name__ == '__main__':
+    main()
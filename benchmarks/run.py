@@ -0,0 +1,268 @@
+"""Прогон основных страниц и выгрузок через тестовый клиент Flask.
+
+Для каждого сценария: первый прогон — прогрев с замером пика памяти
+(tracemalloc), затем --repeat прогонов на время ответа. Число SQL-запросов
+берётся из заголовка X-DB-Query-Count (app/instrumentation.py).
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.run --save-baseline
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.run --compare
+
+--compare завершается с кодом 1, если сценарий стал медленнее базовой линии
+больше чем на --tolerance, делает больше SQL-запросов или заметно больше памяти.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks import require_database_url
+
+require_database_url()
+
+from sqlalchemy import func  # noqa: E402
+
+from app import app, db  # noqa: E402
+from app.models import (  # noqa: E402
+    ProductionPlan, PlanStatus, ProductionBatch, BatchMaterial, RawMaterial, Employee,
+)
+from benchmarks.seed_data import BENCH_USERNAME, BENCH_PASSWORD, FREE_PLAN_PREFIX  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Разница во времени меньше этой не считается регрессией (шум на быстрых страницах)
+MIN_LATENCY_DELTA_MS = 5.0
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def pick_fixtures():
+    """id объектов, на которых гоняются сценарии."""
+    largest_plan_id = (
+        db.session.query(ProductionBatch.plan_id)
+        .join(BatchMaterial, BatchMaterial.batch_id == ProductionBatch.id)
+        .group_by(ProductionBatch.plan_id)
+        .order_by(func.count(BatchMaterial.id).desc())
+        .limit(1)
+        .scalar()
+    )
+    completed_plan_id = (
+        db.session.query(ProductionPlan.id)
+        .join(ProductionBatch, ProductionBatch.plan_id == ProductionPlan.id)
+        .filter(ProductionPlan.status == PlanStatus.COMPLETED)
+        .order_by(ProductionPlan.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    free_plan_ids = [
+        plan_id for (plan_id,) in (
+            db.session.query(ProductionPlan.id)
+            .outerjoin(ProductionBatch, ProductionBatch.plan_id == ProductionPlan.id)
+            .filter(ProductionPlan.batch_number.like(f'{FREE_PLAN_PREFIX}%'), ProductionBatch.id.is_(None))
+            .order_by(ProductionPlan.id)
+            .all()
+        )
+    ]
+    if largest_plan_id is None or completed_plan_id is None:
+        sys.exit('В базе нет данных для замеров: сначала запустите python -m benchmarks.seed_data')
+    return {
+        'plan_id': largest_plan_id,
+        'completed_plan_id': completed_plan_id,
+        'free_plan_ids': free_plan_ids,
+        'employee_id': db.session.query(Employee.id).order_by(Employee.id).limit(1).scalar(),
+        'year': datetime.now().year,
+    }
+
+
+def build_scenarios(fixtures):
+    """Сценарии: имя → функция(client), выполняющая один запрос."""
+    plan_id = fixtures['plan_id']
+    completed_plan_id = fixtures['completed_plan_id']
+    free_plan_ids = list(fixtures['free_plan_ids'])
+
+    def get(url):
+        return lambda client: client.get(url)
+
+    def add_multiple_batches(client):
+        # Каждый прогон — на новом плане без замесов, чтобы условия не менялись
+        if not free_plan_ids:
+            return None
+        return client.post(
+            f'/production_plans/{free_plan_ids.pop(0)}/add_multiple_batches',
+            data={'num_batches': 10, 'weight_per_batch': 500, 'employee_id': fixtures['employee_id']},
+        )
+
+    return {
+        'production_plans': get('/production_plans'),
+        'production_plan_detail': get(f'/production_plans/{plan_id}'),
+        'add_multiple_batches': add_multiple_batches,
+        'warehouse_production': get('/warehouse/production'),
+        'raw_materials': get('/raw_materials'),
+        'managers_dashboard': get('/managers'),
+        'raw_material_forecast': get('/reports/raw_material_forecast'),
+        'production_plans_report': get('/reports/production_plans'),
+        'yearly_planning': get('/yearly_planning'),
+        'export_raw_material_usage': get('/reports/raw_material_usage/export'),
+        'export_production_statistics': get('/reports/production_statistics/export'),
+        'export_raw_material_forecast': get('/reports/raw_material_forecast/export'),
+        'export_production_plans': get('/reports/production_plans/export'),
+        'export_managers_dashboard': get('/managers/export'),
+        'export_yearly_plan': get(f"/yearly_planning/{fixtures['year']}/export"),
+        'export_used_materials': get(f'/production_plans/{completed_plan_id}/export_used_materials'),
+        'export_word': get(f'/production_plans/{completed_plan_id}/export_word'),
+    }
+
+
+def measure(client, request, repeat):
+    """Прогрев с замером памяти, затем repeat замеров времени."""
+    tracemalloc.start()
+    response = request(client)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if response is None:
+        return None
+    status = response.status_code
+    queries = int(response.headers.get('X-DB-Query-Count', 0))
+    response.close()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = request(client)
+        if response is None:
+            break
+        response.get_data()
+        timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, int(response.headers.get('X-DB-Query-Count', 0)))
+        response.close()
+    if not timings:
+        return None
+
+    return {
+        'status': status,
+        'median_ms': round(_percentile(timings, 50), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'min_ms': round(min(timings), 2),
+        'queries': queries,
+        'peak_memory_kb': round(peak / 1024, 1),
+        'runs': len(timings),
+    }
+
+
+def table_counts():
+    """Объёмы данных без замесов, созданных сценарием add_multiple_batches."""
+    seeded_plans = ~ProductionPlan.batch_number.like(f'{FREE_PLAN_PREFIX}%')
+    return {
+        'production_plans': ProductionPlan.query.count(),
+        'production_batches': ProductionBatch.query.join(ProductionPlan).filter(seeded_plans).count(),
+        'batch_materials': (
+            BatchMaterial.query.join(ProductionBatch).join(ProductionPlan).filter(seeded_plans).count()
+        ),
+        'raw_materials': RawMaterial.query.count(),
+    }
+
+
+def run(repeat, only=None):
+    app.config['WTF_CSRF_ENABLED'] = False
+    # JSON-строка на каждый запрос только мешает выводу
+    logging.getLogger('planner2.requests').setLevel(logging.WARNING)
+
+    with app.app_context():
+        fixtures = pick_fixtures()
+        counts = table_counts()
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        sys.exit(f'Не удалось войти как {BENCH_USERNAME}: база заполнена не benchmarks.seed_data?')
+
+    results = {}
+    for name, request in build_scenarios(fixtures).items():
+        if only and name not in only:
+            continue
+        result = measure(client, request, repeat)
+        if result is None:
+            print(f'{name:32} пропущен (нет свободных планов)')
+            continue
+        results[name] = result
+        print(
+            f"{name:32} {result['status']:>4} {result['median_ms']:>10.1f} мс"
+            f" p95 {result['p95_ms']:>10.1f} мс {result['queries']:>6} SQL {result['peak_memory_kb']:>10.0f} КБ"
+        )
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'database': dialect,
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'counts': counts,
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Список регрессий относительно базовой линии."""
+    regressions = []
+    if current['counts'] != baseline.get('counts'):
+        print(f"Внимание: объёмы данных отличаются от базовой линии: {baseline.get('counts')} → {current['counts']}")
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        if result['status'] != base['status']:
+            regressions.append(f"{name}: код ответа {base['status']} → {result['status']}")
+        if (result['median_ms'] > base['median_ms'] * (1 + tolerance)
+                and result['median_ms'] - base['median_ms'] > MIN_LATENCY_DELTA_MS):
+            regressions.append(f"{name}: время {base['median_ms']:.1f} → {result['median_ms']:.1f} мс")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: SQL-запросов {base['queries']} → {result['queries']}")
+        if result['peak_memory_kb'] > base['peak_memory_kb'] * (1 + tolerance) + 1024:
+            regressions.append(f"{name}: память {base['peak_memory_kb']:.0f} → {result['peak_memory_kb']:.0f} КБ")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры основных страниц и выгрузок')
+    parser.add_argument('--repeat', type=int, default=5, help='прогонов на сценарий после прогрева')
+    parser.add_argument('--only', nargs='*', help='запустить только указанные сценарии')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='файл базовой линии')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результат как базовую линию')
+    parser.add_argument('--compare', action='store_true', help='сравнить с базовой линией')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление (доля), по умолчанию 0.25')
+    parser.add_argument('--output', help='сохранить результат в JSON')
+    args = parser.parse_args()
+
+    current = run(args.repeat, args.only)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f'Базовая линия сохранена: {args.baseline}')
+    if args.compare:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print('Регрессии:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print('Регрессий нет')
+
+
+if __name__ == '__main__':
+    main()
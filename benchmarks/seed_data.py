@@ -0,0 +1,281 @@
+"""Генератор синтетических данных для замеров.
+
+Объёмы задаются пресетом --scale и уточняются отдельными параметрами, например:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.seed_data --scale large --plans 50000 --reset
+
+Строки пишутся пакетными INSERT ... RETURNING, как в app/allocation.py, поэтому
+генерация десятков тысяч планов занимает секунды. В конце пересобираются
+остатки сырья (stock_ledger.rebuild), итоги замесов планов (plan_totals.rebuild)
+и сводные таблицы отчётов (production_rollups.rebuild).
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import require_database_url
+
+require_database_url()
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import app, db, stock_ledger, plan_totals, production_rollups  # noqa: E402
+from app.models import (  # noqa: E402
+    User, UserRole, AllergenType, RawMaterialType, RawMaterial, Product, RecipeTemplate,
+    RecipeItem, Employee, ProductionPlan, PlanStatus, ProductionBatch, MaterialBatch,
+    BatchMaterial, MonthlyPlan, MassControlStatus, raw_material_type_allergens,
+)
+
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench'
+
+# Планы без замесов, на которых runner замеряет add_multiple_batches
+FREE_PLAN_PREFIX = 'BENCH-'
+
+SCALES = {
+    'small': dict(types=30, lots=500, products=40, recipes=80, plans=1000, free_plans=50, max_batches=4),
+    'medium': dict(types=80, lots=3000, products=150, recipes=300, plans=8000, free_plans=200, max_batches=5),
+    'large': dict(types=150, lots=10000, products=400, recipes=900, plans=30000, free_plans=500, max_batches=6),
+}
+
+# Доли статусов планов с замесами
+STATUS_WEIGHTS = (
+    (PlanStatus.COMPLETED, 70),
+    (PlanStatus.IN_PROGRESS, 10),
+    (PlanStatus.APPROVED, 10),
+    (PlanStatus.PENDING_APPROVAL, 5),
+    (PlanStatus.DRAFT, 5),
+)
+
+CHUNK_SIZE = 5000
+
+
+def insert_rows(model, rows):
+    """Пакетная вставка; возвращает id в порядке rows."""
+    ids = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        ids.extend(db.session.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[start:start + CHUNK_SIZE],
+        ).all())
+    return ids
+
+
+def split_percentages(count, rng):
+    """Случайные проценты рецептуры, в сумме 100 (три знака, как в RecipeItem.percentage)."""
+    weights = [rng.random() + 0.1 for _ in range(count)]
+    total = sum(weights)
+    parts = [round(w / total * 100, 3) for w in weights]
+    parts[-1] = round(100 - sum(parts[:-1]), 3)
+    return parts
+
+
+def generate(volumes, seed=1):
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    user = User(username=BENCH_USERNAME, email='bench@example.com', role=UserRole.ADMIN, is_active=True)
+    user.set_password(BENCH_PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+
+    allergen_ids = insert_rows(AllergenType, [{'name': f'Аллерген {i}'} for i in range(8)])
+    employee_ids = insert_rows(Employee, [
+        {'first_name': f'Сотрудник{i}', 'last_name': 'Тестовый'} for i in range(20)
+    ])
+
+    type_ids = insert_rows(RawMaterialType, [
+        {
+            'name': f'Сырьё {i}',
+            'mass_control': MassControlStatus.CONTROLLED if rng.random() < 0.2 else None,
+        }
+        for i in range(volumes['types'])
+    ])
+    db.session.execute(insert(raw_material_type_allergens), [
+        {'raw_material_type_id': type_id, 'allergen_type_id': rng.choice(allergen_ids)}
+        for type_id in type_ids if rng.random() < 0.15
+    ])
+
+    lot_rows = []
+    for i in range(volumes['lots']):
+        received = now - timedelta(days=rng.randint(0, 730))
+        lot_rows.append({
+            'name': f'LOT-{i}',
+            'type_id': type_ids[i % len(type_ids)],
+            'batch_number': f'LOT-{i}',
+            'quantity_kg': float(rng.randint(500, 5000)),
+            'date_received': received,
+            'expiration_date': received + timedelta(days=rng.randint(90, 900)),
+            'created_by': user.id,
+        })
+    lot_ids = insert_rows(RawMaterial, lot_rows)
+    lots_by_type = {}
+    for lot_id, row in zip(lot_ids, lot_rows):
+        lots_by_type.setdefault(row['type_id'], []).append((lot_id, row['batch_number']))
+
+    product_ids = insert_rows(Product, [
+        {'name': f'Продукт {i}', 'created_by': user.id} for i in range(volumes['products'])
+    ])
+    template_rows = [
+        {
+            'product_id': product_ids[i % len(product_ids)],
+            'name': f'Рецептура {i}',
+            'is_default': i < len(product_ids),
+            'status': 'saved',
+            'created_by': user.id,
+        }
+        for i in range(volumes['recipes'])
+    ]
+    template_ids = insert_rows(RecipeTemplate, template_rows)
+    recipe_items = {}
+    item_rows = []
+    for template_id in template_ids:
+        material_types = rng.sample(type_ids, min(len(type_ids), rng.randint(5, 12)))
+        recipe_items[template_id] = list(zip(material_types, split_percentages(len(material_types), rng)))
+        item_rows.extend(
+            {'template_id': template_id, 'material_type_id': type_id, 'percentage': percentage, 'created_by': user.id}
+            for type_id, percentage in recipe_items[template_id]
+        )
+    insert_rows(RecipeItem, item_rows)
+
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    status_weights = [weight for _, weight in STATUS_WEIGHTS]
+    plan_rows = []
+    for i in range(volumes['plans']):
+        template_index = rng.randrange(len(template_ids))
+        status = rng.choices(statuses, status_weights)[0]
+        created_at = now - timedelta(days=rng.randint(0, 730), minutes=rng.randint(0, 1440))
+        plan_rows.append({
+            'product_id': template_rows[template_index]['product_id'],
+            'template_id': template_ids[template_index],
+            'quantity': float(rng.randint(2, 12) * 500),
+            'batch_number': f'{created_at:%y%m}-{i}',
+            'status': status,
+            'production_date': created_at if status == PlanStatus.COMPLETED else None,
+            'picked_up_at': created_at + timedelta(days=1) if status == PlanStatus.COMPLETED and rng.random() < 0.8 else None,
+            'manager_planned_production_date': (created_at + timedelta(days=rng.randint(1, 14))).date(),
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(days=1) if status == PlanStatus.COMPLETED else None,
+            'created_by': user.id,
+        })
+    for i in range(volumes['free_plans']):
+        template_index = rng.randrange(len(template_ids))
+        plan_rows.append({
+            'product_id': template_rows[template_index]['product_id'],
+            'template_id': template_ids[template_index],
+            'quantity': 50000.0,
+            'batch_number': f'{FREE_PLAN_PREFIX}{i}',
+            'status': PlanStatus.APPROVED,
+            'created_at': now,
+            'created_by': user.id,
+        })
+    plan_ids = insert_rows(ProductionPlan, plan_rows)
+
+    # Замесы у планов, кроме черновиков, «на утверждении» и свободных планов для замеров
+    batch_rows = []
+    for plan_id, row in zip(plan_ids[:volumes['plans']], plan_rows):
+        if row['status'] in (PlanStatus.DRAFT, PlanStatus.PENDING_APPROVAL):
+            continue
+        count = rng.randint(1, volumes['max_batches'])
+        weight = min(1200.0, row['quantity'] / count)
+        for number in range(1, count + 1):
+            batch_rows.append({
+                'plan_id': plan_id,
+                'batch_number': str(number),
+                'weight': weight,
+                'production_date': row['created_at'],
+                'employee_id': rng.choice(employee_ids),
+                'created_at': row['created_at'],
+                'created_by': user.id,
+                '_template_id': row['template_id'],
+            })
+    templates_of_batches = [row.pop('_template_id') for row in batch_rows]
+    batch_ids = insert_rows(ProductionBatch, batch_rows)
+
+    material_batch_rows = []
+    owners = []
+    for batch_id, template_id, batch in zip(batch_ids, templates_of_batches, batch_rows):
+        for type_id, percentage in recipe_items[template_id]:
+            needed = round(batch['weight'] * percentage / 100, 3)
+            lots = lots_by_type[type_id]
+            # Иногда ингредиент набирается из двух партий
+            parts = [needed] if rng.random() < 0.8 or len(lots) < 2 else [round(needed / 2, 3), round(needed - needed / 2, 3)]
+            for quantity, (lot_id, lot_number) in zip(parts, rng.sample(lots, len(parts))):
+                material_batch_rows.append({
+                    'material_id': lot_id,
+                    'batch_number': lot_number,
+                    'quantity': quantity,
+                    'remaining_quantity': quantity,
+                })
+                owners.append((batch_id, quantity))
+    material_batch_ids = insert_rows(MaterialBatch, material_batch_rows)
+    for start in range(0, len(owners), CHUNK_SIZE):
+        db.session.execute(insert(BatchMaterial), [
+            {'batch_id': batch_id, 'material_batch_id': material_batch_id, 'quantity': quantity}
+            for (batch_id, quantity), material_batch_id in zip(
+                owners[start:start + CHUNK_SIZE], material_batch_ids[start:start + CHUNK_SIZE]
+            )
+        ])
+
+    monthly_rows = []
+    for year in (now.year - 1, now.year):
+        for month in range(1, 13):
+            # Не больше одного месячного плана на продукт (уникальность year, month, product_id)
+            for template_index in rng.sample(range(len(product_ids)), min(len(product_ids), 30)):
+                monthly_rows.append({
+                    'year': year,
+                    'month': month,
+                    'product_id': template_rows[template_index]['product_id'],
+                    'template_id': template_ids[template_index],
+                    'quantity_kg': float(rng.randint(1, 20) * 500),
+                })
+    db.session.execute(insert(MonthlyPlan), monthly_rows)
+
+    stock_ledger.rebuild()
+    plan_totals.rebuild()
+    # Сводные таблицы считаются по produced_kg планов — после plan_totals
+    production_rollups.rebuild()
+    db.session.commit()
+
+    return {
+        'raw_material_types': len(type_ids),
+        'raw_materials': len(lot_ids),
+        'recipe_templates': len(template_ids),
+        'recipe_items': len(item_rows),
+        'production_plans': len(plan_ids),
+        'production_batches': len(batch_ids),
+        'batch_materials': len(owners),
+        'monthly_plans': len(monthly_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заполнение базы синтетическими данными для замеров')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='medium')
+    for name in SCALES['medium']:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=int, help='переопределить объём пресета')
+    parser.add_argument('--seed', type=int, default=1, help='зерно генератора случайных чисел')
+    parser.add_argument('--reset', action='store_true', help='удалить и заново создать все таблицы')
+    args = parser.parse_args()
+
+    volumes = dict(SCALES[args.scale])
+    volumes.update({name: getattr(args, name) for name in volumes if getattr(args, name) is not None})
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if ProductionPlan.query.first() is not None:
+            raise SystemExit('В базе уже есть планы производства; запустите с --reset для пересоздания')
+
+        started = time.perf_counter()
+        counts = generate(volumes, seed=args.seed)
+        print(f"Готово за {time.perf_counter() - started:.1f} с; пользователь {BENCH_USERNAME}/{BENCH_PASSWORD}")
+        for table, count in counts.items():
+            print(f"  {table}: {count}")
+
+
+if __name__ == '__main__':
+    main()
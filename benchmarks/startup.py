@@ -0,0 +1,104 @@
+"""Холодный старт: время импорта приложения и первых запросов нового процесса.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.startup
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.startup --runs 10 --page /reports
+
+Каждый прогон — отдельный процесс Python (как новый воркер gunicorn после
+деплоя или перезапуска): замеряется импорт app, первый запрос (страница входа),
+вход и первая страница после входа, а также какие тяжёлые библиотеки оказались
+загружены к этому моменту. Печатаются медианы по --runs процессам.
+
+Первый процесс заполняет дисковый кэш байт-кода шаблонов (instance/jinja_cache),
+остальные им пользуются; --no-bytecode-cache отключает кэш для сравнения.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import require_database_url
+
+# Библиотеки, которые приложение загружает только по необходимости
+HEAVY_MODULES = ('openpyxl', 'docx', 'numpy', 'flask_migrate', 'alembic')
+
+STEPS = ('import_ms', 'first_request_ms', 'login_ms', 'first_page_ms', 'total_ms')
+
+
+def child(page):
+    """Один холодный старт; результат — строка JSON в stdout."""
+    started = time.perf_counter()
+    from app import app
+    imported = time.perf_counter()
+
+    import logging
+    from benchmarks.seed_data import BENCH_USERNAME, BENCH_PASSWORD
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    logging.getLogger('planner2.requests').setLevel(logging.WARNING)
+    client = app.test_client()
+
+    marks = [imported]
+    statuses = []
+    for method, url, data in (
+        ('GET', '/login', None),
+        ('POST', '/login', {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}),
+        ('GET', page, None),
+    ):
+        response = client.open(url, method=method, data=data)
+        statuses.append(response.status_code)
+        marks.append(time.perf_counter())
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'first_request_ms': (marks[1] - marks[0]) * 1000,
+        'login_ms': (marks[2] - marks[1]) * 1000,
+        'first_page_ms': (marks[3] - marks[2]) * 1000,
+        'total_ms': (marks[3] - started) * 1000,
+        'statuses': statuses,
+        'modules': len(sys.modules),
+        'heavy': [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def run(runs, page, bytecode_cache):
+    env = dict(os.environ)
+    if not bytecode_cache:
+        env['JINJA_BYTECODE_CACHE_DIR'] = ''
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup', '--child', '--page', page],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер холодного старта приложения')
+    parser.add_argument('--runs', type=int, default=5, help='число процессов, по умолчанию 5')
+    parser.add_argument('--page', default='/production_plans', help='первая страница после входа')
+    parser.add_argument('--no-bytecode-cache', action='store_true', help='без кэша байт-кода шаблонов')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    require_database_url()
+    if args.child:
+        child(args.page)
+        return
+
+    results = run(args.runs, args.page, not args.no_bytecode_cache)
+    for step in STEPS:
+        values = [result[step] for result in results]
+        print(f'{step:18} медиана {statistics.median(values):8.1f} мс  мин {min(values):8.1f}  макс {max(values):8.1f}')
+    last = results[-1]
+    print(f"коды ответов: {last['statuses']}, модулей загружено: {last['modules']}")
+    print(f"тяжёлые библиотеки после первых запросов: {', '.join(last['heavy']) or 'нет'}")
+
+
+if __name__ == '__main__':
+    main()
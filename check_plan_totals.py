@@ -0,0 +1,26 @@
+import sys
+
+from app import app, db
+from app import plan_totals
+
+def check_plan_totals(fix=False):
+    """Сверяет produced_kg / batch_count планов с замесами; с --fix пересчитывает все планы"""
+    with app.app_context():
+        mismatches = plan_totals.find_mismatches()
+        for plan_id, batch_number, produced_kg, actual_kg, batch_count, actual_count in mismatches:
+            print(
+                f"План {plan_id} ({batch_number}): произведено {produced_kg} кг, по замесам {actual_kg} кг; "
+                f"замесов {batch_count}, по замесам {actual_count}"
+            )
+        print(f"Расхождений: {len(mismatches)}")
+
+        if fix and mismatches:
+            plan_totals.rebuild()
+            db.session.commit()
+            print(f"Пересчитано. Осталось расхождений: {len(plan_totals.find_mismatches())}")
+        return len(mismatches)
+
+if __name__ == "__main__":
+    fix = '--fix' in sys.argv[1:]
+    mismatches = check_plan_totals(fix=fix)
+    sys.exit(1 if mismatches and not fix else 0)
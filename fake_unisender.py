@@ -0,0 +1,100 @@
+"""Локальная заглушка Unisender Go для проверки очереди писем (email_outbox).
+
+Принимает POST на /email/send.json, отвечает {"status":"success"} и дописывает
+каждый запрос (тема, получатели, текст письма) строкой JSON в журнал. Первые
+--fail-first запросов получают ответ 500 — так проверяются повторные попытки.
+
+    python fake_unisender.py --port 8025 --fail-first 2
+    UNISENDER_GO_API_URL=http://127.0.0.1:8025 UNISENDER_GO_API_KEY=test \\
+        MAIL_DEFAULT_SENDER=planner@example.com NOTIFICATION_EMAILS=test@example.com python run.py
+"""
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEND_PATH = '/email/send.json'
+
+
+class FakeUnisender(ThreadingHTTPServer):
+    def __init__(self, address, log_path, fail_first=0, delay=0.0):
+        super().__init__(address, _Handler)
+        self.log_path = log_path
+        self.fail_first = fail_first
+        self.delay = delay
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.split('?')[0] != SEND_PATH:
+            self._reply(404, {'status': 'error', 'message': f'Неизвестный адрес {self.path}'})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        except ValueError:
+            self._reply(400, {'status': 'error', 'message': 'Тело запроса — не JSON'})
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            number = server.requests
+        if server.delay:
+            time.sleep(server.delay)
+        failed = number <= server.fail_first
+
+        message = payload.get('message', {})
+        record = {
+            'n': number,
+            'received_at': datetime.now().isoformat(timespec='seconds'),
+            'api_key': self.headers.get('X-API-KEY'),
+            'subject': message.get('subject'),
+            'recipients': [r.get('email') for r in message.get('recipients', [])],
+            'failed': failed,
+            'payload': payload,
+        }
+        with server.lock, open(server.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"#{number} {'500' if failed else '200'} {record['subject']} → {', '.join(record['recipients'])}")
+
+        if failed:
+            self._reply(500, {'status': 'error', 'message': 'Тестовый отказ (--fail-first)'})
+        else:
+            self._reply(200, {'status': 'success', 'job_id': f'fake-{number}', 'emails': record['recipients']})
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка Unisender Go для проверки отправки писем')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--log', default='fake_unisender.jsonl', help='журнал принятых писем (JSON Lines)')
+    parser.add_argument('--fail-first', type=int, default=0, help='ответить 500 на первые N запросов')
+    parser.add_argument('--delay', type=float, default=0.0, help='задержка ответа, секунд')
+    args = parser.parse_args()
+
+    server = FakeUnisender((args.host, args.port), args.log, args.fail_first, args.delay)
+    print(f'Заглушка Unisender Go: http://{args.host}:{args.port}{SEND_PATH}, журнал {args.log}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
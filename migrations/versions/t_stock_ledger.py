@@ -0,0 +1,77 @@
+"""stock ledger: stock_lot_balances and stock_type_balances
+
+Revision ID: t_stock_ledger
+Revises: s_pallet_fields
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 't_stock_ledger'
+down_revision = 's_pallet_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stock_lot_balances',
+        sa.Column('material_id', sa.Integer(), nullable=False),
+        sa.Column('type_id', sa.Integer(), nullable=True),
+        sa.Column('on_hand_kg', sa.Float(), nullable=False),
+        sa.Column('reserved_kg', sa.Float(), nullable=False),
+        sa.Column('free_kg', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('material_id'),
+    )
+    op.create_index(op.f('ix_stock_lot_balances_type_id'), 'stock_lot_balances', ['type_id'], unique=False)
+    op.create_table(
+        'stock_type_balances',
+        sa.Column('type_id', sa.Integer(), nullable=False),
+        sa.Column('on_hand_kg', sa.Float(), nullable=False),
+        sa.Column('reserved_kg', sa.Float(), nullable=False),
+        sa.Column('free_kg', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('type_id'),
+    )
+
+    # Первичное заполнение из текущих партий и замесов незавершённых планов
+    op.execute(
+        """
+        INSERT INTO stock_lot_balances (material_id, type_id, on_hand_kg, reserved_kg, free_kg)
+        SELECT rm.id,
+               rm.type_id,
+               COALESCE(rm.quantity_kg, 0),
+               COALESCE(r.reserved_kg, 0),
+               CASE WHEN COALESCE(rm.quantity_kg, 0) > COALESCE(r.reserved_kg, 0)
+                    THEN COALESCE(rm.quantity_kg, 0) - COALESCE(r.reserved_kg, 0)
+                    ELSE 0 END
+        FROM raw_materials rm
+        LEFT JOIN (
+            SELECT mb.material_id AS material_id, SUM(bm.quantity) AS reserved_kg
+            FROM batch_materials bm
+            JOIN material_batches mb ON bm.material_batch_id = mb.id
+            JOIN production_batches pb ON bm.batch_id = pb.id
+            JOIN production_plans pp ON pb.plan_id = pp.id
+            WHERE pp.status <> 'COMPLETED'
+            GROUP BY mb.material_id
+        ) r ON r.material_id = rm.id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO stock_type_balances (type_id, on_hand_kg, reserved_kg, free_kg)
+        SELECT type_id, SUM(on_hand_kg), SUM(reserved_kg), SUM(free_kg)
+        FROM stock_lot_balances
+        WHERE type_id IS NOT NULL
+        GROUP BY type_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('stock_type_balances')
+    op.drop_index(op.f('ix_stock_lot_balances_type_id'), table_name='stock_lot_balances')
+    op.drop_table('stock_lot_balances')
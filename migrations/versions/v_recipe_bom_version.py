@@ -0,0 +1,27 @@
+"""add bom_version to recipe_templates
+
+Revision ID: v_recipe_bom_version
+Revises: u_export_jobs
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'v_recipe_bom_version'
+down_revision = 'u_export_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'recipe_templates',
+        sa.Column('bom_version', sa.Integer(), nullable=False, server_default='1'),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('recipe_templates') as batch_op:
+        batch_op.drop_column('bom_version')
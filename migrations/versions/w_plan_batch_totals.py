@@ -0,0 +1,46 @@
+"""add produced_kg and batch_count to production_plans
+
+Revision ID: w_plan_batch_totals
+Revises: v_recipe_bom_version
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'w_plan_batch_totals'
+down_revision = 'v_recipe_bom_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'production_plans',
+        sa.Column('produced_kg', sa.Float(), nullable=False, server_default='0'),
+    )
+    op.add_column(
+        'production_plans',
+        sa.Column('batch_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    # Заполняем из существующих замесов
+    op.execute(
+        """
+        UPDATE production_plans SET
+            produced_kg = (
+                SELECT COALESCE(SUM(weight), 0) FROM production_batches
+                WHERE production_batches.plan_id = production_plans.id
+            ),
+            batch_count = (
+                SELECT COUNT(id) FROM production_batches
+                WHERE production_batches.plan_id = production_plans.id
+            )
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('production_plans') as batch_op:
+        batch_op.drop_column('batch_count')
+        batch_op.drop_column('produced_kg')
@@ -0,0 +1,47 @@
+"""indexes for hot filter and join paths
+
+Revision ID: x_hot_path_indexes
+Revises: w_plan_batch_totals
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'x_hot_path_indexes'
+down_revision = 'w_plan_batch_totals'
+branch_labels = None
+depends_on = None
+
+# monthly_plans(year, month) отдельно не индексируется: это префикс
+# уникального ограничения unique_monthly_plan (year, month, product_id)
+INDEXES = (
+    ('ix_production_plans_status_created_at', 'production_plans', ['status', 'created_at']),
+    ('ix_production_plans_status_picked_up_at_updated_at', 'production_plans', ['status', 'picked_up_at', 'updated_at']),
+    ('ix_raw_materials_type_id_expiration_date', 'raw_materials', ['type_id', 'expiration_date']),
+    ('ix_batch_materials_batch_id', 'batch_materials', ['batch_id']),
+    ('ix_batch_materials_material_batch_id', 'batch_materials', ['material_batch_id']),
+    ('ix_material_batches_material_id', 'material_batches', ['material_id']),
+    ('ix_production_batches_plan_id', 'production_batches', ['plan_id']),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Частичный индекс под порядок FEFO: только партии с остатком
+        op.create_index(
+            'ix_raw_materials_active_fefo', 'raw_materials', ['type_id', 'expiration_date', 'id'],
+            unique=False, postgresql_where=sa.text('quantity_kg > 0'),
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_raw_materials_active_fefo', table_name='raw_materials')
+
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,257 @@
+"""plan_events: append-only plan event log instead of the notes history
+
+Revision ID: y_plan_events
+Revises: x_hot_path_indexes
+Create Date: 2026-10-18
+
+"""
+import json
+import re
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'y_plan_events'
+down_revision = 'x_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+NOTE_TIMESTAMP_FORMAT = '%d.%m.%Y %H:%M'
+ENTRY_RE = re.compile(r'^\[(\d{2}\.\d{2}\.\d{4} \d{2}:\d{2})\] (.*)$')
+# Строки, которые add_batch дописывал под заголовком записи о замесе
+BATCH_CONTINUATIONS = ('Автоматически добавлены ингредиенты', 'Недостаточно сырья: ')
+DATE_RE = r'(\d{2}\.\d{2}\.\d{4})'
+
+plans = sa.table(
+    'production_plans',
+    sa.column('id', sa.Integer),
+    sa.column('notes', sa.String),
+)
+plan_events = sa.table(
+    'plan_events',
+    sa.column('id', sa.Integer),
+    sa.column('plan_id', sa.Integer),
+    sa.column('created_at', sa.DateTime(timezone=True)),
+    sa.column('kind', sa.String),
+    sa.column('payload', sa.Text),
+    sa.column('user_id', sa.Integer),
+)
+
+
+def _iso(value):
+    return datetime.strptime(value, '%d.%m.%Y').date().isoformat()
+
+
+def _weight(value):
+    # Вес выводился как float (1000.0); если строка другая, запись остаётся текстом
+    return float(value) if str(float(value)) == value else None
+
+
+def _classify(first_line, extra_lines):
+    """(kind, payload) для одной записи примечаний или None, если формат не распознан."""
+    match = re.match(r'^Добавлен замес №(.+) \((\S+) кг\)$', first_line)
+    if match and _weight(match.group(2)) is not None:
+        payload = {
+            'batch_number': match.group(1),
+            'weight': _weight(match.group(2)),
+            'ingredients_added': False,
+            'missing': [],
+        }
+        for line in extra_lines:
+            if line == BATCH_CONTINUATIONS[0]:
+                payload['ingredients_added'] = True
+            elif line.startswith(BATCH_CONTINUATIONS[1]) and not payload['missing']:
+                # Позиции сами содержат запятые, поэтому список не делится — одна строка целиком
+                payload['missing'] = [line[len(BATCH_CONTINUATIONS[1]):]]
+            else:
+                return None
+        return 'batch_added', payload
+    if extra_lines:
+        return None
+
+    match = re.match(r'^Статус изменен: (.+?) → (.+)$', first_line)
+    if match:
+        return 'status_changed', {'old': match.group(1), 'new': match.group(2)}
+    match = re.match(rf'^Дата производства установлена: {DATE_RE}$', first_line)
+    if match:
+        return 'production_date_set', {'date': _iso(match.group(1))}
+    match = re.match(rf'^Дата производства изменена: {DATE_RE} → {DATE_RE}$', first_line)
+    if match:
+        return 'production_date_changed', {'old': _iso(match.group(1)), 'new': _iso(match.group(2))}
+    match = re.match(r'^Завершён с недовыполнением: план (\d+\.\d{2}) кг, факт (\d+\.\d{2}) кг\. Причина: (.*)$', first_line)
+    if match:
+        return 'shortfall', {
+            'planned_kg': float(match.group(1)), 'produced_kg': float(match.group(2)), 'reason': match.group(3),
+        }
+    match = re.match(r'^Добавлено (\d+) замесов по (\S+) кг каждый$', first_line)
+    if match and _weight(match.group(2)) is not None:
+        return 'batches_added', {'count': int(match.group(1)), 'weight': _weight(match.group(2))}
+    match = re.match(r'^Удалено (\d+) замесов$', first_line)
+    if match:
+        return 'batches_deleted', {'count': int(match.group(1))}
+    match = re.match(r'^Изменено количество с (\d+\.\d{2}) кг на (\d+\.\d{2}) кг$', first_line)
+    if match:
+        return 'quantity_changed', {'old': float(match.group(1)), 'new': float(match.group(2))}
+    match = re.match(r"^Изменен номер партии с '(.*)' на '(.*)'$", first_line)
+    if match:
+        return 'batch_number_changed', {'old': match.group(1), 'new': match.group(2)}
+    match = re.match(r'^Отменено завершение плана\. Восстановлено сырья: (.*)$', first_line)
+    if match:
+        return 'completion_undone', {'restored': match.group(1)}
+    return None
+
+
+def parse_notes(notes):
+    """Разбирает примечания плана на записи журнала.
+
+    Записи шли новыми сверху: «[дд.мм.гггг чч:мм] текст», обычно через пустую
+    строку. Под записью о замесе — строки с ингредиентами; над записью о смене
+    статуса (без пустой строки) — комментарий из формы статуса. Текст в самом
+    конце, не относящийся к записи, — примечание, введённое при создании плана,
+    оно остаётся в notes.
+
+    Returns:
+        tuple: ([(created_at, kind, payload), ...] от старых к новым, остаток примечаний или None)
+    """
+    entries = []  # [timestamp, [строки записи], [строки комментария]]
+    rest = []
+    blocks = [block.splitlines() for block in re.split(r'\n\s*\n', notes.strip())]
+    for block_index, block in enumerate(blocks):
+        last_block = block_index == len(blocks) - 1
+        block_entries = []
+        pending = []
+        for line in block:
+            match = ENTRY_RE.match(line)
+            if not match:
+                pending.append(line)
+                continue
+            entry = [match.group(1), [match.group(2)], []]
+            if pending:
+                if match.group(2).startswith('Статус изменен') or not block_entries:
+                    entry[2] = pending
+                else:
+                    block_entries[-1][1].extend(pending)
+                pending = []
+            block_entries.append(entry)
+        if pending:
+            status_only = block_entries and block_entries[-1][1][0].startswith('Статус изменен')
+            if block_entries and not (last_block and status_only):
+                block_entries[-1][1].extend(pending)
+            elif last_block:
+                rest = pending
+            elif blocks[block_index + 1] and ENTRY_RE.match(blocks[block_index + 1][0]):
+                # Текст без отметки времени посреди истории — отдельной записью со временем следующей
+                block_entries.append([ENTRY_RE.match(blocks[block_index + 1][0]).group(1), pending, []])
+            else:
+                rest.extend(pending)
+        entries.extend(block_entries)
+
+    events = []
+    for timestamp, lines, comment in reversed(entries):
+        classified = _classify(lines[0], lines[1:])
+        if classified is None:
+            kind, payload = 'legacy', {'text': '\n'.join(lines)}
+        else:
+            kind, payload = classified
+        if comment:
+            payload['comment'] = '\n'.join(comment)
+        events.append((datetime.strptime(timestamp, NOTE_TIMESTAMP_FORMAT), kind, payload))
+    return events, '\n'.join(rest) or None
+
+
+def upgrade():
+    op.create_table(
+        'plan_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('plan_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['plan_id'], ['production_plans.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_plan_events_plan_id_created_at', 'plan_events', ['plan_id', 'created_at'], unique=False)
+
+    # Переносим историю из примечаний в журнал
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(plans.c.id, plans.c.notes).where(plans.c.notes.isnot(None))).all()
+    for plan_id, notes in rows:
+        events, rest = parse_notes(notes)
+        if not events:
+            continue
+        op.bulk_insert(plan_events, [
+            {
+                'plan_id': plan_id,
+                'created_at': created_at,
+                'kind': kind,
+                'payload': json.dumps(payload, ensure_ascii=False),
+                'user_id': None,
+            }
+            for created_at, kind, payload in events
+        ])
+        bind.execute(plans.update().where(plans.c.id == plan_id).values(notes=rest))
+
+
+def _render(kind, payload):
+    """Текст записи в формате прежних примечаний (копия app/plan_events.describe на момент миграции)."""
+    def day(value):
+        return date.fromisoformat(value[:10]).strftime('%d.%m.%Y')
+
+    if kind == 'status_changed':
+        return f"Статус изменен: {payload['old']} → {payload['new']}"
+    if kind == 'production_date_set':
+        return f"Дата производства установлена: {day(payload['date'])}"
+    if kind == 'production_date_changed':
+        return f"Дата производства изменена: {day(payload['old'])} → {day(payload['new'])}"
+    if kind == 'shortfall':
+        return (
+            f"Завершён с недовыполнением: план {payload['planned_kg']:.2f} кг, "
+            f"факт {payload['produced_kg']:.2f} кг. Причина: {payload['reason']}"
+        )
+    if kind == 'batch_added':
+        text = f"Добавлен замес №{payload['batch_number']} ({payload['weight']} кг)"
+        if payload.get('ingredients_added'):
+            text += "\nАвтоматически добавлены ингредиенты"
+        if payload.get('missing'):
+            text += f"\nНедостаточно сырья: {', '.join(payload['missing'])}"
+        return text
+    if kind == 'batches_added':
+        return f"Добавлено {payload['count']} замесов по {payload['weight']} кг каждый"
+    if kind == 'batches_deleted':
+        return f"Удалено {payload['count']} замесов"
+    if kind == 'quantity_changed':
+        return f"Изменено количество с {payload['old']:.2f} кг на {payload['new']:.2f} кг"
+    if kind == 'batch_number_changed':
+        return f"Изменен номер партии с '{payload['old']}' на '{payload['new']}'"
+    if kind == 'completion_undone':
+        return f"Отменено завершение плана. Восстановлено сырья: {payload['restored']}"
+    return payload.get('text', kind)
+
+
+def downgrade():
+    # Собираем журнал обратно в примечания: новые записи сверху, примечание плана снизу
+    bind = op.get_bind()
+    history = {}
+    for plan_id, created_at, kind, payload in bind.execute(
+        sa.select(plan_events.c.plan_id, plan_events.c.created_at, plan_events.c.kind, plan_events.c.payload)
+        .order_by(plan_events.c.plan_id, plan_events.c.created_at, plan_events.c.id)
+    ):
+        payload = json.loads(payload)
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        entry = f"[{created_at.strftime(NOTE_TIMESTAMP_FORMAT)}] {_render(kind, payload)}"
+        if payload.get('comment'):
+            entry = f"{payload['comment']}\n{entry}"
+        history.setdefault(plan_id, []).append(entry)
+
+    for plan_id, entries in history.items():
+        notes = bind.execute(sa.select(plans.c.notes).where(plans.c.id == plan_id)).scalar()
+        parts = list(reversed(entries)) + ([notes] if notes else [])
+        bind.execute(plans.update().where(plans.c.id == plan_id).values(notes='\n\n'.join(parts)))
+
+    op.drop_index('ix_plan_events_plan_id_created_at', table_name='plan_events')
+    op.drop_table('plan_events')
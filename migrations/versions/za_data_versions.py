@@ -0,0 +1,31 @@
+"""data_versions: version stamps for in-process reference data caches
+
+Revision ID: za_data_versions
+Revises: z_email_outbox
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'za_data_versions'
+down_revision = 'z_email_outbox'
+branch_labels = None
+depends_on = None
+
+REFERENCE_DATA = ('products', 'raw_material_types', 'allergen_types', 'employees')
+
+
+def upgrade():
+    data_versions = op.create_table(
+        'data_versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.bulk_insert(data_versions, [{'name': name, 'version': 1} for name in REFERENCE_DATA])
+
+
+def downgrade():
+    op.drop_table('data_versions')
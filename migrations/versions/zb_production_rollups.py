@@ -0,0 +1,115 @@
+"""production rollups: daily production and material usage of completed plans
+
+Revision ID: zb_production_rollups
+Revises: za_data_versions
+Create Date: 2026-10-18
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'zb_production_rollups'
+down_revision = 'za_data_versions'
+branch_labels = None
+depends_on = None
+
+plans = sa.table(
+    'production_plans',
+    sa.column('id', sa.Integer),
+    sa.column('status', sa.String),
+    sa.column('product_id', sa.Integer),
+    sa.column('template_id', sa.Integer),
+    sa.column('produced_kg', sa.Float),
+    sa.column('created_at', sa.DateTime(timezone=True)),
+)
+production_batches = sa.table('production_batches', sa.column('id', sa.Integer), sa.column('plan_id', sa.Integer))
+batch_materials = sa.table(
+    'batch_materials',
+    sa.column('batch_id', sa.Integer),
+    sa.column('material_batch_id', sa.Integer),
+    sa.column('quantity', sa.Float),
+)
+material_batches = sa.table('material_batches', sa.column('id', sa.Integer), sa.column('material_id', sa.Integer))
+raw_materials = sa.table('raw_materials', sa.column('id', sa.Integer), sa.column('type_id', sa.Integer))
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def upgrade():
+    production_daily_rollups = op.create_table(
+        'production_daily_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('template_id', sa.Integer(), nullable=False),
+        sa.Column('plans_count', sa.Integer(), nullable=False),
+        sa.Column('produced_kg', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'product_id', 'template_id'),
+    )
+    material_usage_daily_rollups = op.create_table(
+        'material_usage_daily_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('material_batch_id', sa.Integer(), nullable=False),
+        sa.Column('material_id', sa.Integer(), nullable=False),
+        sa.Column('type_id', sa.Integer(), nullable=False),
+        sa.Column('used_kg', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'material_batch_id'),
+    )
+    op.create_index(
+        op.f('ix_material_usage_daily_rollups_type_id'), 'material_usage_daily_rollups', ['type_id'], unique=False,
+    )
+
+    # Первичное заполнение из завершённых планов; день — дата создания плана
+    bind = op.get_bind()
+    completed = plans.c.status == 'COMPLETED'
+    production = {}
+    for created_at, product_id, template_id, produced_kg in bind.execute(
+        sa.select(plans.c.created_at, plans.c.product_id, plans.c.template_id, plans.c.produced_kg)
+        .where(completed, plans.c.product_id.isnot(None), plans.c.template_id.isnot(None))
+    ):
+        key = (_day(created_at), product_id, template_id)
+        plans_count, total_kg = production.get(key, (0, 0.0))
+        production[key] = (plans_count + 1, total_kg + (produced_kg or 0.0))
+    if production:
+        op.bulk_insert(production_daily_rollups, [
+            {'day': day, 'product_id': product_id, 'template_id': template_id,
+             'plans_count': plans_count, 'produced_kg': produced_kg}
+            for (day, product_id, template_id), (plans_count, produced_kg) in production.items()
+        ])
+
+    usage = {}
+    for created_at, material_batch_id, material_id, type_id, quantity in bind.execute(
+        sa.select(
+            plans.c.created_at, batch_materials.c.material_batch_id,
+            raw_materials.c.id, raw_materials.c.type_id, sa.func.sum(batch_materials.c.quantity),
+        )
+        .select_from(
+            plans.join(production_batches, production_batches.c.plan_id == plans.c.id)
+            .join(batch_materials, batch_materials.c.batch_id == production_batches.c.id)
+            .join(material_batches, material_batches.c.id == batch_materials.c.material_batch_id)
+            .join(raw_materials, raw_materials.c.id == material_batches.c.material_id)
+        )
+        .where(completed, batch_materials.c.quantity > 0, raw_materials.c.type_id.isnot(None))
+        .group_by(
+            plans.c.id, plans.c.created_at, batch_materials.c.material_batch_id,
+            raw_materials.c.id, raw_materials.c.type_id,
+        )
+    ):
+        row = usage.setdefault(
+            (_day(created_at), material_batch_id),
+            {'day': _day(created_at), 'material_batch_id': material_batch_id, 'material_id': material_id,
+             'type_id': type_id, 'used_kg': 0.0},
+        )
+        row['used_kg'] += quantity or 0.0
+    if usage:
+        op.bulk_insert(material_usage_daily_rollups, list(usage.values()))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_material_usage_daily_rollups_type_id'), table_name='material_usage_daily_rollups')
+    op.drop_table('material_usage_daily_rollups')
+    op.drop_table('production_daily_rollups')
@@ -0,0 +1,29 @@
+"""data_versions: data version counter for the report result cache
+
+Revision ID: zc_report_data_version
+Revises: zb_production_rollups
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'zc_report_data_version'
+down_revision = 'zb_production_rollups'
+branch_labels = None
+depends_on = None
+
+data_versions = sa.table(
+    'data_versions',
+    sa.column('name', sa.String),
+    sa.column('version', sa.Integer),
+)
+
+
+def upgrade():
+    op.bulk_insert(data_versions, [{'name': 'reports', 'version': 1}])
+
+
+def downgrade():
+    op.execute(data_versions.delete().where(data_versions.c.name == 'reports'))
@@ -0,0 +1,61 @@
+"""material_usage_daily_rollups: drop copied material_id/type_id, reports join raw_materials
+
+Revision ID: zd_usage_rollup_type_at_read
+Revises: zc_report_data_version
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'zd_usage_rollup_type_at_read'
+down_revision = 'zc_report_data_version'
+branch_labels = None
+depends_on = None
+
+material_usage_daily_rollups = sa.table(
+    'material_usage_daily_rollups',
+    sa.column('material_batch_id', sa.Integer),
+    sa.column('material_id', sa.Integer),
+    sa.column('type_id', sa.Integer),
+)
+material_batches = sa.table('material_batches', sa.column('id', sa.Integer), sa.column('material_id', sa.Integer))
+raw_materials = sa.table('raw_materials', sa.column('id', sa.Integer), sa.column('type_id', sa.Integer))
+
+
+def upgrade():
+    with op.batch_alter_table('material_usage_daily_rollups', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_material_usage_daily_rollups_type_id'))
+        batch_op.drop_column('type_id')
+        batch_op.drop_column('material_id')
+
+
+def downgrade():
+    with op.batch_alter_table('material_usage_daily_rollups', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('material_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('type_id', sa.Integer(), nullable=True))
+
+    # Копии заполняются текущими значениями партий
+    material_id = (
+        sa.select(material_batches.c.material_id)
+        .where(material_batches.c.id == material_usage_daily_rollups.c.material_batch_id)
+        .scalar_subquery()
+    )
+    op.execute(material_usage_daily_rollups.update().values(material_id=material_id))
+    type_id = (
+        sa.select(raw_materials.c.type_id)
+        .where(raw_materials.c.id == material_usage_daily_rollups.c.material_id)
+        .scalar_subquery()
+    )
+    op.execute(material_usage_daily_rollups.update().values(type_id=type_id))
+    op.execute(
+        material_usage_daily_rollups.delete().where(
+            sa.or_(material_usage_daily_rollups.c.material_id.is_(None), material_usage_daily_rollups.c.type_id.is_(None))
+        )
+    )
+
+    with op.batch_alter_table('material_usage_daily_rollups', schema=None) as batch_op:
+        batch_op.alter_column('material_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('type_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_material_usage_daily_rollups_type_id'), ['type_id'], unique=False)
@@ -0,0 +1,16 @@
+from app import app, db
+from app import production_rollups
+from app.models import ProductionDailyRollup, MaterialUsageDailyRollup
+
+def rebuild_production_rollups():
+    """Пересобирает сводные таблицы отчётов (production_daily_rollups / material_usage_daily_rollups)"""
+    with app.app_context():
+        production_rollups.rebuild()
+        db.session.commit()
+        print(
+            f"Строк производства: {ProductionDailyRollup.query.count()}, "
+            f"строк расхода сырья: {MaterialUsageDailyRollup.query.count()}"
+        )
+
+if __name__ == "__main__":
+    rebuild_production_rollups()
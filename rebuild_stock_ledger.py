@@ -0,0 +1,13 @@
+from app import app, db
+from app import stock_ledger
+from app.models import StockLotBalance, StockTypeBalance
+
+def rebuild_stock_ledger():
+    """Пересобирает остатки сырья (stock_lot_balances / stock_type_balances) из партий и замесов"""
+    with app.app_context():
+        stock_ledger.rebuild()
+        db.session.commit()
+        print(f"Партий: {StockLotBalance.query.count()}, видов сырья: {StockTypeBalance.query.count()}")
+
+if __name__ == "__main__":
+    rebuild_stock_ledger()
@@ -0,0 +1,32 @@
+import sys
+
+from sqlalchemy import func
+
+from app import app, db
+from app import email_outbox
+from app.models import EmailOutbox
+
+def send_email_outbox(retry_failed=False):
+    """Отправляет письма из очереди, срок которых наступил (например, по cron после перезапуска)"""
+    with app.app_context():
+        if retry_failed:
+            failed = EmailOutbox.query.filter(EmailOutbox.status == EmailOutbox.STATUS_FAILED).all()
+            for message in failed:
+                message.status = EmailOutbox.STATUS_PENDING
+                message.attempts = 0
+                message.next_attempt_at = None
+            db.session.commit()
+            print(f"Возвращено в очередь: {len(failed)}")
+
+        counts = email_outbox.dispatch()
+        print(f"Отправлено: {counts['sent']}, отложено: {counts['retry']}, не отправлено: {counts['failed']}")
+
+        for status, count in db.session.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status):
+            print(f"  {status}: {count}")
+        next_attempt = email_outbox.next_attempt_at()
+        if next_attempt is not None:
+            print(f"Следующая попытка: {next_attempt:%d.%m.%Y %H:%M}")
+        return counts
+
+if __name__ == "__main__":
+    send_email_outbox(retry_failed='--retry-failed' in sys.argv[1:])